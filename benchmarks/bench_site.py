@@ -0,0 +1,136 @@
+"""Synthetic documentation site for offline benchmarks
+
+Generates a tree of doc pages under <root>/docs/ and serves it from a stdlib
+ThreadingHTTPServer on 127.0.0.1. The server logs when each path was first
+requested, so the harness can measure per-page latency end to end.
+
+    site = generate_site(tmp_dir, pages=200, depth=3, html_kb=30, images=2, js_ratio=0.0)
+    with serve_site(tmp_dir) as server:
+        print(server.url + site["entry"])
+"""
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import functools
+import math
+import os
+import random
+import threading
+import time
+
+LOREM = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt "
+         "ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco. ")
+
+# Smallest valid PNG (1x1), padded with trailing bytes after IEND to the requested size
+PNG_1X1 = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+def page_path(index, level):
+    """Site path of page #index at tree level (level 0 = entry page)"""
+    if index == 0:
+        return "docs/index.html"
+    dirs = "/".join(f"lvl{n}" for n in range(1, level + 1))
+    return f"docs/{dirs}/page{index}.html"
+
+
+def _page_body(index, links, html_kb, images, rng):
+    parts = [f"<h1>Page {index}</h1>", "<h2>Overview</h2>"]
+    parts.append("<table><tr><th>Name</th><th>Type</th><th>Description</th></tr>")
+    parts.extend(f"<tr><td>field{n}</td><td>int</td><td>Value number {n}</td></tr>" for n in range(5))
+    parts.append("</table>")
+    parts.append(f"<pre><code>def handler_{index}(request):\n    return {{'page': {index}}}\n</code></pre>")
+    parts.append("<ul>" + "".join(f'<li><a href="{href}">{text}</a></li>' for href, text in links) + "</ul>")
+    parts.extend(f'<img src="/assets/img{index}_{n}.png" alt="Figure {n}">' for n in range(images))
+    size = sum(len(part) for part in parts)
+    while size < html_kb * 1024:
+        paragraph = f"<p>{LOREM * rng.randint(1, 4)}</p>"
+        parts.append(paragraph)
+        size += len(paragraph)
+    return "\n".join(parts)
+
+
+def _page_html(index, body, js_rendered):
+    chrome = ('<header>Docs header</header><nav><a href="/docs/index.html">Home</a></nav>'
+              '<aside>Sidebar</aside>')
+    if js_rendered:
+        payload = base64.b64encode(body.encode("utf-8")).decode("ascii")
+        main = ('<main id="app"></main>'
+                f'<script>document.getElementById("app").innerHTML = '
+                f'new TextDecoder().decode(Uint8Array.from(atob("{payload}"), c => c.charCodeAt(0)));</script>')
+    else:
+        main = f"<main>{body}</main>"
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Page {index}</title></head>"
+            f"<body>{chrome}{main}<footer>Footer</footer></body></html>")
+
+
+def generate_site(root, pages=100, depth=3, html_kb=20, images=0, image_kb=8, js_ratio=0.0, seed=42):
+    """Write the synthetic site below root
+    :param pages: Number of doc pages (tree of pages, entry page = docs/index.html)
+    :param depth: Tree height, relative crawl depth of the deepest pages is depth + 1
+    :param html_kb: Approximate HTML size of each page
+    :param images: <img> tags per page (each a distinct file of image_kb)
+    :param js_ratio: Fraction of pages whose content is injected by JavaScript
+    :return: {"entry": path of entry page, "pages": [paths], "js_pages": count}
+    """
+    rng = random.Random(seed)
+    branching = max(2, math.ceil(pages ** (1.0 / max(depth, 1))))
+    levels = [0] * pages
+    for index in range(1, pages):
+        levels[index] = levels[(index - 1) // branching] + 1
+    paths = [page_path(index, levels[index]) for index in range(pages)]
+    js_pages = 0
+    for index in range(pages):
+        children = range(branching * index + 1, min(pages, branching * index + branching + 1))
+        links = [(f"/{paths[child]}", f"Page {child}") for child in children]
+        if index:
+            links.append((f"/{paths[(index - 1) // branching]}", "Parent"))
+        js_rendered = rng.random() < js_ratio
+        js_pages += js_rendered
+        html = _page_html(index, _page_body(index, links, html_kb, images, rng), js_rendered)
+        file_path = os.path.join(root, paths[index])
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        for n in range(images):
+            image_path = os.path.join(root, "assets", f"img{index}_{n}.png")
+            os.makedirs(os.path.dirname(image_path), exist_ok=True)
+            with open(image_path, "wb") as f:
+                f.write(PNG_1X1 + os.urandom(max(0, image_kb * 1024 - len(PNG_1X1))))
+    return {"entry": paths[0], "pages": paths, "js_pages": js_pages}
+
+
+class _LoggingHandler(SimpleHTTPRequestHandler):
+    """Static file handler that records the first request time of each path"""
+
+    def __init__(self, *args, request_log=None, **kwargs):
+        self.request_log = request_log
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        self.request_log.setdefault(self.path.split("?", 1)[0], time.time())
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class serve_site:
+    """Context manager serving root on 127.0.0.1 (random free port) in a background thread"""
+
+    def __init__(self, root):
+        self.root = root
+        self.request_log = {}
+
+    def __enter__(self):
+        handler = functools.partial(_LoggingHandler, directory=self.root, request_log=self.request_log)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.server.shutdown()
+        self.server.server_close()
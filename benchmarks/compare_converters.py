@@ -0,0 +1,162 @@
+"""Golden comparison + throughput of the two HTML→MD engines (markdownify vs --converter fast)
+
+Runs every page through web2md's own page pipeline (parse, link rewrite, tag
+stripping, core content selection, conversion, blank-line cleanup) once per
+engine and reports:
+    mismatches      - pages whose Markdown or link list differ (unified diff shown)
+    pages/sec, MB/s - HTML throughput of each engine (best of --repeat runs)
+
+Pages: built-in fixtures (tables, nested lists, code, media, quotes...), a few
+generated bench-site pages incl. one multi-megabyte reference page, and any
+*.html files below --pages-dir (e.g. a saved mirror of real docs).
+
+Usage:
+    python3 benchmarks/compare_converters.py
+    python3 benchmarks/compare_converters.py --pages-dir ~/html-samples --big-kb 4096 --json converters.json
+Exit code 1 if any page differs.
+"""
+import argparse
+import difflib
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_site import _page_body, _page_html
+from web2md.crawler import CrawlJob, build_config
+
+BASE_URL = "https://docs.example.com/guide/"
+
+FIXTURES = {
+    "headings_inline": """<main><h1>Title <em>one</em></h1><h2>Sub_title *x*</h2><p>Some <b>bold</b>, <i>italic</i>,
+        <del>gone</del>, <code>a_b</code>, <kbd>Ctrl</kbd> and <a href="p2" title='The "page"'>a link</a>.</p>
+        <h3><a href="#x">Anchored</a> heading</h3><p>Line<br>break and <q>quote</q> <sub>2</sub><sup>n</sup></p></main>""",
+    "lists": """<main><ul><li>One</li><li>Two<ul><li>Nested <b>a</b></li><li>Nested b<ol><li>x</li><li>y</li></ol></li></ul></li>
+        <li><p>Para item</p><p>Second para</p></li></ul><p>After list</p>
+        <ol start="3"><li>Three</li><li>Four</li><li></li></ol><ul><li>Tail</li></ul></main>""",
+    "tables": """<main><table><thead><tr><th>Name</th><th colspan="2">Type / Default</th></tr></thead>
+        <tbody><tr><td>field_a</td><td>int</td><td>1</td></tr><tr><td>b<br>multi</td><td><code>str</code></td><td></td></tr></tbody></table>
+        <table><tr><td>no</td><td>header</td></tr><tr><td>1</td><td>2</td></tr></table>
+        <table><tbody><tr><th>H1</th><th>H2</th></tr><tr><td>v1</td><td>v2</td></tr></tbody></table>
+        <table><caption>Cap</caption><tr><th>A</th></tr><tr><td><p>para in cell</p></td></tr></table></main>""",
+    "code": """<main><p>Run:</p><pre><code class="language-bash">pip install web2md
+web2md https://x/docs/ out   --depth 2
+
+echo "done"  </code></pre><pre>
+  indented *not* escaped_
+</pre><p>Inline `tick` and <code>``double``</code></p></main>""",
+    "media": """<main><p><img src="a.png" alt="Alt A" title="T"> <img src="b.png"></p>
+        <video src="v.mp4" poster="p.png">Video text</video><video><source src="s.webm"></video>
+        <figure><img src="f.png" alt="Fig"><figcaption>Figure caption</figcaption></figure>
+        <h2><img src="icon.png" alt="icon"> Heading with image</h2></main>""",
+    "quotes_defs": """<main><blockquote><p>Quoted <b>text</b></p><p>Second</p></blockquote><hr>
+        <dl><dt>Term</dt><dd>Definition <i>one</i></dd><dt>Other</dt><dd><p>Def two</p></dd></dl>
+        <div>Div text <span>span</span></div><section><article>Nested article</article></section></main>""",
+    "chrome_and_selectors": """<html><head><title>t</title><style>p{}</style></head><body>
+        <header>Header</header><nav><a href="/guide/x">Nav</a></nav>
+        <div class="page content wide"><h1>Core by class</h1><p>Body <a href="sub/y.html">rel</a>
+        <a href="https://docs.example.com/guide/z">https://docs.example.com/guide/z</a> <a href="mailto:a@b">mail</a></p>
+        <script>var x = 1;</script><!-- comment --><p>after comment</p></div><footer>Footer</footer></body></html>""",
+    "body_fallback": """<html><body><p>No core container, <strong>just body</strong> text &amp; entities &lt;ok&gt;</p>
+        <iframe src="x"></iframe><aside>Side</aside><p>Ünïcödé — “quotes”</p></body></html>""",
+    # Page builder markup: deeper than libxml2's default nesting limit (255)
+    "deep_nesting": "<main>" + "<div>" * 300 + "<p>Deep <b>text</b></p>" + "</div>" * 300 + "<p>After</p></main>",
+}
+
+
+def build_pages(args):
+    """(name, html) pairs to compare"""
+    pages = [(name, html if "<html" in html else f"<html><body>{html}</body></html>")
+             for name, html in FIXTURES.items()]
+    rng = random.Random(7)
+    for index in range(1, 4):
+        links = [(f"/guide/page{n}.html", f"Page {n}") for n in range(index * 5, index * 5 + 5)]
+        pages.append((f"bench_page{index}", _page_html(index, _page_body(index, links, 30, 2, rng), False)))
+    # Multi-megabyte reference page: long prose, big table, many code blocks
+    body = _page_body(99, [(f"/guide/ref{n}.html", f"Ref {n}") for n in range(200)], args.big_kb // 2, 5, rng)
+    body += "<h2>Reference table</h2><table><tr><th>Key</th><th>Type</th><th>Description</th></tr>" + "".join(
+        f"<tr><td><code>option_{n}</code></td><td>int</td><td>Value <b>{n}</b> of the <a href='opt{n}'>option</a></td></tr>"
+        for n in range(args.big_kb * 4)) + "</table>"
+    body += "".join(f"<h3>Example {n}</h3><pre><code>def f_{n}(x):\n    return x * {n}\n</code></pre>" for n in range(args.big_kb // 4))
+    pages.append(("big_reference", _page_html(99, body, False)))
+    if args.pages_dir:
+        for dirpath, _, filenames in os.walk(args.pages_dir):
+            for filename in sorted(filenames):
+                if filename.endswith((".html", ".htm")):
+                    path = os.path.join(dirpath, filename)
+                    with open(path, encoding="utf-8", errors="replace") as f:
+                        pages.append((os.path.relpath(path, args.pages_dir), f.read()))
+    return pages
+
+
+JOBS = {engine: CrawlJob(BASE_URL + "index.html", "compare_out", depth=5, count=0,
+                         config=build_config({"crawl": {"converter": engine}}))
+        for engine in ("markdownify", "fast")}
+
+
+def convert(engine, html):
+    """Run web2md's page pipeline with one engine: (page_links, markdown)"""
+    return JOBS[engine].render_markdown(BASE_URL + "index.html", html, BASE_URL + "index.html", BASE_URL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare markdownify and the fast lxml converter")
+    parser.add_argument("--pages-dir", help="Also compare every *.html file below this directory")
+    parser.add_argument("--big-kb", type=int, default=2048, help="Approx. size of the generated reference page (default: 2048)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing runs per engine, best one counts (default: 3)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the result as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show web2md output")
+    args = parser.parse_args()
+
+    pages = build_pages(args)
+    total_bytes = sum(len(html.encode("utf-8")) for _, html in pages)
+    stdout = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")  # Silence the pipeline's per-page status lines
+    try:
+        mismatches = []
+        for name, html in pages:
+            expected, actual = convert("markdownify", html), convert("fast", html)
+            if expected != actual:
+                mismatches.append((name, expected, actual))
+        timings = {}
+        for engine in ("markdownify", "fast"):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for _, html in pages:
+                    convert(engine, html)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[engine] = best
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    print(f"web2md converter comparison: {len(pages)} pages, {total_bytes / 1048576:.2f}MB HTML")
+    for name, expected, actual in mismatches:
+        print(f"\n❌ {name} differs:")
+        if expected[0] != actual[0]:
+            print(f"   links: markdownify {len(expected[0])} / fast {len(actual[0])}")
+        diff = difflib.unified_diff((expected[1] or "").splitlines(), (actual[1] or "").splitlines(),
+                                    "markdownify", "fast", lineterm="", n=1)
+        for line in list(diff)[:40]:
+            print(f"   {line}")
+    print(f"\n  identical output : {len(pages) - len(mismatches)}/{len(pages)} pages")
+    for engine, seconds in timings.items():
+        print(f"  {engine:<16} : {seconds:.3f}s | {len(pages) / seconds:.1f} pages/s | {total_bytes / 1048576 / seconds:.2f} MB/s")
+    print(f"  speedup          : {timings['markdownify'] / timings['fast']:.1f}x")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"pages": len(pages), "html_bytes": total_bytes, "mismatches": [m[0] for m in mismatches],
+                       "seconds": timings, "speedup": timings["markdownify"] / timings["fast"]}, f, indent=2)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""End-to-end web2md benchmark against a local synthetic doc site
+
+Generates the site (see bench_site.py), serves it on 127.0.0.1, runs the
+`web2md` CLI in a subprocess and reports:
+    pages/sec             - MD files written / wall time
+    p50/p95 latency       - per page, from first HTTP request of the page to its MD file mtime
+    peak RSS              - largest process of the run (web2md or one of its children)
+    bytes written         - everything below the output dir
+
+Usage (extra web2md options go after --):
+    python3 benchmarks/run_bench.py --pages 200 --depth 3 --html-kb 30 --images 2
+    python3 benchmarks/run_bench.py --js-ratio 0.3 --json result.json -- --fetch auto --workers 4
+Save --json results per commit and compare them to spot regressions.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from bench_site import generate_site, serve_site
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def md_filename(site_path):
+    """MD filename web2md writes for a site path (same rule as url_to_md_filename, base = /docs/)"""
+    name = site_path[len("docs/"):].lower().replace("/", "_")
+    if name == "index.html":
+        return "index.md"  # Directory index pages are named after their directory (canonical URL)
+    return f"{name}.md"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[index]
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(args, web2md_args):
+    with tempfile.TemporaryDirectory(prefix="web2md_bench_") as tmp:
+        site_root = os.path.join(tmp, "site")
+        out_dir = os.path.join(tmp, "out")
+        site = generate_site(site_root, pages=args.pages, depth=args.depth, html_kb=args.html_kb,
+                             images=args.images, image_kb=args.image_kb, js_ratio=args.js_ratio)
+        with serve_site(site_root) as server:
+            cmd = [sys.executable, "-m", "web2md.cli", server.url + site["entry"], out_dir,
+                   "--depth", str(args.depth + 1), "--count", "0"] + web2md_args
+            env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            start = time.time()
+            with open(os.devnull, "w") if not args.verbose else sys.stdout as sink:
+                returncode = subprocess.call(cmd, stdout=sink, stderr=subprocess.STDOUT, env=env)
+            elapsed = time.time() - start
+            request_log = dict(server.request_log)
+        # ru_maxrss is KB on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+        latencies = []
+        for path in site["pages"]:
+            md_path = os.path.join(out_dir, md_filename(path))
+            requested = request_log.get(f"/{path}")
+            if requested and os.path.exists(md_path):
+                latencies.append(os.path.getmtime(md_path) - requested)
+        pages_written = len(latencies)
+        return {
+            "commit": git_commit(),
+            "site": {"pages": args.pages, "depth": args.depth, "html_kb": args.html_kb,
+                     "images": args.images, "js_ratio": args.js_ratio, "js_pages": site["js_pages"]},
+            "web2md_args": web2md_args,
+            "returncode": returncode,
+            "pages_written": pages_written,
+            "elapsed_s": round(elapsed, 3),
+            "pages_per_sec": round(pages_written / elapsed, 3) if elapsed else 0.0,
+            "latency_p50_s": round(percentile(latencies, 50), 3),
+            "latency_p95_s": round(percentile(latencies, 95), 3),
+            "peak_rss_mb": round(peak_rss_mb, 1),
+            "bytes_written": dir_size(out_dir) if os.path.isdir(out_dir) else 0
+        }
+
+
+def main():
+    argv = sys.argv[1:]
+    web2md_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, web2md_args = argv[:split], argv[split + 1:]
+    parser = argparse.ArgumentParser(description="Offline web2md benchmark on a generated local doc site")
+    parser.add_argument("--pages", type=int, default=100, help="Number of generated pages (default: 100)")
+    parser.add_argument("--depth", type=int, default=3, help="Page tree height (default: 3)")
+    parser.add_argument("--html-kb", type=int, default=20, help="Approx. HTML size per page in KB (default: 20)")
+    parser.add_argument("--images", type=int, default=0, help="Images per page (default: 0)")
+    parser.add_argument("--image-kb", type=int, default=8, help="Size of each image in KB (default: 8)")
+    parser.add_argument("--js-ratio", type=float, default=0.0, help="Fraction of JS-rendered pages (default: 0)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the result as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show web2md output")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args, web2md_args)
+    print(f"web2md benchmark @ {result['commit'] or 'unknown commit'} | web2md args: {' '.join(web2md_args) or '(default)'}")
+    print(f"  site            : {args.pages} pages, depth {args.depth}, ~{args.html_kb}KB HTML, "
+          f"{args.images} img/page, {result['site']['js_pages']} JS-rendered")
+    print(f"  pages written   : {result['pages_written']} (exit code {result['returncode']})")
+    print(f"  wall time       : {result['elapsed_s']}s")
+    print(f"  pages/sec       : {result['pages_per_sec']}")
+    print(f"  latency p50/p95 : {result['latency_p50_s']}s / {result['latency_p95_s']}s")
+    print(f"  peak RSS        : {result['peak_rss_mb']}MB")
+    print(f"  bytes written   : {result['bytes_written']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Batch mode: many seed URLs crawled in one run (--seeds-file)
+
+A seeds file lists one seed per line, either a plain URL or a JSON object
+with per-seed options (JSONL); blank lines and lines starting with # are
+skipped:
+    https://company.com/docs/home
+    {"url": "https://other.org/guide/", "depth": 2, "count": 50, "save_dir": "other-guide"}
+
+All seeds run as jobs of one Crawler, so they share the browser, the HTTP
+pools, the media cache and the global page limit; the per-seed results are
+combined into one summary at the end.
+"""
+import json
+import os
+import re
+from .crawler import get_url_parent_dir, generate_auto_save_dir
+
+# Per-seed keys accepted in a JSONL seeds file (besides "url")
+SEED_OPTIONS = ("save_dir", "depth", "count", "picture", "video")
+
+
+def parse_seed_line(line, line_no):
+    """Parse one seeds file line
+    :return: Seed dict ({"url", ...SEED_OPTIONS}) / None for blank and comment lines
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        try:
+            seed = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Seeds file line {line_no}: invalid JSON ({e})")
+        unknown = set(seed) - {"url"} - set(SEED_OPTIONS)
+        if unknown:
+            raise ValueError(f"Seeds file line {line_no}: unknown key(s) {', '.join(sorted(unknown))} "
+                             f"| Use url, {', '.join(SEED_OPTIONS)}")
+    else:
+        seed = {"url": line}
+    url = seed.get("url")
+    if not isinstance(url, str) or not re.match(r'^https?://', url, re.IGNORECASE):
+        raise ValueError(f"Seeds file line {line_no}: invalid URL {url!r} | Must start with http/https")
+    for key in ("depth", "count"):
+        if key in seed and (not isinstance(seed[key], int) or seed[key] < 0):
+            raise ValueError(f"Seeds file line {line_no}: {key} must be a non-negative integer")
+    return seed
+
+
+def load_seeds(path, save_root=None):
+    """Read a seeds file and give every seed its own save dir
+    Relative save dirs (and the auto-generated ones) are placed below save_root;
+    seeds that would share a directory get a numeric suffix, since a save dir holds one crawl state.
+    :param save_root: Parent directory of the per-seed save dirs (default: current directory)
+    :return: List of seed dicts, each with an absolute save_dir
+    """
+    seeds = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            seed = parse_seed_line(line, line_no)
+            if seed is not None:
+                seeds.append(seed)
+    used = set()
+    for seed in seeds:
+        save_dir = seed.get("save_dir") or generate_auto_save_dir(get_url_parent_dir(seed["url"]))
+        save_dir = os.path.abspath(os.path.join(save_root or ".", save_dir))
+        unique_dir, n = save_dir, 1
+        while unique_dir in used:
+            n += 1
+            unique_dir = f"{save_dir}_{n}"
+        used.add(unique_dir)
+        seed["save_dir"] = unique_dir
+    return seeds
+
+
+def get_seed_report_path(report_path, index):
+    """Per-seed report file: crawl.jsonl → crawl.seed3.jsonl"""
+    stem, ext = os.path.splitext(report_path)
+    return f"{stem}.seed{index}{ext or '.jsonl'}"
+
+
+def summarize_batch(results, elapsed):
+    """Combine per-seed crawl results
+    :param results: Crawler.crawl_batch results (dicts with "error" set for failed seeds)
+    :param elapsed: Wall time of the whole batch (s)
+    :return: Summary dict (seeds, failed, pages, pages_per_sec, fetch_paths, urls, retries, media, elapsed_s)
+    """
+    summary = {"seeds": len(results), "failed": 0, "pages": 0, "elapsed_s": round(elapsed, 3),
+               "fetch_paths": {"static": 0, "browser": 0, "fallback": 0, "unchanged": 0}, "urls": {"merged": 0, "duplicates": 0},
+               "retries": {"retries": 0, "recovered": 0, "failed": 0},
+               "media": {"downloaded": 0, "captured": 0, "reused": 0, "failed": 0}}
+    for result in results:
+        if result.get("error"):
+            summary["failed"] += 1
+        summary["pages"] += result.get("pages", 0)
+        for key, value in (result.get("fetch_paths") or {}).items():
+            summary["fetch_paths"][key] = summary["fetch_paths"].get(key, 0) + value
+        for key, value in (result.get("urls") or {}).items():
+            summary["urls"][key] = summary["urls"].get(key, 0) + value
+        for key, value in (result.get("retries") or {}).items():
+            summary["retries"][key] = summary["retries"].get(key, 0) + value
+        for key, value in (result.get("media") or {}).items():
+            summary["media"][key] = summary["media"].get(key, 0) + value
+    summary["pages_per_sec"] = round(summary["pages"] / elapsed, 3) if elapsed else 0.0
+    return summary
+
+
+def print_batch_summary(results, summary):
+    """Print one line per seed and the combined totals"""
+    print("=" * 80)
+    print(f"\n📦 Batch Completed: {summary['seeds']} seeds, {summary['failed']} failed")
+    for result in results:
+        if result.get("error"):
+            print(f"   ❌ {result['target_url']} → {result['save_dir']} ({result['error'][:80]})")
+        else:
+            print(f"   ✅ {result['target_url']} → {result['save_dir']} ({result['pages']} pages)")
+    print(f"📊 Total: {summary['pages']} pages in {summary['elapsed_s']:.1f}s ({summary['pages_per_sec']} pages/s)")
+    print(f"📊 Fetch paths: {summary['fetch_paths']['static']} static | {summary['fetch_paths']['browser']} browser-rendered "
+          f"({summary['fetch_paths']['fallback']} fell back from static)" +
+          (f" | {summary['fetch_paths']['unchanged']} unchanged (304 / same HTML)" if summary["fetch_paths"]["unchanged"] else ""))
+    if any(summary["urls"].values()):
+        print(f"📊 URL canonicalisation: {summary['urls']['merged']} fetches saved on duplicate URL spellings | "
+              f"{summary['urls']['duplicates']} redirect/rel=canonical duplicates not converted")
+    retries = summary["retries"]
+    if any(retries.values()):
+        print(f"📊 Retries: {retries['retries']} retries, {retries['recovered']} pages recovered, {retries['failed']} pages failed"
+              + (" (run again with --retry-failed to fetch only those)" if retries["failed"] else ""))
+    media = summary["media"]
+    if any(media.values()):
+        print(f"📊 Media: {media['downloaded']} downloaded, {media['captured']} captured from the browser, "
+              f"{media['reused']} reused across seeds, {media['failed']} failed")
@@ -0,0 +1,414 @@
+"""Long-lived Playwright browser shared by the whole crawl
+
+Launching Chromium costs more than rendering most doc pages, so one browser is
+started per crawl and a small pool of warm contexts/pages is handed out to
+get_dynamic_html. Each pooled page is recycled (context closed and recreated)
+after a fixed number of navigations to keep renderer memory in check.
+AsyncBrowserPool is the asyncio twin used by the crawl engine, where every
+worker drives its own tab. Several AsyncBrowserPools can share one Chromium
+through an AsyncBrowserHost, so crawl jobs of a long-lived Crawler only open
+their own contexts instead of launching a browser each.
+
+Pages are considered ready once a core-content selector exists and the DOM has
+stopped mutating for a short quiet window (READY_SCRIPT), instead of waiting
+for networkidle, which analytics beacons and long-polling can hold off for the
+whole timeout. Fonts/trackers (and media, when not crawled) are blocked via
+CDP Network.setBlockedURLs rather than page.route(), because routing disables
+the browser HTTP cache and shared JS bundles would be re-downloaded per page.
+
+With in-browser extraction (EXTRACT_SCRIPT) links are collected and resolved
+against document.baseURI and the core container is picked inside the page, so
+only the links and the core fragment cross the CDP pipe instead of the whole
+serialised DOM.
+
+Media capture (start_media_capture / collect_media_bodies) records the image
+and video responses of a navigation, so their bodies can be copied out of the
+browser instead of being downloaded a second time without its cookies.
+"""
+from urllib.parse import urlparse, unquote
+import asyncio
+import os
+from collections import deque, namedtuple
+from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+# Resolves once one of the selectors matches and the DOM has been quiet for quietMs.
+# Without a match, body is accepted after coreWaitMs; gives up (false) at timeoutMs.
+READY_SCRIPT = """([selectors, quietMs, coreWaitMs, timeoutMs]) => new Promise(resolve => {
+    const start = performance.now();
+    let lastMutation = start;
+    const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    const check = () => {
+        const now = performance.now();
+        const hasCore = selectors.some(sel => document.querySelector(sel));
+        const hasContent = hasCore || (now - start >= coreWaitMs && document.body);
+        if ((hasContent && now - lastMutation >= quietMs) || now - start >= timeoutMs) {
+            observer.disconnect();
+            resolve(Boolean(hasContent));
+        } else {
+            setTimeout(check, 50);
+        }
+    };
+    check();
+})"""
+
+
+# Mirrors extract_page_links + strip_useless_tags + select_core_content of the Python pipeline:
+# all <a href> targets (resolved, in order, unique) and the first core selector match whose
+# ancestors survive tag stripping (<body> otherwise), returned with the stripped tags removed,
+# plus the <link rel="canonical"> target used to spot duplicate pages.
+EXTRACT_SCRIPT = """({selectors, removeTags, skipPrefixes}) => {
+    const removeSelector = removeTags.join(",");
+    const links = [];
+    const seen = new Set();
+    for (const a of document.querySelectorAll("a[href]")) {
+        const href = a.getAttribute("href").trim();
+        if (!href || skipPrefixes.some(prefix => href.startsWith(prefix))) continue;
+        let url;
+        try { url = new URL(href, document.baseURI).href; } catch (e) { continue; }
+        if (!seen.has(url)) { seen.add(url); links.push(url); }
+    }
+    let core = null, matched = null;
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            if (!removeSelector || !el.parentElement || !el.parentElement.closest(removeSelector)) { core = el; break; }
+        }
+        if (core) { matched = selector; break; }
+    }
+    core = core || document.body;
+    const canonicalLink = document.querySelector("link[rel~='canonical'][href]");
+    const canonical = canonicalLink ? canonicalLink.href : null;
+    if (!core) return {links, core: null, tag: null, selector: null, baseURI: document.baseURI, canonical};
+    const clone = core.cloneNode(true);
+    if (removeSelector) clone.querySelectorAll(removeSelector).forEach(el => el.remove());
+    return {links, core: clone.outerHTML, tag: core.tagName.toLowerCase(), selector: matched, baseURI: document.baseURI, canonical};
+}"""
+
+# Result of EXTRACT_SCRIPT: core_html is the stripped core container (None if the page has no body),
+# core_tag its tag name, selector the matched core selector (None = <body> fallback),
+# canonical the absolute <link rel="canonical"> target (None if the page has none)
+BrowserExtract = namedtuple("BrowserExtract", ["core_html", "core_tag", "links", "selector", "base_uri", "canonical"])
+
+
+def extract_in_page(page, selectors, remove_tags, skip_prefixes):
+    """Collect links and the core container inside the page (see EXTRACT_SCRIPT)
+    :param selectors: CSS selectors of core containers, by priority
+    :param remove_tags: Tag names stripped from the core fragment
+    :param skip_prefixes: href prefixes that are not links (mailto:, #...)
+    :return: BrowserExtract
+    """
+    result = page.evaluate(EXTRACT_SCRIPT, {"selectors": selectors, "removeTags": remove_tags,
+                                            "skipPrefixes": list(skip_prefixes)})
+    return BrowserExtract(result["core"], result["tag"], result["links"], result["selector"], result["baseURI"],
+                          result["canonical"])
+
+
+async def extract_in_page_async(page, selectors, remove_tags, skip_prefixes):
+    """asyncio twin of extract_in_page"""
+    result = await page.evaluate(EXTRACT_SCRIPT, {"selectors": selectors, "removeTags": remove_tags,
+                                                  "skipPrefixes": list(skip_prefixes)})
+    return BrowserExtract(result["core"], result["tag"], result["links"], result["selector"], result["baseURI"],
+                          result["canonical"])
+
+
+def wait_until_ready(page, selectors, quiet_ms, core_wait_ms, timeout_ms):
+    """Block until the page looks rendered (see READY_SCRIPT)
+    :return: True (ready) / False (gave up, content used as is)
+    """
+    try:
+        return page.evaluate(READY_SCRIPT, [selectors, quiet_ms, core_wait_ms, timeout_ms])
+    except Exception:
+        # JS navigation destroyed the execution context, settle for the load event
+        page.wait_for_load_state("load", timeout=timeout_ms)
+        return False
+
+
+async def wait_until_ready_async(page, selectors, quiet_ms, core_wait_ms, timeout_ms):
+    """asyncio twin of wait_until_ready"""
+    try:
+        return await page.evaluate(READY_SCRIPT, [selectors, quiet_ms, core_wait_ms, timeout_ms])
+    except Exception:
+        await page.wait_for_load_state("load", timeout=timeout_ms)
+        return False
+
+
+def is_capturable_media(response, extensions, max_bytes):
+    """Complete (200) image/video response with a wanted extension, small enough to copy out of the browser"""
+    if response.status != 200 or response.request.resource_type not in ("image", "media"):
+        return False
+    if os.path.splitext(urlparse(unquote(response.url)).path)[1].lower() not in extensions:
+        return False
+    try:
+        size = int(response.headers.get("content-length") or "")
+    except ValueError:  # Missing, or malformed (proxies may send "123, 123")
+        return response.request.resource_type == "image"  # Unknown size: only trust images
+    return not max_bytes or size <= max_bytes
+
+
+def start_media_capture(page, extensions, max_bytes=0):
+    """Record capturable media responses of the page (works for sync and async pages)
+    :param extensions: Media file extensions to keep (.png, .mp4...)
+    :param max_bytes: Larger responses are left out (0 = unlimited)
+    :return: Capture handle for collect_media_bodies / stop_media_capture
+    """
+    responses = []
+
+    def on_response(response):
+        if is_capturable_media(response, extensions, max_bytes):
+            responses.append(response)
+
+    page.on("response", on_response)
+    return page, on_response, responses
+
+
+def stop_media_capture(capture):
+    page, on_response, _ = capture
+    page.remove_listener("response", on_response)
+
+
+def collect_media_bodies(capture):
+    """Bodies of the recorded responses
+    :return: {url: bytes} (responses the browser no longer holds are left out, they get downloaded)
+    """
+    bodies = {}
+    for response in capture[2]:
+        try:
+            bodies[response.url] = response.body()
+        except Exception:
+            pass
+    return bodies
+
+
+async def collect_media_bodies_async(capture):
+    """asyncio twin of collect_media_bodies"""
+    bodies = {}
+    for response in capture[2]:
+        try:
+            bodies[response.url] = await response.body()
+        except Exception:
+            pass
+    return bodies
+
+
+class BrowserPool:
+    """Pool of reusable (context, page) slots on top of one Chromium instance
+    :param size: Max number of warm contexts kept open at the same time
+    :param recycle_after: Recreate a slot after this many navigations (0 = never)
+    :param headless: Launch Chromium without a window
+    :param context_options: Keyword args passed to browser.new_context()
+    :param blocked_urls: URL wildcard patterns the browser must not load (fonts, trackers...)
+    """
+
+    def __init__(self, size=1, recycle_after=50, headless=True, context_options=None, blocked_urls=None):
+        self.size = max(1, size)
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.context_options = context_options or {}
+        self.blocked_urls = blocked_urls or []
+        self._playwright = None
+        self._browser = None
+        self._idle = deque()   # Idle slots: [context, page, navigations]
+        self._slots = {}       # id(page) -> slot, for every slot handed out or idle
+        self.launched = 0      # Browser launches (should stay 1 per crawl)
+        self.recycled = 0      # Slots recycled after hitting recycle_after
+
+    def start(self):
+        """Launch Chromium once (no-op if already running)"""
+        if self._browser is None:
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=self.headless)
+            self.launched += 1
+        return self
+
+    def _new_slot(self):
+        context = self._browser.new_context(**self.context_options)
+        page = context.new_page()
+        if self.blocked_urls:
+            cdp = context.new_cdp_session(page)
+            cdp.send("Network.enable")
+            cdp.send("Network.setBlockedURLs", {"urls": self.blocked_urls})
+        slot = [context, page, 0]
+        self._slots[id(page)] = slot
+        return slot
+
+    def _drop_slot(self, slot):
+        self._slots.pop(id(slot[1]), None)
+        try:
+            slot[0].close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Get a warm page (reuse an idle slot, or open a new one while below pool size)"""
+        self.start()
+        if self._idle:
+            return self._idle.popleft()[1]
+        if len(self._slots) >= self.size:
+            raise RuntimeError(f"Browser pool exhausted ({self.size} pages in use)")
+        return self._new_slot()[1]
+
+    def release(self, page, broken=False):
+        """Return a page to the pool, recycling its context if worn out or broken"""
+        slot = self._slots.get(id(page))
+        if slot is None:
+            return
+        slot[2] += 1
+        if broken or (self.recycle_after > 0 and slot[2] >= self.recycle_after):
+            self._drop_slot(slot)
+            self.recycled += 1
+            return
+        self._idle.append(slot)
+
+    def close(self):
+        """Close all contexts, the browser and the Playwright driver"""
+        for slot in list(self._slots.values()):
+            self._drop_slot(slot)
+        self._idle.clear()
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            finally:
+                self._browser = None
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            finally:
+                self._playwright = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncBrowserHost:
+    """One asyncio Chromium shared by several AsyncBrowserPools (launched on first use)
+    Pools only open and close their own contexts on it, the browser lives until close().
+    :param headless: Launch Chromium without a window
+    """
+
+    def __init__(self, headless=True):
+        self.headless = headless
+        self._playwright = None
+        self._browser = None
+        self._lock = None      # Serialises browser launch
+        self.launched = 0
+
+    async def get_browser(self):
+        """The running browser, launching Chromium once"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+                self.launched += 1
+        return self._browser
+
+    async def close(self):
+        """Close the browser and the Playwright driver (the next get_browser() may run on another loop)"""
+        self._lock = None
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            finally:
+                self._browser = None
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            finally:
+                self._playwright = None
+
+
+class AsyncBrowserPool:
+    """asyncio version of BrowserPool: acquire() waits while all pages are in use
+    :param size: Max number of warm contexts kept open at the same time (= concurrent tabs)
+    :param recycle_after: Recreate a slot after this many navigations (0 = never)
+    :param headless: Launch Chromium without a window (ignored when host is given)
+    :param context_options: Keyword args passed to browser.new_context()
+    :param blocked_urls: URL wildcard patterns the browser must not load (fonts, trackers...)
+    :param host: Shared AsyncBrowserHost (default: the pool launches and closes its own browser)
+    """
+
+    def __init__(self, size=1, recycle_after=50, headless=True, context_options=None, blocked_urls=None, host=None):
+        self.size = max(1, size)
+        self.recycle_after = recycle_after
+        self.context_options = context_options or {}
+        self.blocked_urls = blocked_urls or []
+        self.host = host or AsyncBrowserHost(headless=headless)
+        self._owns_host = host is None
+        self._browser = None
+        self._idle = deque()
+        self._slots = {}
+        self._free = None      # Semaphore counting pages that may still be handed out
+        self.recycled = 0
+
+    async def start(self):
+        """Get the browser from the host, launching Chromium once (no-op if already running)"""
+        if self._free is None:
+            self._free = asyncio.Semaphore(self.size)
+        if self._browser is None:
+            self._browser = await self.host.get_browser()
+        return self
+
+    async def _new_slot(self):
+        context = await self._browser.new_context(**self.context_options)
+        page = await context.new_page()
+        if self.blocked_urls:
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Network.enable")
+            await cdp.send("Network.setBlockedURLs", {"urls": self.blocked_urls})
+        slot = [context, page, 0]
+        self._slots[id(page)] = slot
+        return slot
+
+    async def _drop_slot(self, slot):
+        self._slots.pop(id(slot[1]), None)
+        try:
+            await slot[0].close()
+        except Exception:
+            pass
+
+    async def acquire(self):
+        """Get a warm page, waiting until one is free if the pool is at capacity"""
+        await self.start()
+        await self._free.acquire()
+        try:
+            if self._idle:
+                return self._idle.popleft()[1]
+            return (await self._new_slot())[1]
+        except Exception:
+            self._free.release()
+            raise
+
+    async def release(self, page, broken=False):
+        """Return a page to the pool, recycling its context if worn out or broken"""
+        slot = self._slots.get(id(page))
+        if slot is None:
+            return
+        try:
+            slot[2] += 1
+            if broken or (self.recycle_after > 0 and slot[2] >= self.recycle_after):
+                await self._drop_slot(slot)
+                self.recycled += 1
+            else:
+                self._idle.append(slot)
+        finally:
+            self._free.release()
+
+    async def close(self):
+        """Close all contexts, and the browser unless it belongs to a shared host"""
+        for slot in list(self._slots.values()):
+            await self._drop_slot(slot)
+        self._idle.clear()
+        self._browser = None
+        if self._owns_host:
+            await self.host.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
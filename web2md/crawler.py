@@ -0,0 +1,2422 @@
+"""Crawl engine: an embeddable Crawler running CrawlJobs
+
+A CrawlJob is one crawl (target URL, save dir, depth/count limits, media
+flags) and owns all of that crawl's state: visited URLs, counters, the
+on-disk crawl state / manifest, the report and the media download pool.
+Nothing lives in module globals, so several jobs can run one after another or
+at the same time in one process.
+
+A Crawler is long-lived and holds what jobs share: the configuration, one
+warm Chromium (AsyncBrowserHost, every job opens its own contexts on it), the
+pooled HTTP sessions for static fetches and media, the media cache, the
+global limit on pages in flight and the converter process pool. The web2md
+CLI is a thin wrapper around a single Crawler.crawl() call, or
+Crawler.crawl_batch() for --seeds-file.
+
+    with Crawler({"fetch": {"mode": "auto"}, "crawl": {"workers": 4}}) as crawler:
+        for url in urls:
+            result = crawler.crawl(url, depth=2, count=50)
+
+    async with Crawler() as crawler:
+        results = await asyncio.gather(*(crawler.crawl_async(url) for url in urls))
+
+The async API must be used from one event loop (the browser is bound to it),
+the sync API runs jobs on a private loop owned by the Crawler.
+"""
+from urllib.parse import urlparse, urljoin, unquote, urlunparse
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import TimeoutError as AsyncPlaywrightTimeoutError
+from bs4 import BeautifulSoup, Tag
+import markdownify
+import os
+import time
+import re
+import copy
+import hashlib
+import json
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .browser import BrowserPool, AsyncBrowserHost, AsyncBrowserPool, wait_until_ready, wait_until_ready_async
+from .browser import BrowserExtract, extract_in_page, extract_in_page_async
+from .browser import start_media_capture, stop_media_capture, collect_media_bodies, collect_media_bodies_async
+from .fetch import create_http_session, fetch_static_html, is_transient_error
+from .media import MediaCache, MediaCapture, MediaDownloader, MediaStore, default_media_store_dir, link_or_copy
+from .state import CrawlState, CrawlManifest, HtmlCache, HTML_CACHE_FILENAME, decompress_page
+from .discovery import discover_sitemap_urls, fetch_robots_txt, parse_lastmod
+from .ratelimit import HostScheduler, HostUnavailable, RETRY_STATUSES, UNSCHEDULED, backoff_delay
+from .report import CrawlReport, new_page_record, timed
+from .urls import canonicalize_url, strip_fragment, find_canonical_link
+from .sinks import create_output_sink, OUTPUT_FILENAMES
+from .frontier import PriorityFrontier
+from .largecrawl import BloomFilter, LargeCrawlStore, SpillQueue, FRONTIER_FILENAME
+from . import fastmd
+
+# ===================== Configurable Params (Adjust as needed) =====================
+PLAYWRIGHT_CONFIG = {
+    "headless": True,  # Set to True for background crawling (no browser window)
+    "timeout": 60000,   # Page load timeout (ms)
+    "wait_strategy": "smart",  # smart = core selector present + DOM quiet, networkidle = legacy wait + sleep
+    "extract": "python",  # python = ship page.content() to Python, browser = links + core fragment picked in the page
+    "wait_for_load": "networkidle",  # Wait for page full dynamic render (networkidle strategy)
+    "sleep_after_load": 2,  # Sleep after load (s) for JS render completion (networkidle strategy)
+    "dom_quiet_ms": 500,  # Smart wait: DOM must stop mutating for this long (ms)
+    "core_wait_ms": 5000,  # Smart wait: accept <body> if no core selector appears within this (ms)
+    "block_resources": True,  # Abort fonts/trackers/ads (and media when not crawled) while rendering
+    "recycle_after": 50,  # Recreate a pooled context after N navigations (0 = never)
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36"
+}
+MEDIA_CONFIG = {
+    "timeout": 30000,  # Media download timeout (ms)
+    "workers": 4,  # Parallel background downloads
+    "max_size_mb": 0,  # Skip media files larger than this (MB, 0 = unlimited)
+    "capture": True,  # Take media the browser loaded while rendering from its responses (no second download)
+    "capture_max_mb": 20,  # Larger responses are downloaded instead of copied out of the browser
+    "store": True,  # Keep downloaded media in a content-addressed store shared by all runs (hard-linked into crawls)
+    "store_dir": "",  # Media store directory ("" = ~/.cache/web2md/media)
+    "store_max_mb": 2048,  # Evict least recently used store files past this size (MB, 0 = unbounded)
+    "image_dir": "images",  # Image save subdirectory (same level as MD)
+    "video_dir": "videos",  # Video save subdirectory (same level as MD)
+    "allowed_img_ext": [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".svg", ".webp"],
+    "allowed_vid_ext": [".mp4", ".avi", ".mov", ".webm", ".flv", ".mkv", ".mpeg", ".mpg"]
+}
+# URL patterns blocked while rendering (Chromium wildcard syntax)
+BLOCKED_URL_PATTERNS = {
+    "font": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "tracker": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                "*googlesyndication.com*", "*adservice.google.*", "*amazon-adsystem.com*",
+                "*connect.facebook.net*", "*hotjar.com*", "*clarity.ms*", "*mixpanel.com*",
+                "*segment.io*", "*cdn.segment.com*", "*scorecardresearch.com*", "*taboola.com*", "*outbrain.com*"]
+}
+FETCH_CONFIG = {
+    "mode": "browser",  # browser = always render with Playwright, auto = plain HTTP first, render only if needed
+    "timeout": 30,      # Static fetch timeout (s)
+    "pool_size": 16,    # Kept-alive HTTP connections per host
+    "min_text_chars": 200,  # Static <body> with less text than this is assumed to be JS-rendered
+    "min_core_chars": 50,   # Matched core container with less text than this is assumed to be JS-rendered
+    "render_hosts": [],  # Hosts that always need the browser (skip the static attempt)
+    "adaptive_rate": True,  # Per-host AIMD scheduler for page fetches and media downloads (False = no pacing)
+    "host_start_concurrency": 4,  # Requests in flight per host at the start
+    "host_max_concurrency": 16,   # Upper bound of the per-host window (--host-concurrency)
+    "respect_crawl_delay": True,  # Obey robots.txt Crawl-delay (one request at a time, spaced by the delay)
+    "max_crawl_delay": 30,        # Cap on the Crawl-delay honoured (s)
+    "throttle_decrease": 0.5,     # Window factor on 429/503, timeouts and connection errors
+    "throttle_pause": 5,          # Host pause after 429/503 without Retry-After (s)
+    "max_retry_after": 300,       # Cap on the Retry-After pause (s)
+    "latency_factor": 3,          # Window shrinks when latency exceeds the host's best by this factor...
+    "latency_decrease": 0.75,     # ...by this factor
+    "decrease_cooldown": 1.0,     # Min time between two window decreases (s, at least the average latency)
+    "retries": 2,                 # Retries of a page / media fetch after a transient failure (--retries)
+    "retry_backoff": 1.0,         # First retry delay (s), doubled per retry, half of it jittered
+    "retry_backoff_max": 30,      # Cap on the retry delay (s)
+    "circuit_failures": 5,        # Consecutive failures that mark a host down (0 = no circuit breaker)
+    "circuit_open_s": 30,         # Requests to a down host fail fast this long before one probe (s)
+    "circuit_max_open_s": 600     # Cap on the fail-fast period, doubled while probes keep failing (s)
+}
+# Tags to remove (keep only core content)
+REMOVE_TAGS = ["nav", "header", "footer", "aside", "script", "style", "iframe", "sidebar"]
+# href prefixes that are not page links
+SKIP_LINK_PREFIXES = ('mailto:', 'tel:', 'javascript:', '#')
+# Browser navigation errors worth retrying (network hiccups, crashed tabs), besides timeouts
+TRANSIENT_BROWSER_ERRORS = ("net::ERR_CONNECTION", "net::ERR_TIMED_OUT", "net::ERR_EMPTY_RESPONSE",
+                            "net::ERR_NETWORK_CHANGED", "net::ERR_NAME_NOT_RESOLVED", "net::ERR_ADDRESS_UNREACHABLE",
+                            "net::ERR_INTERNET_DISCONNECTED", "Target closed", "crashed")
+# Core content selectors (match by priority, stop on first match)
+CORE_CONTENT_SELECTORS = [
+    ("main", {}),
+    ("div", {"class_": "article-content"}),
+    ("div", {"class_": "article_content"}),
+    ("div", {"id": "main-content"}),
+    ("div", {"class_": "content"}),
+    ("article", {})
+]
+# Markdown converter options (markdownify)
+MARKDOWN_OPTIONS = {
+    "heading_style": "ATX",  # MD heading style: # H1, ## H2
+    "bullets": "-*+",        # Unordered list symbols
+    "code_language": "python",  # Default code block language
+    "convert_ol": True,      # Convert ordered lists
+    "convert_ul": True,      # Convert unordered lists
+    "convert_table": True,   # Convert tables
+    "convert_image": True,   # Convert images
+    "convert_video": True,   # Convert videos
+    "link_style": "inlined", # Link style: [text](url)
+    "convert_br": True       # Convert <br> to line break
+}
+# Default crawl config
+DEFAULT_CRAWL_CONFIG = {
+    "max_depth": 5,     # Default max relative crawl depth
+    "max_count": 999,     # Default max file count (0 = unlimited)
+    "allowed_schemes": ["http", "https"],
+    "exclude_patterns": [r"\.pdf$", r"\.zip$", r"\.rar$", r"\.7z$", r"\.tar$", r"\.gz$", r"\.exe$"],
+    "workers": 1,       # Concurrent browser tabs per crawl (CLI: 1 = classic depth-first crawl)
+    "max_sitemaps": 50,  # Max sitemap files read when seeding from sitemaps (--sitemap)
+    "converter": "markdownify",  # HTML→MD engine: markdownify (BeautifulSoup) / fast (lxml, --converter fast)
+    "convert_procs": 0,  # HTML→MD converter processes (0 = convert inline on the crawl thread)
+    "convert_backlog": 2,  # Rendered pages waiting for conversion, per converter process
+    "batch_jobs": 4,     # Seeds crawled at the same time in batch mode (--seeds-file)
+    "max_in_flight": 0,  # Pages fetched at the same time by all jobs of a Crawler (0 = no global limit)
+    "canonical_urls": True,  # Dedupe and name pages by canonical URL (False = every URL spelling is its own page)
+    "honor_canonical": True,  # Save redirected / <link rel=canonical> pages under their target (in scope only)
+    "drop_params": ["utm_*", "gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid",
+                    "_ga", "_gl", "_hsenc", "_hsmi", "igshid", "ref_src"],  # Tracking query params (fnmatch)
+    "index_pages": ["index.html", "index.htm", "index.php", "default.htm", "default.html", "default.aspx"],
+    "lowercase_paths": False,  # Case-insensitive URL paths (IIS-style servers)
+    "large_crawl": False,  # Bloom-filtered on-disk URL sets + disk-spilling frontier (--large-crawl)
+    "large_crawl_capacity": 1000000,  # Expected URLs per large crawl (sizes the Bloom filters, ~2MB each)
+    "frontier_memory": 10000,  # Large crawl: frontier URLs kept in memory, the rest is spilled to disk
+    "order": "discovery",  # Frontier order (--order): discovery (depth-first stack / FIFO queue), depth, inlinks, sitemap
+    "html_cache": True,  # Keep the rendered HTML of saved pages in the save dir for --reconvert
+    "html_cache_ttl_days": 30,  # Drop cached pages older than this (0 = keep forever)
+    "html_cache_max_mb": 1024,  # Drop the oldest cached pages past this compressed size (MB, 0 = unbounded)
+    "output": "files",  # files = one MD file per page, jsonl / sqlite / tar / zip = one bundle file (--output)
+    "output_path": "",  # Bundle file ("" = pages.<format> in the save dir, "-" = stdout for jsonl)
+    "output_batch": 100,  # Bundle records written per batch by the background writer
+    "output_flush_s": 1.0  # Max time a record waits for its batch (s), bounds how far readers lag behind
+}
+# ==================================================================================
+
+NOT_MODIFIED = "<web2md:not-modified>"  # Page content marker: unchanged since the last run
+MANIFEST_PAGE_FIELDS = ("etag", "last_modified", "html_hash")  # page_meta keys stored in the manifest
+# Config sections a Crawler accepts overrides for, and their defaults
+CONFIG_SECTIONS = {
+    "playwright": PLAYWRIGHT_CONFIG,
+    "media": MEDIA_CONFIG,
+    "fetch": FETCH_CONFIG,
+    "crawl": DEFAULT_CRAWL_CONFIG,
+    "markdown": MARKDOWN_OPTIONS
+}
+
+def build_config(overrides=None):
+    """Copy of the default config sections with overrides applied
+    :param overrides: {section: {key: value}}, e.g. {"fetch": {"mode": "auto"}}
+    :return: {section: dict} for every section of CONFIG_SECTIONS
+    """
+    overrides = overrides or {}
+    unknown = set(overrides) - set(CONFIG_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown config section(s): {', '.join(sorted(unknown))} | Use {', '.join(CONFIG_SECTIONS)}")
+    config = {}
+    for section, defaults in CONFIG_SECTIONS.items():
+        config[section] = copy.deepcopy(defaults)
+        config[section].update(copy.deepcopy(overrides.get(section) or {}))
+    return config
+
+def get_url_parent_dir(url):
+    """Extract parent directory of any URL (core for generating base_url)
+    Example: https://company.com/docs/home → https://company.com/docs/
+    Example: https://company.com/docs/ → https://company.com/docs/
+    """
+    parsed = urlparse(url)
+    path = parsed.path.rstrip('/')
+    # Set parent path to self if path is empty or only '/'
+    if not path or path == '/':
+        parent_path = '/'
+    else:
+        parent_path = os.path.dirname(path)
+        if not parent_path.startswith('/'):
+            parent_path = f"/{parent_path}"
+    # Reassemble parent URL, force end with '/' for easy prefix matching
+    parent_parsed = parsed._replace(path=parent_path.rstrip('/') + '/')
+    return urlunparse(parent_parsed)
+
+def generate_auto_save_dir(base_url):
+    """Generate default local save dir name (based on base_url's domain + path)"""
+    base_parsed = urlparse(base_url)
+    dir_name = f"{base_parsed.netloc}_{base_parsed.path.strip('/').replace('/', '_')}"
+    dir_name = re.sub(r'[^\w\-]', '_', dir_name)  # Filter illegal chars
+    dir_name = re.sub(r'_+', '_', dir_name).strip('_')
+    return dir_name if dir_name else "web2md_docs"
+
+def get_file_hash(url, length=8):
+    """Generate 8-bit MD5 hash of URL for media file renaming (avoid duplication)"""
+    return hashlib.md5(url.encode('utf-8')).hexdigest()[:length]
+
+def get_valid_media_filename(url, default_ext=".file"):
+    """Generate legal media filename, filter system illegal characters"""
+    try:
+        parsed = urlparse(unquote(url))
+        filename = os.path.basename(parsed.path) or f"media_{get_file_hash(url)}"
+        name, ext = os.path.splitext(filename)
+        ext = ext.lower() if ext else default_ext
+        # Filter cross-platform illegal chars
+        safe_name = re.sub(r'[<>:"/\\|?*]', '_', name)
+        safe_name = re.sub(r'_+', '_', safe_name).strip('_')
+        return f"{safe_name}_{get_file_hash(url)}{ext}"
+    except Exception:
+        return f"fallback_{get_file_hash(url)}{default_ext}"
+
+def selector_to_css(tag, attrs):
+    """Convert a CORE_CONTENT_SELECTORS entry to a CSS selector (for in-browser checks)
+    Example: ("div", {"class_": "content"}) → div.content
+    """
+    css = tag
+    for key, value in attrs.items():
+        if key in ("class_", "class"):
+            css += "".join(f".{cls}" for cls in str(value).split())
+        elif key == "id":
+            css += f"#{value}"
+        else:
+            css += f'[{key}="{value}"]'
+    return css
+
+def get_extract_text(extract):
+    """Everything an in-browser extraction sent back, as one string (for sizes and hashes)"""
+    return extract.core_html + "\n" + "\n".join(extract.links)
+
+def parse_html(html, converter="markdownify"):
+    """Parse rendered HTML once into the tree shared by the whole page pipeline
+    BeautifulSoup (lxml builder) for the markdownify engine, a plain lxml tree for --converter fast
+    """
+    if not html:
+        return None
+    if not isinstance(html, str):
+        return html  # Already parsed (e.g. by the static fetch heuristic)
+    if converter == "fast":
+        return fastmd.parse_html(html)
+    return BeautifulSoup(html, "lxml")
+
+def iter_tags(root, name):
+    """All <name> elements below root (BeautifulSoup or lxml tree)"""
+    if isinstance(root, Tag):
+        return root.find_all(name)
+    return list(root.iter(name))
+
+def find_tag(root, name, attrs=None):
+    """First <name> element below root matching attrs (BeautifulSoup or lxml tree)
+    "class_" in CORE_CONTENT_SELECTORS means the HTML class attribute for both trees
+    """
+    attrs = attrs or {}
+    if isinstance(root, Tag):
+        return root.find(name, attrs={("class" if key == "class_" else key): value for key, value in attrs.items()})
+    return fastmd.find_first(root, name, attrs)
+
+def set_attr(el, attr, value):
+    """Set an attribute on a BeautifulSoup or lxml element"""
+    if isinstance(el, Tag):
+        el[attr] = value
+    else:
+        el.set(attr, value)
+
+def remove_tag(el):
+    """Remove an element and its content from the tree (its tail text stays)"""
+    if isinstance(el, Tag):
+        el.decompose()
+    else:
+        el.drop_tree()
+
+def tag_text(el):
+    """Visible text of an element, each text node stripped (BeautifulSoup or lxml tree)"""
+    if isinstance(el, Tag):
+        return el.get_text(strip=True)
+    return "".join(text.strip() for text in fastmd.iter_text(el))
+
+def strip_useless_tags(soup):
+    """Remove REMOVE_TAGS elements from parsed page (in place)"""
+    for tag in REMOVE_TAGS:
+        for elem in iter_tags(soup, tag):
+            remove_tag(elem)
+    return soup
+
+def select_core_content(soup):
+    """Match core content selectors by priority, fall back to <body>
+    :return: Core content Tag / None
+    """
+    core_content = None
+    for tag, attrs in CORE_CONTENT_SELECTORS:
+        core_content = find_tag(soup, tag, attrs)
+        if core_content is not None:
+            print(f"✅ Core content matched: <{tag} {attrs}>")
+            break
+    # Fallback: Extract entire body if no selector matched
+    if core_content is None:
+        core_content = find_tag(soup, "body")
+        if core_content is None:
+            print(f"❌ No extractable content found")
+            return None
+        print(f"⚠️  No precise selector matched, extract entire <body> content")
+    return core_content
+
+def extract_page_links(soup, base_uri):
+    """Extract all absolute link targets from parsed page (before crawl rules are applied)"""
+    if soup is None or not base_uri:
+        return []
+    links = {}
+    for a in iter_tags(soup, "a"):
+        href = a.get("href", "").strip()
+        # Filter mail/tel/JS/anchor links
+        if not href or href.startswith(SKIP_LINK_PREFIXES):
+            continue
+        # Assemble to absolute URL using browser's resolved base URI
+        links[urljoin(base_uri, href)] = True
+    return list(links)
+
+def html2md(html_content, converter="markdownify", markdown_options=None):
+    """Convert HTML (parsed Tag/lxml element or string) to Markdown, reserve images/videos/tables/codes/lists"""
+    if html_content is None or html_content == "":
+        return None
+    options = MARKDOWN_OPTIONS if markdown_options is None else markdown_options
+    try:
+        # Walk the already-parsed tree directly, only strings need parsing here
+        if isinstance(html_content, str) and converter == "fast":
+            html_content = fastmd.parse_html(html_content)
+        if isinstance(html_content, str):
+            md_content = markdownify.MarkdownConverter(**options).convert(html_content)
+        elif isinstance(html_content, Tag):
+            md_content = markdownify.MarkdownConverter(**options).convert_soup(html_content)
+        else:
+            md_content = fastmd.MarkdownConverter(**options).convert(html_content)
+        # Clean extra blank lines and trailing spaces
+        md_lines = [line.rstrip() for line in md_content.splitlines() if line.strip()]
+        return "\n".join(md_lines).strip()
+    except Exception as e:
+        print(f"❌ HTML to Markdown conversion failed: {str(e)[:80]}")
+        return None
+
+def write_md_file(md_content, md_file_path):
+    """Write MD content to md_file_path (no count check, also used by converter processes)
+    :return: MD file path (success) / False (failed)
+    """
+    try:
+        # Write file with utf-8 encoding (support all characters)
+        with open(md_file_path, "w", encoding="utf-8") as f:
+            f.write(md_content)
+        return md_file_path
+    except IOError as e:
+        print(f"❌ MD file save failed: {str(e)[:80]} - {os.path.basename(md_file_path)}")
+        return False
+
+def note_fetch(record, page_meta):
+    """Copy a page's fetch path (static / browser / not_modified), HTML size, attempts and error into its report record"""
+    if record is not None:
+        record["fetch_path"] = page_meta.get("fetch_path")
+        if page_meta.get("html_bytes"):
+            record["sizes"]["html_bytes"] = page_meta["html_bytes"]
+        if page_meta.get("attempts", 1) > 1:
+            record["attempts"] = page_meta["attempts"]
+        if page_meta.get("error"):
+            record["error"] = page_meta["error"]
+
+def convert_page_job(settings, url, html, final_url, page_base_url, known_md_hash, with_timings, write=True):
+    """Converter process side of CrawlJob.process_page: parse, extract, convert and write one page
+    :param settings: CrawlJob.get_convert_settings() of the job the page belongs to
+    :param known_md_hash: MD hash of the last run, the file is not rewritten if it matches
+    :param write: Write the MD file (False = return the Markdown for the main process's output sink)
+    :return: Dict with page_links, md_path, md_hash, md_bytes, status (empty/unchanged/written/failed/converted),
+             markdown (status converted only), media (downloads for the main process) and timings/sizes (if with_timings)
+    """
+    job = CrawlJob.from_convert_settings(settings)
+    record = {"timings": {}, "sizes": {}} if with_timings else None
+    job.media_job_sink = []
+    page_links, md_content = job.render_markdown(url, html, final_url, page_base_url, record)
+    result = {"page_links": page_links, "md_path": None, "md_hash": None, "md_bytes": 0,
+              "status": "empty", "media": job.media_job_sink, "record": record}
+    if not md_content:
+        return result
+    md_bytes = md_content.encode("utf-8")
+    result["md_path"] = job.get_md_file_path(url)
+    result["md_hash"] = hashlib.sha1(md_bytes).hexdigest()
+    result["md_bytes"] = len(md_bytes)
+    if result["md_hash"] == known_md_hash:
+        result["status"] = "unchanged"
+        return result
+    if not write:
+        result["status"] = "converted"
+        result["markdown"] = md_content
+        return result
+    with timed(record, "save"):
+        result["status"] = "written" if write_md_file(md_content, result["md_path"]) else "failed"
+    return result
+
+def load_cached_page(kind, body):
+    """Page content (HTML text / BrowserExtract) of an HtmlCache entry"""
+    text = decompress_page(body)
+    return BrowserExtract(**json.loads(text)) if kind == "extract" else text
+
+def reconvert_page_job(settings, url, kind, body, final_url, page_base_url, write=True):
+    """Converter process side of CrawlJob.reconvert: convert_page_job on a cached page
+    The MD file is only rewritten when its content changes.
+    :param write: Write MD files (False = return the Markdown for the output sink)
+    :return: convert_page_job result
+    """
+    md_file_path = CrawlJob.from_convert_settings(settings).get_md_file_path(url)
+    known_md_hash = None
+    if write and os.path.exists(md_file_path):
+        with open(md_file_path, "rb") as f:
+            known_md_hash = hashlib.sha1(f.read()).hexdigest()
+    return convert_page_job(settings, url, load_cached_page(kind, body), final_url, page_base_url, known_md_hash, False,
+                            write)
+
+
+class CrawlJob:
+    """One crawl: base URL rules, output dir, limits and all per-crawl state
+    Created by Crawler.crawl() / crawl_async(), shared resources come from the crawler.
+    :param target_url: Page the crawl starts from (its parent dir becomes base_url)
+    :param save_dir: Local root save directory (None = generated from base_url)
+    :param depth: Max relative crawl depth based on base_url
+    :param count: Max crawl file count (0 = unlimited)
+    :param picture: Crawl pictures (--picture)
+    :param video: Crawl videos (--video)
+    :param config: build_config() result
+    :param crawler: Crawler providing the browser host, HTTP sessions and converter pool
+    """
+
+    def __init__(self, target_url, save_dir=None, depth=None, count=None, picture=False, video=False,
+                 config=None, crawler=None):
+        self.config = config or build_config()
+        self.playwright_config = self.config["playwright"]
+        self.media_config = self.config["media"]
+        self.fetch_config = self.config["fetch"]
+        self.crawl_config = self.config["crawl"]
+        self.markdown_options = self.config["markdown"]
+        self.crawler = crawler
+        self.target_url = target_url
+        self.base_url = get_url_parent_dir(target_url)  # Dynamic base URL (parent dir of target URL, core benchmark)
+        self.root_save_dir = os.path.abspath(save_dir or generate_auto_save_dir(self.base_url))
+        self.max_crawl_depth = self.crawl_config["max_depth"] if depth is None else depth
+        self.max_crawl_count = self.crawl_config["max_count"] if count is None else count
+        self.crawl_picture = picture
+        self.crawl_video = video
+        self.crawled_urls = set()    # Canonical keys of claimed URLs (queued or crawled) to avoid duplication
+        self.url_variants = set()    # URL spellings seen for claimed keys (counts fetches saved by canonicalisation)
+        self.page_keys = set()       # Canonical keys of fetched pages, incl. redirect / rel=canonical targets
+        self.url_stats = {"merged": 0, "duplicates": 0}  # Variant URLs not fetched / duplicate pages not converted
+        self.url_rules = (
+            tuple(param.lower() for param in self.crawl_config["drop_params"]),
+            tuple(name.lower() for name in self.crawl_config["index_pages"]),
+            self.crawl_config["lowercase_paths"]
+        )
+        self.base_key_prefix = self.url_key(self.base_url).lower().rstrip('/') + '/'
+        self.base_parsed = urlparse(self.url_key(self.base_url))
+        self.crawled_count = 0       # Current crawled file count (real-time statistics)
+        self.fetch_stats = {"static": 0, "browser": 0, "fallback": 0, "unchanged": 0}  # Pages per fetch path
+        self.retry_stats = {"retries": 0, "recovered": 0, "failed": 0}  # Transient fetch failures
+        self.browser_pool = None     # Sync browser + page pool (depth-first crawl only)
+        self.media_downloader = None # Background media download pool (--picture/--video)
+        self.crawl_state = None      # Persistent frontier/visited/status store (--resume)
+        self.large_store = None      # On-disk exact URL sets behind the Bloom filters (--large-crawl)
+        self.crawl_manifest = None   # Cross-run page manifest (--incremental)
+        self.html_cache = None       # Rendered HTML of saved pages, for --reconvert
+        self.frontier = None         # Queue of the running concurrent crawl
+        self.inlinks = {} if self.crawl_config["order"] == "inlinks" else None  # Canonical key -> linking pages
+        self.sitemap_hints = {}      # Canonical key -> (sitemap priority, lastmod timestamp) (--order sitemap)
+        self.output_sink = None      # Bundle output replacing the MD files (--output jsonl/sqlite/tar/zip)
+        self.output_result = None    # (format, path, records written) once the output sink is closed
+        self.crawl_report = None     # Per-page timing report (--report)
+        self.convert_pool = None     # Crawler's HTML→MD converter process pool (--convert-procs)
+        self.media_job_sink = None   # Converter process only: collects media downloads for the main process
+        self.media_result = (0, 0, 0, 0)  # (downloaded, captured, reused, failed) once the downloads finished
+        self.media_capture = MediaCapture()  # Media bodies captured while rendering, until their page is converted
+        self.incremental_stats = None
+
+    @classmethod
+    def from_convert_settings(cls, settings):
+        """Job view used inside a converter process (no crawl state, --count enforced by the main process)"""
+        return cls(settings["target_url"], settings["save_dir"], settings["depth"], 0,
+                   settings["picture"], settings["video"], config=settings["config"])
+
+    def get_convert_settings(self):
+        """Job settings a converter process needs (sent with every page)"""
+        return {
+            "target_url": self.target_url,
+            "save_dir": self.root_save_dir,
+            "depth": self.max_crawl_depth,
+            "picture": self.crawl_picture,
+            "video": self.crawl_video,
+            "config": self.config
+        }
+
+    def print_config(self):
+        """Print the job settings before crawling"""
+        print(f"🔧 Crawl Config Initialized")
+        print(f"   ├─ Target URL: {self.target_url}")
+        print(f"   ├─ Base URL (Benchmark): {self.base_url} (All operations based on this)")
+        print(f"   ├─ Local Save Dir: {self.root_save_dir}")
+        print(f"   ├─ Max Crawl Depth: {self.max_crawl_depth}")
+        print(f"   ├─ Max Crawl Count: {self.max_crawl_count} (0 = unlimited)")
+        print(f"   ├─ Crawl Pictures: {'✅ Enabled' if self.crawl_picture else '❌ Disabled'} (--picture)")
+        print(f"   ├─ Crawl Videos: {'✅ Enabled' if self.crawl_video else '❌ Disabled'} (--video)")
+        if self.crawl_config["output"] != "files":
+            print(f"   ├─ Output: {self.crawl_config['output']} bundle (--output)")
+        print(f"   ├─ Fetch Mode: {self.fetch_config['mode']}" + (f" (always render: {', '.join(self.fetch_config['render_hosts'])})" if self.fetch_config["render_hosts"] else ""))
+        if self.fetch_config["adaptive_rate"]:
+            print(f"   ├─ Host Rate: adaptive, {self.fetch_config['host_start_concurrency']} → max {self.fetch_config['host_max_concurrency']} "
+                  f"per host | robots.txt Crawl-delay {'obeyed' if self.fetch_config['respect_crawl_delay'] else 'ignored'}")
+        else:
+            print(f"   ├─ Host Rate: ❌ Not limited")
+        print(f"   ├─ Render Wait: {self.playwright_config['wait_strategy']} | Extraction: {self.playwright_config['extract']} | Resource Blocking: {'✅ Enabled' if self.playwright_config['block_resources'] else '❌ Disabled'}")
+        print(f"   └─ Browser Pool: {self.crawl_config['workers']} page(s), one per tab (--workers), recycle after {self.playwright_config['recycle_after']} navigations")
+
+    def count_reached(self):
+        """--count limit reached (never with count 0)"""
+        return self.max_crawl_count > 0 and self.crawled_count >= self.max_crawl_count
+
+    # ---------- Media ----------
+
+    def get_media_downloader(self):
+        """Get the background media download pool, starting it on first use"""
+        if self.media_downloader is None:
+            self.media_downloader = MediaDownloader(
+                workers=self.media_config["workers"],
+                max_bytes=int(self.media_config["max_size_mb"] * 1024 * 1024),
+                timeout=self.media_config["timeout"] / 1000,
+                user_agent=self.playwright_config["user_agent"],
+                on_finish=self.crawl_report.add_media if self.crawl_report is not None else None,
+                session=self.crawler.get_media_session() if self.crawler is not None else None,
+                cache=self.crawler.media_cache if self.crawler is not None else None,
+                store=self.crawler.get_media_store() if self.crawler is not None else None,
+                scheduler=self.get_scheduler(),
+                retries=self.fetch_config["retries"],
+                backoff=(self.fetch_config["retry_backoff"], self.fetch_config["retry_backoff_max"])
+            )
+        return self.media_downloader
+
+    def finish_media_downloads(self):
+        """Wait for queued media downloads, point MD files back to the original URL for failed ones
+        :return: (downloaded, captured, reused, failed) counts - captured = written from the browser's responses,
+                 reused = taken from the crawler's media cache
+        """
+        if self.media_downloader is None:
+            return 0, 0, 0, 0
+        failed = self.media_downloader.wait()
+        for media_url, save_path, md_files in failed:
+            self.restore_media_url(media_url, save_path, md_files)
+        downloader = self.media_downloader
+        downloaded, captured, reused = downloader.downloaded, downloader.captured, downloader.reused
+        self.media_downloader.close()
+        self.media_downloader = None
+        return downloaded, captured, reused, len(failed)
+
+    def restore_media_url(self, media_url, save_path, md_files):
+        """Point links to a media file that could not be saved back to its original URL"""
+        for md_file_path in md_files:
+            rel_path = os.path.relpath(save_path, os.path.dirname(md_file_path)).replace(os.sep, '/')
+            if self.output_sink is not None:
+                self.output_sink.replace_text(self.get_output_record_path(md_file_path), f"({rel_path}", f"({media_url}")
+                continue
+            try:
+                with open(md_file_path, "r", encoding="utf-8") as f:
+                    md_content = f.read()
+                with open(md_file_path, "w", encoding="utf-8") as f:
+                    f.write(md_content.replace(f"({rel_path}", f"({media_url}"))
+            except IOError as e:
+                print(f"⚠️  Failed to restore media URL in {os.path.basename(md_file_path)}: {str(e)[:50]}")
+
+    def link_offline_media(self, media_jobs):
+        """--reconvert: take media missing from the save dir from the media store (never downloaded),
+        files the store does not have keep their original URL
+        :return: (linked, missing) counts
+        """
+        store = self.crawler.get_media_store() if self.crawler is not None else None
+        linked = missing = 0
+        for media_url, save_path, md_file_path, _ in media_jobs:
+            stored = store.get(media_url) if store is not None else None
+            if stored and not os.path.exists(save_path):
+                try:
+                    link_or_copy(stored, save_path)
+                except OSError:
+                    stored = None
+            if stored or os.path.exists(save_path):
+                linked += 1
+            else:
+                missing += 1
+                self.restore_media_url(media_url, save_path, [md_file_path])
+        return linked, missing
+
+    def download_media_file(self, media_url, md_file_path, allowed_exts, media_type):
+        """Queue media file (image/video) download, return its local relative path right away
+        Optimization 1: Images/videos are not restricted by the base_url parent directory
+        Optimization 2: Downloads stream to disk on a background pool (SSL verification disabled),
+        page conversion does not wait; failed downloads are reverted to the URL by finish_media_downloads
+        :param media_url: Absolute URL of media file
+        :param md_file_path: Local path of corresponding MD file
+        :param allowed_exts: Allowed media extensions
+        :param media_type: Media type (image/video)
+        :return: Local relative path / original URL (if not downloadable)
+        """
+        if not (self.crawl_picture or self.crawl_video) or not media_url or not md_file_path:
+            return media_url
+        if not media_url.startswith(('http://', 'https://')):
+            return media_url
+        # Validate media extension
+        ext = os.path.splitext(urlparse(unquote(media_url)).path)[1].lower()
+        if ext not in allowed_exts:
+            return media_url
+        # Media save dir: same level as MD → images/ / videos/
+        md_dir = os.path.dirname(md_file_path)
+        media_dir = os.path.join(md_dir, self.media_config[f"{media_type}_dir"])
+        os.makedirs(media_dir, exist_ok=True)
+        # Generate legal filename
+        filename = get_valid_media_filename(media_url, ext)
+        save_path = os.path.join(media_dir, filename)
+        rel_path = os.path.relpath(save_path, md_dir).replace(os.sep, '/')
+        # Return relative path if file already exists
+        if os.path.exists(save_path):
+            return rel_path
+        source = "captured from the browser" if self.media_capture.get(media_url) is not None else "from"
+        print(f"📥 Download {media_type}: {filename} ({source}: {media_url})")
+        if self.media_job_sink is not None:
+            # Converter process: the main process owns the download pool
+            self.media_job_sink.append((media_url, save_path, md_file_path, media_type))
+            return rel_path
+        self.submit_media(media_url, save_path, md_file_path, media_type)
+        return rel_path
+
+    def submit_media(self, media_url, save_path, md_file_path, media_type):
+        """Hand a media file to the download pool, with the browser's copy of it if one was captured"""
+        self.get_media_downloader().submit(media_url, save_path, ref_file=md_file_path, label=media_type,
+                                           body=self.media_capture.get(media_url))
+
+    def crawl_media(self, soup, md_file_path, current_url):
+        """Crawl pictures/videos on demand, replace soup links with local relative paths"""
+        if soup is None or not md_file_path:
+            return soup
+
+        def extract_best_url(tag, attrs):
+            """Extract best possible URL from a list of attributes (handles lazy-loading and srcset)"""
+            for attr in attrs:
+                val = tag.get(attr, "").strip()
+                if not val:
+                    continue
+                if attr == "srcset":
+                    # Handle srcset: "url1 size1, url2 size2"
+                    # Pick the last one (usually highest quality)
+                    parts = [p.strip() for p in val.split(",") if p.strip()]
+                    if parts:
+                        return parts[-1].split(" ")[0].strip()
+                return val
+            return None
+
+        img_exts = self.media_config["allowed_img_ext"]
+        vid_exts = self.media_config["allowed_vid_ext"]
+        # Crawl pictures
+        if self.crawl_picture:
+            for img in iter_tags(soup, "img"):
+                # Priority: Common lazy-load attrs > srcset > src
+                src = extract_best_url(img, ["data-src", "data-original", "data-original-src", "file-src", "srcset", "src"])
+                if src:
+                    abs_src = urljoin(current_url, src)
+                    set_attr(img, "src", self.download_media_file(abs_src, md_file_path, img_exts, "image"))
+
+        # Crawl videos
+        if self.crawl_video:
+            # Process <video> tag
+            for video in iter_tags(soup, "video"):
+                src = extract_best_url(video, ["src", "data-src"])
+                if src:
+                    abs_src = urljoin(current_url, src)
+                    set_attr(video, "src", self.download_media_file(abs_src, md_file_path, vid_exts, "video"))
+
+            # Process <source> tag
+            for source in iter_tags(soup, "source"):
+                src = extract_best_url(source, ["src", "srcset"])
+                if src:
+                    abs_src = urljoin(current_url, src)
+                    ext = os.path.splitext(urlparse(unquote(abs_src)).path)[1].lower()
+                    if ext in vid_exts:
+                        set_attr(source, "src", self.download_media_file(abs_src, md_file_path, vid_exts, "video"))
+                    elif ext in img_exts and self.crawl_picture:
+                        set_attr(source, "src", self.download_media_file(abs_src, md_file_path, img_exts, "image"))
+        return soup
+
+    # ---------- Browser rendering ----------
+
+    def get_browser_context_options(self):
+        """Options for every pooled browser context (sync and async pools)"""
+        return {
+            "user_agent": self.playwright_config["user_agent"],
+            "viewport": {"width": 1920, "height": 1080},
+            "extra_http_headers": {"Referer": self.base_url},
+            "ignore_https_errors": True  # Playwright ignores HTTPS errors
+        }
+
+    def get_blocked_url_patterns(self):
+        """URL patterns the browser should not load for this crawl"""
+        if not self.playwright_config["block_resources"]:
+            return []
+        patterns = BLOCKED_URL_PATTERNS["font"] + BLOCKED_URL_PATTERNS["tracker"]
+        if not self.crawl_picture:
+            patterns += [f"*{ext}{suffix}" for ext in self.media_config["allowed_img_ext"] for suffix in ("", "?*")]
+        if not self.crawl_video:
+            patterns += [f"*{ext}{suffix}" for ext in self.media_config["allowed_vid_ext"] for suffix in ("", "?*")]
+        return patterns
+
+    def get_goto_wait_until(self):
+        """Navigation event to wait for (smart strategy waits for the DOM itself afterwards)"""
+        return "domcontentloaded" if self.playwright_config["wait_strategy"] == "smart" else self.playwright_config["wait_for_load"]
+
+    def get_ready_args(self):
+        """Arguments of wait_until_ready for the smart strategy"""
+        selectors = [selector_to_css(tag, attrs) for tag, attrs in CORE_CONTENT_SELECTORS]
+        return (selectors, self.playwright_config["dom_quiet_ms"], self.playwright_config["core_wait_ms"],
+                self.playwright_config["timeout"])
+
+    def get_extract_args(self):
+        """Arguments of extract_in_page (--extract browser)"""
+        selectors = [selector_to_css(tag, attrs) for tag, attrs in CORE_CONTENT_SELECTORS]
+        return (selectors, REMOVE_TAGS, SKIP_LINK_PREFIXES)
+
+    def begin_media_capture(self, page):
+        """Record the media responses of the page's next navigation (--picture / --video with capture on)
+        :return: Capture handle / None
+        """
+        if not self.media_config["capture"] or not (self.crawl_picture or self.crawl_video):
+            return None
+        extensions = set()
+        if self.crawl_picture:
+            extensions.update(self.media_config["allowed_img_ext"])
+        if self.crawl_video:
+            extensions.update(self.media_config["allowed_vid_ext"])
+        return start_media_capture(page, extensions, int(self.media_config["capture_max_mb"] * 1024 * 1024))
+
+    def keep_captured_media(self, bodies, page_meta):
+        """Hold captured media bodies until the page is converted (released by record_page_result)"""
+        if bodies:
+            page_meta["captured_media"] = self.media_capture.add(bodies)
+
+    def get_browser_pool(self):
+        """Get the sync browser pool of the depth-first crawl, launching Chromium on first use"""
+        if self.browser_pool is None:
+            self.browser_pool = BrowserPool(
+                size=1,  # The depth-first crawl renders one page at a time
+                recycle_after=self.playwright_config["recycle_after"],
+                headless=self.playwright_config["headless"],
+                context_options=self.get_browser_context_options(),
+                blocked_urls=self.get_blocked_url_patterns()
+            )
+        return self.browser_pool.start()
+
+    def close_browser_pool(self):
+        """Shut down the sync browser (called once at the end of a depth-first crawl)"""
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+            self.browser_pool = None
+
+    def get_dynamic_html(self, url, page_meta=None):
+        """Get dynamically rendered HTML content via Playwright (adapt to JS loaded pages)
+        Uses a warm page from the job's browser pool instead of launching Chromium per URL
+        :param page_meta: Dict receiving "error" / "retryable" when the navigation fails
+        :return: (html or BrowserExtract, final_url, base_uri) or (None, None, None)
+        """
+        page_meta = {} if page_meta is None else page_meta
+        page = None
+        capture = None
+        broken = False
+        try:
+            pool = self.get_browser_pool()
+            page = pool.acquire()
+            capture = self.begin_media_capture(page)
+            with self.host_request(url, "browser") as host_request:
+                response = page.goto(
+                    url,
+                    timeout=self.playwright_config["timeout"],
+                    wait_until=self.get_goto_wait_until()
+                )
+                if not self.check_response(url, response, host_request, page_meta):
+                    return None, None, None
+                if self.playwright_config["wait_strategy"] == "smart":
+                    wait_until_ready(page, *self.get_ready_args())
+                else:
+                    time.sleep(self.playwright_config["sleep_after_load"])
+            final_url = page.url
+            if self.playwright_config["extract"] == "browser":
+                # Only links + core fragment come back, the full DOM is never serialised
+                html = extract_in_page(page, *self.get_extract_args())
+                base_uri = html.base_uri or final_url
+            else:
+                html = page.content()
+                # Get the actual base URI used by the browser (handles <base> tags and redirects)
+                base_uri = page.evaluate("document.baseURI") or final_url
+            if capture is not None:
+                self.keep_captured_media(collect_media_bodies(capture), page_meta)
+            print(f"✅ Page loaded successfully: {url}")
+            return html, final_url, base_uri
+        except HostUnavailable as e:
+            print(f"⛔ Page skipped, {e} - {url}")
+            page_meta["error"] = str(e)
+            return None, None, None
+        except PlaywrightTimeoutError:
+            broken = True
+            print(f"❌ Page load timeout: Exceed {self.playwright_config['timeout']/1000}s - {url}")
+            page_meta.update(error="page load timeout", retryable=True)
+            return None, None, None
+        except Exception as e:
+            broken = True
+            print(f"❌ Page request failed: {str(e)[:80]} - {url}")
+            page_meta.update(error=str(e)[:200], retryable=any(text in str(e) for text in TRANSIENT_BROWSER_ERRORS))
+            return None, None, None
+        finally:
+            if capture is not None:
+                stop_media_capture(capture)
+            if page is not None and self.browser_pool is not None:
+                self.browser_pool.release(page, broken=broken)
+
+    async def get_dynamic_html_async(self, url, pool, page_meta=None):
+        """asyncio twin of get_dynamic_html, renders on a tab from an AsyncBrowserPool
+        :return: (html or BrowserExtract, final_url, base_uri) or (None, None, None)
+        """
+        page_meta = {} if page_meta is None else page_meta
+        page = None
+        capture = None
+        broken = False
+        try:
+            page = await pool.acquire()
+            capture = self.begin_media_capture(page)
+            async with self.host_request(url, "browser") as host_request:
+                response = await page.goto(
+                    url,
+                    timeout=self.playwright_config["timeout"],
+                    wait_until=self.get_goto_wait_until()
+                )
+                if not self.check_response(url, response, host_request, page_meta):
+                    return None, None, None
+                if self.playwright_config["wait_strategy"] == "smart":
+                    await wait_until_ready_async(page, *self.get_ready_args())
+                else:
+                    await asyncio.sleep(self.playwright_config["sleep_after_load"])
+            final_url = page.url
+            if self.playwright_config["extract"] == "browser":
+                html = await extract_in_page_async(page, *self.get_extract_args())
+                base_uri = html.base_uri or final_url
+            else:
+                html = await page.content()
+                base_uri = await page.evaluate("document.baseURI") or final_url
+            if capture is not None:
+                self.keep_captured_media(await collect_media_bodies_async(capture), page_meta)
+            print(f"✅ Page loaded successfully: {url}")
+            return html, final_url, base_uri
+        except HostUnavailable as e:
+            print(f"⛔ Page skipped, {e} - {url}")
+            page_meta["error"] = str(e)
+            return None, None, None
+        except AsyncPlaywrightTimeoutError:
+            broken = True
+            print(f"❌ Page load timeout: Exceed {self.playwright_config['timeout']/1000}s - {url}")
+            page_meta.update(error="page load timeout", retryable=True)
+            return None, None, None
+        except Exception as e:
+            broken = True
+            print(f"❌ Page request failed: {str(e)[:80]} - {url}")
+            page_meta.update(error=str(e)[:200], retryable=any(text in str(e) for text in TRANSIENT_BROWSER_ERRORS))
+            return None, None, None
+        finally:
+            if capture is not None:
+                stop_media_capture(capture)
+            if page is not None:
+                await pool.release(page, broken=broken)
+
+    # ---------- Per-host rate limiting ----------
+
+    def get_scheduler(self):
+        """The crawler's per-host HostScheduler (rate window + circuit breaker) / None without crawler"""
+        return self.crawler.get_scheduler() if self.crawler is not None else None
+
+    def host_request(self, url, kind=None):
+        """Slot for one request to url's host (`with` / `async with`), a no-op without scheduler"""
+        scheduler = self.get_scheduler()
+        return scheduler.request(url, kind) if scheduler is not None else UNSCHEDULED
+
+    def check_response(self, url, response, host_request, page_meta):
+        """Feed a navigation's status / Retry-After to the scheduler
+        :return: False if the host answered 429 or a transient 5xx (page not usable, worth a retry)
+        """
+        if response is None:
+            return True  # Same-document navigation, no HTTP response
+        host_request.set_response(response.status, response.headers.get("retry-after"))
+        if response.status in RETRY_STATUSES:
+            print(f"⏳ Host answered HTTP {response.status}, page not usable - {url}")
+            page_meta.update(error=f"HTTP {response.status}", retryable=True)
+            return False
+        return True
+
+    def get_retry_delay(self, attempt):
+        """Seconds to wait before retry number attempt (exponential backoff with jitter)"""
+        return backoff_delay(attempt, self.fetch_config["retry_backoff"], self.fetch_config["retry_backoff_max"])
+
+    # ---------- Static fetch (--fetch auto) ----------
+
+    def get_http_session(self):
+        """Pooled HTTP session used for static fetches (shared by all jobs of the crawler)"""
+        return self.crawler.get_http_session()
+
+    def needs_js_render(self, soup):
+        """Heuristic: does a statically fetched page need a browser to show its content?
+        :return: Reason string (render it) / None (static HTML is good enough)
+        """
+        if soup is None:
+            return "unparsable HTML"
+        body = find_tag(soup, "body")
+        if body is None:
+            return "no <body>"
+        for tag, attrs in CORE_CONTENT_SELECTORS:
+            core_content = find_tag(soup, tag, attrs)
+            if core_content is not None:
+                if len(tag_text(core_content)) < self.fetch_config["min_core_chars"]:
+                    return f"empty core container <{tag} {attrs}>"
+                break
+        if len(tag_text(body)) < self.fetch_config["min_text_chars"]:
+            return "almost no body text"
+        return None
+
+    def get_static_page(self, url, page_meta):
+        """Try to get a page with plain HTTP (no browser)
+        :param page_meta: Dict filled with HTTP validators / HTML hash of the response,
+                          "error" (+ "retryable") when rendering would not help either
+        :return: (soup or NOT_MODIFIED, final_url, base_uri, reason) - soup is None if the page must be rendered
+        """
+        if urlparse(url).hostname in self.fetch_config["render_hosts"]:
+            return None, None, None, "host always rendered"
+        try:
+            headers = {"Referer": self.base_url}
+            headers.update(self.get_conditional_headers(url) or {})
+            with self.host_request(url, "static") as host_request:
+                html, final_url, base_uri, validators = fetch_static_html(
+                    self.get_http_session(), url, self.fetch_config["timeout"], headers=headers
+                )
+                host_request.set_response(validators["status"], validators["retry_after"])
+        except HostUnavailable as e:
+            page_meta["error"] = str(e)
+            return None, None, None, "host down"
+        except Exception as e:
+            if is_transient_error(e):  # The browser would hit the same network problem
+                page_meta.update(error=f"static fetch failed: {str(e)[:150]}", retryable=True)
+            return None, None, None, f"static fetch failed: {str(e)[:50]}"
+        page_meta["etag"] = validators["etag"]
+        page_meta["last_modified"] = validators["last_modified"]
+        if validators["status"] == 304:
+            page_meta["fetch_path"] = "not_modified"
+            return NOT_MODIFIED, final_url, None, None
+        if validators["status"] in (404, 410):
+            page_meta["gone"] = True
+            return None, None, None, f"HTTP {validators['status']}"
+        if validators["status"] in RETRY_STATUSES:
+            page_meta.update(error=f"HTTP {validators['status']}", retryable=True)  # Rendering would hit the same limit
+            return None, None, None, f"HTTP {validators['status']}"
+        if not html:
+            return None, None, None, "not an HTML page"
+        page_meta["html_bytes"] = len(html)
+        if self.check_unchanged(url, html, page_meta) is NOT_MODIFIED:
+            page_meta["fetch_path"] = "not_modified"
+            return NOT_MODIFIED, final_url, base_uri, None  # Skip parsing too
+        soup = self.parse_html(html)
+        reason = self.needs_js_render(soup)
+        if not reason:
+            self.note_canonical_link(html, base_uri, page_meta)
+        if reason:
+            return None, None, None, reason
+        page_meta["fetch_path"] = "static"
+        if self.convert_pool is not None or self.html_cache is not None:
+            page_meta["raw_html"] = html  # Converter processes re-parse the text, the HTML cache stores it
+        return soup, final_url, base_uri, None
+
+    def record_static_result(self, url, soup, reason, page_meta):
+        """Count which fetch path a page took (for tuning the needs-JS heuristic)"""
+        if soup is NOT_MODIFIED:
+            self.fetch_stats["unchanged"] += 1  # 304 / same HTML: never parsed, says nothing about the heuristic
+            print(f"✅ Page unchanged since last run (static fetch): {url}")
+        elif soup is not None:
+            self.fetch_stats["static"] += 1
+            print(f"✅ Page fetched statically: {url}")
+        elif reason == "host down":
+            print(f"⛔ Page skipped, {page_meta['error']} - {url}")
+        elif page_meta.get("retryable"):
+            print(f"⏳ Static fetch failed ({reason}), page not usable - {url}")
+        elif reason.startswith("HTTP 4"):
+            print(f"❌ Page not found ({reason}) - {url}")
+        elif reason != "host always rendered":
+            self.fetch_stats["fallback"] += 1
+            print(f"🔁 Static fetch not usable ({reason}), rendering with browser - {url}")
+
+    def get_conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since from the last run (--incremental)"""
+        entry = self.crawl_manifest.get(url) if self.crawl_manifest is not None else None
+        if not entry:
+            return None
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers or None
+
+    def check_unchanged(self, url, html, page_meta):
+        """Hash rendered HTML, compare with the last run (--incremental)
+        :return: NOT_MODIFIED if identical to the last run / html unchanged otherwise
+        """
+        if self.crawl_manifest is None or not isinstance(html, (str, BrowserExtract)):
+            return html
+        text = html if isinstance(html, str) else get_extract_text(html)
+        page_meta["html_hash"] = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        entry = self.crawl_manifest.get(url)
+        if entry and entry["html_hash"] == page_meta["html_hash"]:
+            return NOT_MODIFIED
+        return html
+
+    def check_rendered_html(self, url, html, base_uri, page_meta):
+        """Note size/fetch path/canonical link of browser-rendered HTML, then compare it with the last run"""
+        page_meta["fetch_path"] = "browser"
+        if isinstance(html, BrowserExtract):
+            if html.core_html is None:
+                print(f"❌ No extractable content found - {url}")
+                return None
+            page_meta["html_bytes"] = len(get_extract_text(html))
+            if html.canonical:
+                page_meta["canonical_link"] = html.canonical
+        elif html:
+            page_meta["html_bytes"] = len(html)
+            self.note_canonical_link(html, base_uri, page_meta)
+        return self.check_unchanged(url, html, page_meta)
+
+    def note_canonical_link(self, html, base_uri, page_meta):
+        """Remember the page's <link rel=canonical> target (read from the raw <head>, no parsing)"""
+        if self.crawl_config["canonical_urls"] and self.crawl_config["honor_canonical"]:
+            canonical_link = find_canonical_link(html, base_uri)
+            if canonical_link:
+                page_meta["canonical_link"] = canonical_link
+
+    def get_page_html(self, url):
+        """Get page content via the configured fetch mode (--fetch), retrying transient failures with backoff
+        :return: (html / parsed soup / NOT_MODIFIED, final_url, base_uri, page_meta) or (None, None, None, page_meta)
+        """
+        attempt = 0
+        while True:
+            result = self.get_page_html_once(url, {})
+            if not self.should_retry(url, attempt, result[3]):
+                return result
+            attempt += 1
+            time.sleep(self.get_retry_delay(attempt))
+
+    async def get_page_html_async(self, url, pool):
+        """asyncio twin of get_page_html"""
+        attempt = 0
+        while True:
+            result = await self.get_page_html_once_async(url, pool, {})
+            if not self.should_retry(url, attempt, result[3]):
+                return result
+            attempt += 1
+            await asyncio.sleep(self.get_retry_delay(attempt))
+
+    def should_retry(self, url, attempt, page_meta):
+        """Decide on another attempt after a fetch (attempt = retries done so far), count retries/recoveries"""
+        page_meta["attempts"] = attempt + 1
+        if not page_meta.get("retryable"):
+            if attempt and not page_meta.get("error") and not page_meta.get("gone"):
+                self.retry_stats["recovered"] += 1
+            return False
+        if attempt >= self.fetch_config["retries"]:
+            print(f"❌ Giving up after {attempt + 1} attempts ({page_meta['error']}) - {url}")
+            return False
+        self.retry_stats["retries"] += 1
+        print(f"🔄 Retry {attempt + 1}/{self.fetch_config['retries']} ({page_meta['error']}) - {url}")
+        return True
+
+    def get_page_html_once(self, url, page_meta):
+        """One fetch attempt (static and/or browser), see get_page_html"""
+        if self.fetch_config["mode"] == "auto":
+            soup, final_url, base_uri, reason = self.get_static_page(url, page_meta)
+            self.record_static_result(url, soup, reason, page_meta)
+            if soup is not None:
+                return soup, final_url, base_uri, page_meta
+            if page_meta.get("gone") or page_meta.get("error"):
+                return None, None, None, page_meta
+        self.fetch_stats["browser"] += 1
+        html, final_url, base_uri = self.get_dynamic_html(url, page_meta)
+        return self.check_rendered_html(url, html, base_uri, page_meta), final_url, base_uri, page_meta
+
+    async def get_page_html_once_async(self, url, pool, page_meta):
+        """asyncio twin of get_page_html_once (static fetch + parse run in a worker thread)"""
+        if self.fetch_config["mode"] == "auto":
+            loop = asyncio.get_running_loop()
+            soup, final_url, base_uri, reason = await loop.run_in_executor(None, self.get_static_page, url, page_meta)
+            self.record_static_result(url, soup, reason, page_meta)
+            if soup is not None:
+                return soup, final_url, base_uri, page_meta
+            if page_meta.get("gone") or page_meta.get("error"):
+                return None, None, None, page_meta
+        self.fetch_stats["browser"] += 1
+        html, final_url, base_uri = await self.get_dynamic_html_async(url, pool, page_meta)
+        return self.check_rendered_html(url, html, base_uri, page_meta), final_url, base_uri, page_meta
+
+    def fetch_page(self, url, record=None):
+        """get_page_html + fetch timing/size bookkeeping for the report"""
+        with timed(record, "fetch"):
+            result = self.get_page_html(url)
+        note_fetch(record, result[3])
+        return result
+
+    async def fetch_page_async(self, url, pool, record=None):
+        """asyncio twin of fetch_page"""
+        with timed(record, "fetch"):
+            result = await self.get_page_html_async(url, pool)
+        note_fetch(record, result[3])
+        return result
+
+    # ---------- Crawl scope and output paths ----------
+
+    def calculate_relative_depth(self, url):
+        """Calculate relative crawl depth of URL based on base_url (for max_depth control)
+        :return: Relative depth (0 = base_url itself, -1 = invalid)
+        """
+        if not url or not self.base_parsed:
+            return -1
+        parsed = urlparse(self.url_key(url))
+        # Filter different domain names
+        if parsed.netloc != self.base_parsed.netloc:
+            return -1
+        # Extract base path and target path (unified format)
+        base_path = self.base_parsed.path.rstrip('/') + '/'
+        target_path = unquote(parsed.path).rstrip('/') + '/'
+        if not target_path.startswith(base_path):
+            return -1
+        # Calculate relative depth
+        relative_path = target_path[len(base_path):].rstrip('/')
+        if not relative_path:
+            return 0  # Exact base_url, depth 0
+        depth = len([seg for seg in relative_path.split('/') if seg.strip()])
+        return depth
+
+    def is_allowed_url(self, url):
+        """Judge if URL is allowed to crawl
+        Optimization 1: Strictly restrict page URL to base_url parent directory level,
+        media resources are not subject to this restriction (media logic is in download_media_file)
+        Rules: 1. Same domain as base_url 2. Valid relative depth 3. Not crawled 4. Not excluded format
+        :return: True (allowed) / False (forbidden)
+        """
+        # Check max crawl count (stop if reach limit, 0 = unlimited)
+        if self.count_reached():
+            return False
+        # Filter crawled URLs (any spelling of the same canonical URL)
+        if self.is_claimed(url):
+            return False
+        return self.is_in_scope(url)
+
+    def url_key(self, url):
+        """Canonical form of url used for dedupe and MD filenames (see urls.canonicalize_url)"""
+        if not self.crawl_config["canonical_urls"]:
+            return url
+        return canonicalize_url(url, *self.url_rules)
+
+    def is_claimed(self, url):
+        """URL (or another spelling of it) is already queued or crawled"""
+        if self.url_key(url) not in self.crawled_urls:
+            return False
+        if self.crawl_config["canonical_urls"] and url not in self.url_variants:
+            self.url_variants.add(url)
+            self.url_stats["merged"] += 1  # A fetch the raw URL string would have caused
+        return True
+
+    def claim_url(self, url):
+        """Mark url as queued/crawled so no spelling of it is fetched again
+        :return: URL to fetch (without #fragment when canonicalising)
+        """
+        self.crawled_urls.add(self.url_key(url))
+        if not self.crawl_config["canonical_urls"]:
+            return url
+        self.url_variants.add(url)
+        return strip_fragment(url)
+
+    def select_sub_links(self, page_links, count_inlinks=True):
+        """Allowed links of a page, one URL per canonical key
+        :param count_inlinks: Links of a crawled page (--order inlinks counts them), not sitemap entries
+        :return: Set of URLs to crawl next
+        """
+        if count_inlinks and self.inlinks is not None:
+            page_links = list(page_links)
+            self.count_inlinks(page_links)
+        sub_links = {}
+        for link in page_links:
+            if not self.is_allowed_url(link):
+                continue
+            key = self.url_key(link)
+            if key not in sub_links:
+                sub_links[key] = strip_fragment(link) if self.crawl_config["canonical_urls"] else link
+            elif link not in self.url_variants:
+                self.url_variants.add(link)
+                self.url_stats["merged"] += 1
+        return set(sub_links.values())
+
+    def count_inlinks(self, page_links):
+        """Count one in-link per linked in-scope page, re-rank those still waiting in the frontier (--order inlinks)"""
+        for key in {self.url_key(link) for link in page_links if self.is_in_scope(link)}:
+            self.inlinks[key] = self.inlinks.get(key, 0) + 1
+            if isinstance(self.frontier, PriorityFrontier):
+                self.frontier.bump(key)
+
+    def get_frontier_key(self):
+        """Rank function of the PriorityFrontier for crawl_config["order"] (smaller = crawled sooner)"""
+        order = self.crawl_config["order"]
+        if order == "inlinks":
+            return lambda url: (-self.inlinks.get(self.url_key(url), 0), self.calculate_relative_depth(url))
+        if order == "sitemap":
+            def sitemap_rank(url):
+                priority, lastmod = self.sitemap_hints.get(self.url_key(url), (0.5, 0))  # Sitemap protocol default
+                return -priority, -lastmod, self.calculate_relative_depth(url)
+            return sitemap_rank
+        return lambda url: (self.calculate_relative_depth(url),)
+
+    def resolve_page_url(self, url, html, final_url, page_meta):
+        """Identity of a fetched page: its in-scope <link rel=canonical> or redirect target, else url itself
+        :return: URL the page is saved under / None if another fetch already produced this page
+        """
+        key = self.url_key(url)
+        page_url = url
+        if html is NOT_MODIFIED:
+            # Unchanged since the last run: saved under the same URL as then
+            page_url = self.crawl_manifest.resolve(url)
+            key = self.url_key(page_url)
+        elif self.crawl_config["canonical_urls"] and self.crawl_config["honor_canonical"]:
+            for candidate in (page_meta.get("canonical_link"), final_url):
+                if candidate and self.is_in_scope(candidate) and self.url_key(candidate) != key:
+                    page_url, key = strip_fragment(candidate), self.url_key(candidate)
+                    break
+        if key in self.page_keys:
+            self.url_stats["duplicates"] += 1
+            print(f"⏭️  Duplicate of an already crawled page ({key}), skip conversion - {url}")
+            return None
+        self.page_keys.add(key)
+        self.crawled_urls.add(key)  # Links to the redirect / canonical target are not fetched again
+        if page_url != url and self.crawl_manifest is not None:
+            self.crawl_manifest.add_alias(url, page_url)  # Next run finds validators / hashes from the fetched URL
+        return page_url
+
+    def is_in_scope(self, url):
+        """Judge if URL is inside the crawl scope (rules 1, 2 and 4 of is_allowed_url)
+        Independent of crawl progress, so converter processes can rewrite links with it
+        """
+        if not url:
+            return False
+        parsed = urlparse(url)
+        # Filter non-http/https schemes
+        if parsed.scheme not in self.crawl_config["allowed_schemes"]:
+            return False
+        # Check relative depth (Strictly restrict pages to the base_url parent directory)
+        depth = self.calculate_relative_depth(url)
+        if depth < 0 or depth > self.max_crawl_depth:
+            return False
+        # Filter excluded file formats
+        for pattern in self.crawl_config["exclude_patterns"]:
+            if re.search(pattern, url, re.IGNORECASE):
+                return False
+        return True
+
+    def extract_allowed_links(self, soup, base_uri):
+        """Extract all legal sublinks from parsed page for recursive crawling"""
+        return self.select_sub_links(extract_page_links(soup, base_uri))
+
+    def url_to_md_filename(self, url):
+        """Core: Generate MD filename based on base_url (strictly follow rules)
+        Rules: 1. Remove base_url prefix 2. Replace / with _ 3. Filter illegal chars 4. Suffix with .md
+        Example: https://company.com/docs/home → home → home.md
+        Example: https://company.com/docs/home/sub → home/sub → home_sub.md
+        Example: https://company.com/docs/ → index.md
+        Canonical URLs are used, so page, page/, page#top and page/index.html share one file
+        """
+        url_lower = self.url_key(url).lower()
+        base_url_lower = self.base_key_prefix
+        # Step 1: Strictly remove base_url prefix
+        if (url_lower.rstrip('/') + '/').startswith(base_url_lower):
+            name_part = url_lower[len(base_url_lower):].rstrip('/')
+        else:
+            # Fallback: Get last segment of URL path
+            name_part = os.path.basename(urlparse(url).path).rstrip('/') or "unknown"
+        # Step 2: Fallback if name_part is empty (URL == base_url)
+        if not name_part:
+            return "index.md"
+        # Step 3: Replace / with _ + filter illegal chars + merge consecutive underscores
+        name_part = name_part.replace('/', '_')
+        safe_name = re.sub(r'[<>:"/\\|?*]', '_', name_part)
+        safe_name = re.sub(r'_+', '_', safe_name).strip('_')
+        # Step 4: Suffix with .md
+        return f"{safe_name}.md" if safe_name else "index.md"
+
+    def get_md_file_path(self, url):
+        """Get local absolute path of MD file (root save dir + legal filename)"""
+        if not self.root_save_dir or not url:
+            fallback = os.path.join(self.root_save_dir, f"unknown_{hash(url) % 10000}.md")
+            print(f"⚠️  Config missing, use fallback MD path: {os.path.basename(fallback)}")
+            return fallback
+        # Core: Only root save dir + legal filename (no other splicing)
+        md_filename = self.url_to_md_filename(url)
+        md_file_path = os.path.join(self.root_save_dir, md_filename)
+        # Ensure path is in root save dir (prevent path traversal)
+        md_file_path = os.path.abspath(md_file_path)
+        if not md_file_path.startswith(self.root_save_dir):
+            md_file_path = os.path.join(self.root_save_dir, md_filename)
+        return md_file_path
+
+    # ---------- Page pipeline ----------
+
+    def parse_html(self, html):
+        """parse_html with the job's converter engine"""
+        return parse_html(html, self.crawl_config["converter"])
+
+    def fix_local_links(self, soup, current_url, base_uri):
+        """Fix <a> links in parsed page to local MD relative paths (in place)"""
+        if soup is None or not current_url or not self.root_save_dir:
+            return soup
+        current_md_path = self.get_md_file_path(current_url)
+        current_md_dir = os.path.dirname(current_md_path)
+
+        for a in iter_tags(soup, "a"):
+            href = a.get("href", "").strip()
+            if not href or href.startswith(SKIP_LINK_PREFIXES):
+                continue
+            # Resolve target URL against base_uri, but identify current path via current_url
+            abs_url = urljoin(base_uri, href)
+            if self.is_in_scope(abs_url):
+                target_md_path = self.get_md_file_path(abs_url)
+                rel_link = os.path.relpath(target_md_path, current_md_dir).replace(os.sep, '/')
+                if self.crawl_config["canonical_urls"] and "#" in abs_url:
+                    rel_link += "#" + abs_url.split("#", 1)[1]  # Keep the section anchor
+                set_attr(a, "href", rel_link)
+        return soup
+
+    def extract_core_content(self, soup, md_file_path, base_uri, record=None, core_tag=None):
+        """Strip parsed page down to its core content element, crawl media files on demand
+        :param record: Optional report record, gets strip_tags/media/extract_core timings
+        :param core_tag: soup is a core fragment already picked in the browser, rooted at this tag
+        :return: Core content Tag (still part of soup) / None
+        """
+        if soup is None:
+            return None
+        # Remove useless tags to simplify content
+        with timed(record, "strip_tags"):
+            strip_useless_tags(soup)
+        # Crawl media and replace local links if enabled
+        if self.crawl_picture or self.crawl_video:
+            with timed(record, "media"):
+                soup = self.crawl_media(soup, md_file_path, base_uri)
+        # Match core content selectors by priority
+        with timed(record, "extract_core"):
+            if core_tag:
+                return find_tag(soup, core_tag)  # Fragment root (first element of its tag name)
+            return select_core_content(soup)
+
+    def html2md(self, html_content):
+        """html2md with the job's converter engine and Markdown options"""
+        return html2md(html_content, self.crawl_config["converter"], self.markdown_options)
+
+    def render_markdown(self, url, html, final_url, page_base_url, record=None):
+        """Parse a rendered page and convert its core content to Markdown (no crawl state touched)
+        :return: (page_links, md_content) - page_links are all absolute links on the page
+        """
+        core_tag = None
+        if isinstance(html, BrowserExtract):
+            # Links and core container were picked inside the page (--extract browser), only the fragment is parsed
+            page_links = list(html.links)
+            core_tag = html.core_tag
+            if html.selector:
+                print(f"✅ Core content matched in browser: {html.selector}")
+            with timed(record, "parse"):
+                soup = self.parse_html(html.core_html)
+        else:
+            # Parse once: the same tree flows through every step below (no re-serialisation)
+            with timed(record, "parse"):
+                soup = self.parse_html(html)
+
+            # 1. Extract links for further crawling (use page_base_url for resolution)
+            with timed(record, "extract_links"):
+                page_links = extract_page_links(soup, page_base_url)
+
+        # 2. Fix page internal links to local MD relative paths (in place)
+        with timed(record, "fix_links"):
+            self.fix_local_links(soup, final_url, page_base_url)
+
+        # 3. Extract core content and convert to Markdown
+        core_html = self.extract_core_content(soup, self.get_md_file_path(url), page_base_url, record, core_tag)
+        with timed(record, "html2md"):
+            md_content = self.html2md(core_html)
+        return page_links, md_content
+
+    def save_md_file(self, md_content, url, md_hash=None, page_links=(), page_meta=None):
+        """Save MD file to local (or to the output sink), return absolute file path
+        :param md_hash / page_links / page_meta: Record fields for the output sink
+        :return: MD file path (success) / False (failed)
+        """
+        if not md_content or not url:
+            print(f"❌ Skip MD save: Empty content or URL - {url}")
+            return False
+        # Check max crawl count before save
+        if self.count_reached():
+            print(f"❌ Skip MD save: Reach max crawl count ({self.max_crawl_count}) - {url}")
+            return False
+        md_file_path = self.write_page(md_content, url, md_hash, page_links, page_meta)
+        if md_file_path:
+            self.count_saved_md(md_file_path, url)
+        return md_file_path
+
+    def write_page(self, md_content, url, md_hash=None, page_links=(), page_meta=None):
+        """Write a page's Markdown: its MD file, or a record of the output sink (--output)
+        :return: MD file path (its path inside the bundle with an output sink) / False (failed)
+        """
+        md_file_path = self.get_md_file_path(url)
+        if self.output_sink is None:
+            return write_md_file(md_content, md_file_path)
+        record = {
+            "url": url,
+            "path": self.get_output_record_path(md_file_path),
+            "markdown": md_content,
+            "md_hash": md_hash or hashlib.sha1(md_content.encode("utf-8")).hexdigest(),
+            "fetch_path": (page_meta or {}).get("fetch_path"),
+            "links": list(page_links),
+            "saved_at": time.time()
+        }
+        return md_file_path if self.output_sink.add(record) else False
+
+    def get_output_record_path(self, md_file_path):
+        """Path of a page inside the bundle: the MD file path relative to the save dir"""
+        return os.path.relpath(md_file_path, self.root_save_dir).replace(os.sep, '/')
+
+    def count_saved_md(self, md_file_path, url):
+        """Count a written MD file towards --count"""
+        self.crawled_count += 1  # Increment crawled count after successful save
+        print(f"✅ MD file saved successfully: {os.path.basename(md_file_path)} (Target: {url}) [Count: {self.crawled_count}]")
+
+    def keep_unchanged_page(self, url, sub_links=None, **fields):
+        """Reuse an unchanged page from the last run: no conversion, no write (--incremental)
+        :param sub_links: Links found on the page (None = use the links stored in the manifest)
+        :param fields: Manifest columns to refresh (validators, hashes...)
+        :return: (md_file_path, sub_links) / (False, set()) if count limit reached
+        """
+        if self.count_reached():
+            return False, set()
+        entry = self.crawl_manifest.get(url)
+        if sub_links is None:
+            sub_links = self.select_sub_links(entry["links"])
+        self.crawled_count += 1
+        self.crawl_manifest.record(url, "unchanged", **fields)
+        print(f"⏭️  Unchanged since last run, skip: {os.path.basename(entry['md_path'])} (Target: {url}) [Count: {self.crawled_count}]")
+        return entry["md_path"], sub_links
+
+    def process_page(self, url, html, final_url, page_base_url, page_meta=None, record=None):
+        """Turn one rendered page into a saved MD file (shared by serial and concurrent crawls)
+        :param record: Optional report record, gets per-stage timings/sizes
+        :return: (md_file_path, sub_links) / (False, set()) if nothing was saved
+        """
+        page_meta = page_meta or {}
+        validators = {key: page_meta.get(key) for key in MANIFEST_PAGE_FIELDS}
+        if html is NOT_MODIFIED:
+            if record is not None:
+                record["outcome"] = "unchanged"
+            return self.keep_unchanged_page(url, **validators)
+        self.cache_rendered_html(url, html, final_url, page_base_url, page_meta)
+
+        # 1-3. Extract links, fix local links, extract core content and convert to Markdown
+        page_links, md_content = self.render_markdown(url, html, final_url, page_base_url, record)
+        if not md_content:
+            return False, set()
+        sub_links = self.select_sub_links(page_links)
+        md_bytes = md_content.encode("utf-8")
+        if record is not None:
+            record["sizes"]["md_bytes"] = len(md_bytes)
+
+        # 4. Save MD file to local (skip the write if the Markdown did not change)
+        md_hash = hashlib.sha1(md_bytes).hexdigest()
+        if md_hash == self.get_known_md_hash(url):
+            if record is not None:
+                record["outcome"] = "unchanged"
+            return self.keep_unchanged_page(url, sub_links, md_hash=md_hash, links=page_links, **validators)
+        with timed(record, "save"):
+            md_file_path = self.save_md_file(md_content, url, md_hash, page_links, page_meta)
+        if not md_file_path:
+            return False, set()
+        self.record_saved_page(url, md_file_path, md_hash, page_links, validators)
+        return md_file_path, sub_links
+
+    def cache_rendered_html(self, url, html, final_url, page_base_url, page_meta):
+        """Keep the page as rendered in the HTML cache (for --reconvert), under the URL it is saved as"""
+        if self.html_cache is None:
+            return
+        if isinstance(html, BrowserExtract):
+            self.html_cache.put(url, "extract", json.dumps(html._asdict()), final_url, page_base_url)
+        else:
+            html = html if isinstance(html, str) else page_meta.get("raw_html")
+            if html:
+                self.html_cache.put(url, "html", html, final_url, page_base_url)
+
+    def get_known_md_hash(self, url):
+        """Hash of the MD file the last run wrote for url (None if unknown or saved elsewhere)"""
+        entry = self.crawl_manifest.get(url) if self.crawl_manifest is not None else None
+        if entry and entry["md_path"] == self.get_md_file_path(url):
+            return entry["md_hash"]
+        return None
+
+    def record_saved_page(self, url, md_file_path, md_hash, page_links, validators):
+        """Note a newly written MD file in the manifest (--incremental)"""
+        if self.crawl_manifest is not None:
+            self.crawl_manifest.record(url, "changed" if url in self.crawl_manifest.entries else "added",
+                                       md_path=md_file_path, md_hash=md_hash, links=page_links, **validators)
+
+    async def process_page_in_pool(self, url, html, final_url, page_base_url, page_meta=None, record=None):
+        """process_page with parsing/conversion/writing done by the converter processes (--convert-procs)
+        Crawl state (count, links to queue, manifest, media downloads) stays in this process.
+        :return: (md_file_path, sub_links) / (False, set()) if nothing was saved
+        """
+        page_meta = page_meta or {}
+        validators = {key: page_meta.get(key) for key in MANIFEST_PAGE_FIELDS}
+        if html is NOT_MODIFIED:
+            if record is not None:
+                record["outcome"] = "unchanged"
+            return self.keep_unchanged_page(url, **validators)
+        if not isinstance(html, (str, BrowserExtract)):
+            html = page_meta["raw_html"]  # Send text, a parsed tree is costly to pickle
+        self.cache_rendered_html(url, html, final_url, page_base_url, page_meta)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.convert_pool, convert_page_job, self.get_convert_settings(),
+                                            url, html, final_url, page_base_url,
+                                            self.get_known_md_hash(url), record is not None, self.output_sink is None)
+        if record is not None:
+            for stage, seconds in result["record"]["timings"].items():
+                record["timings"][stage] = record["timings"].get(stage, 0.0) + seconds
+            if result["md_bytes"]:
+                record["sizes"]["md_bytes"] = result["md_bytes"]
+        for media_url, save_path, md_file_path, media_type in result["media"]:
+            self.submit_media(media_url, save_path, md_file_path, media_type)
+        if result["status"] in ("empty", "failed"):
+            return False, set()
+        sub_links = self.select_sub_links(result["page_links"])
+        if result["status"] == "unchanged":
+            if record is not None:
+                record["outcome"] = "unchanged"
+            return self.keep_unchanged_page(url, sub_links, md_hash=result["md_hash"], links=result["page_links"], **validators)
+        if result["status"] == "converted":  # Output sink: the Markdown came back instead of being written
+            with timed(record, "save"):
+                if not self.write_page(result["markdown"], url, result["md_hash"], result["page_links"], page_meta):
+                    return False, set()
+        self.count_saved_md(result["md_path"], url)
+        self.record_saved_page(url, result["md_path"], result["md_hash"], result["page_links"], validators)
+        return result["md_path"], sub_links
+
+    # ---------- Crawl state, manifest and report ----------
+
+    def open_crawl_state(self, resume):
+        """Open the on-disk crawl state and restore it for --resume
+        :param resume: True = continue the saved frontier, "failed" = also queue the failed URLs again (--retry-failed)
+        :return: URLs to start from (target URL, or the saved frontier when resuming)
+        """
+        self.crawl_state = CrawlState(self.root_save_dir, reset=not resume)
+        if self.crawl_config["large_crawl"]:
+            self.open_large_store()
+        saved_target = self.crawl_state.get_meta("target_url")
+        if resume and saved_target:
+            if saved_target != self.target_url:
+                raise ValueError(f"Saved crawl state is for {saved_target}, not {self.target_url}")
+            if resume == "failed":
+                print(f"🔄 Retrying {self.crawl_state.requeue_failed()} failed URLs of the previous run")
+            for url in self.crawl_state.iter_urls("done", "duplicate", "failed", "gone"):
+                self.claim_url(url)
+            self.page_keys.update(self.url_key(url) for url in self.crawl_state.iter_urls("done"))
+            self.crawled_count = self.crawl_state.count_saved()
+            print(f"♻️  Resuming crawl: {self.crawled_count} pages done, {self.crawl_state.count('queued')} URLs left in frontier")
+            if self.large_store is not None:
+                return self.crawl_state.iter_urls("queued")  # Streamed into the spilling frontier
+            return self.crawl_state.urls_with_status("queued")
+        if resume:
+            print(f"⚠️  No saved crawl state in {self.root_save_dir}, starting a fresh crawl")
+        self.crawl_state.set_meta("target_url", self.target_url)
+        self.crawl_state.add_queued([self.target_url])
+        return [self.target_url]
+
+    def open_large_store(self):
+        """Swap the in-memory URL sets for Bloom-filtered on-disk ones (--large-crawl)"""
+        capacity = self.crawl_config["large_crawl_capacity"]
+        self.large_store = LargeCrawlStore(self.root_save_dir)
+        self.crawled_urls = self.large_store.url_set("claimed", capacity)
+        self.page_keys = self.large_store.url_set("pages", capacity)
+        self.url_variants = BloomFilter(capacity)  # Statistics only: a false positive just skips a count
+        print(f"🗄️  Large crawl: URL sets on disk behind Bloom filters (capacity {capacity}), "
+              f"frontier spills to disk past {self.crawl_config['frontier_memory']} URLs")
+
+    def new_frontier(self):
+        """Queue of URLs to crawl: FIFO in memory, FIFO spilling to disk (--large-crawl), or ranked by --order"""
+        if self.crawl_config["order"] != "discovery":
+            return PriorityFrontier(self.get_frontier_key(), ident=self.url_key)
+        if self.large_store is not None:
+            return SpillQueue(os.path.join(self.root_save_dir, FRONTIER_FILENAME), self.crawl_config["frontier_memory"])
+        return asyncio.Queue()
+
+    def find_sitemap_seeds(self, start_urls):
+        """In-scope URLs from robots.txt Sitemap: entries / sitemap.xml, not fetched or written anywhere yet
+        Sitemap URLs go through the same is_allowed_url rules (scope, depth, excludes) as discovered links
+        :return: New seeds (shallowest first)
+        """
+        scheduler = self.get_scheduler()
+        entries, sitemaps_read = discover_sitemap_urls(
+            self.get_http_session(), self.base_url, self.fetch_config["timeout"],
+            max_sitemaps=self.crawl_config["max_sitemaps"],
+            robots_txt=scheduler.get_robots_txt(self.base_url) if scheduler is not None else None  # Fetched once
+        )
+        known = {self.url_key(url) for url in start_urls}
+        if self.crawl_config["order"] == "sitemap":
+            for entry in entries:
+                self.sitemap_hints[self.url_key(entry["loc"])] = (entry["priority"], parse_lastmod(entry["lastmod"]))
+        seeds = [url for url in self.select_sub_links((entry["loc"] for entry in entries), count_inlinks=False)
+                 if self.url_key(url) not in known]
+        seeds.sort(key=lambda url: (self.calculate_relative_depth(url), url))
+        print(f"🗺️  Sitemap discovery: {len(entries)} URLs in {sitemaps_read} sitemap file(s), {len(seeds)} in crawl scope queued")
+        return seeds
+
+    def seed_from_sitemaps(self, start_urls, seeds=None):
+        """Queue sitemap URLs before rendering anything (--sitemap)
+        :param seeds: find_sitemap_seeds() result (None = discover now)
+        :return: start_urls + new seeds
+        """
+        if seeds is None:
+            seeds = self.find_sitemap_seeds(start_urls)
+        if self.crawl_state is not None:
+            self.crawl_state.add_queued(seeds)
+        return list(start_urls) + seeds
+
+    def close_crawl_state(self):
+        """Close the crawl state DB (everything is already committed per page) and drop the large-crawl scratch DB"""
+        if self.crawl_state is not None:
+            self.crawl_state.close()
+            self.crawl_state = None
+        if self.large_store is not None:
+            self.large_store.close()
+            self.large_store = None
+
+    def open_crawl_manifest(self):
+        """Load the page manifest of previous runs (--incremental)"""
+        self.crawl_manifest = CrawlManifest(self.root_save_dir)
+        print(f"🔁 Incremental crawl: {len(self.crawl_manifest.entries)} pages known from previous runs (run #{self.crawl_manifest.run})")
+
+    def open_html_cache(self, reconvert=False):
+        """Open the save dir's HTML cache (a crawl of another target URL starts it afresh)
+        :param reconvert: Open for --reconvert: no TTL (whatever is cached is used), other target = error
+        """
+        self.html_cache = HtmlCache(
+            self.root_save_dir,
+            ttl=0 if reconvert else self.crawl_config["html_cache_ttl_days"] * 86400,
+            max_bytes=int(self.crawl_config["html_cache_max_mb"] * 1024 * 1024)
+        )
+        saved_target = self.html_cache.get_meta("target_url")
+        if saved_target and saved_target != self.target_url:
+            if reconvert:
+                self.close_html_cache()
+                raise ValueError(f"HTML cache in {self.root_save_dir} is for {saved_target}, not {self.target_url}")
+            self.html_cache.clear()
+        self.html_cache.set_meta("target_url", self.target_url)
+
+    def open_output_sink(self, append=False):
+        """Start the bundle output replacing the MD files (--output)
+        :param append: Keep the records of the previous run (--resume)
+        """
+        output = self.crawl_config["output"]
+        path = self.crawl_config["output_path"] or os.path.join(self.root_save_dir, OUTPUT_FILENAMES[output])
+        self.output_sink = create_output_sink(output, path, append, self.crawl_config["output_batch"],
+                                              self.crawl_config["output_flush_s"])
+        print(f"📦 Writing pages to {'stdout' if path == '-' else path} ({output})")
+
+    def close_output_sink(self):
+        """Flush and close the bundle output"""
+        if self.output_sink is not None:
+            sink, self.output_sink = self.output_sink, None
+            sink.close()
+            self.output_result = (self.crawl_config["output"], sink.path, sink.written)
+
+    def finish_output(self):
+        """Wait for media downloads (failed ones point back to their URL), then close the output sink
+        :return: finish_media_downloads counts
+        """
+        media_result = self.finish_media_downloads()
+        self.close_output_sink()
+        return media_result
+
+    def close_html_cache(self):
+        if self.html_cache is not None:
+            self.html_cache.close()
+            self.html_cache = None
+
+    def close_crawl_manifest(self):
+        """Close the manifest without the removed-pages pass (aborted crawl: removals stay unknown)"""
+        if self.crawl_manifest is not None:
+            self.crawl_manifest.close()
+            self.crawl_manifest = None
+
+    def finish_incremental_report(self):
+        """Print added/changed/unchanged/removed pages and forget removed ones (--incremental)
+        Removed pages are only known when the crawl was not cut short by --count
+        """
+        if self.crawl_manifest is None:
+            return
+        stats = dict(self.crawl_manifest.stats)
+        if self.count_reached():
+            removed = "n/a (crawl capped by --count)"
+        else:
+            removed_urls = self.crawl_manifest.removed()
+            self.crawl_manifest.forget(removed_urls)
+            removed = len(removed_urls)
+            for url in removed_urls[:20]:
+                print(f"   🗑️  Removed: {url}")
+        print(f"📊 Incremental: {stats['added']} added | {stats['changed']} changed | "
+              f"{stats['unchanged']} unchanged | {removed} removed")
+        stats["removed"] = removed
+        self.incremental_stats = stats
+        self.close_crawl_manifest()
+
+    def open_crawl_report(self, report_path):
+        """Start the per-page JSONL report (--report)"""
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        self.crawl_report = CrawlReport(report_path)
+
+    def finish_crawl_report(self):
+        """Write the report summary and print the slowest stages (--report)"""
+        if self.crawl_report is None:
+            return
+        summary = self.crawl_report.close(urls=dict(self.url_stats), retries=dict(self.retry_stats))
+        stages = sorted(summary["stages"].items(), key=lambda item: item[1]["sum_s"], reverse=True)
+        print(f"📊 Report: {summary['pages']} pages, {summary['pages_per_sec']} pages/s | " +
+              " | ".join(f"{stage} p50 {stats['p50_s'] * 1000:.0f}ms p95 {stats['p95_s'] * 1000:.0f}ms"
+                         for stage, stats in stages[:4]))
+        print(f"📄 Report saved to: {self.crawl_report.path} (summary: {self.crawl_report.summary_path})")
+        self.crawl_report = None
+
+    def record_page_result(self, url, md_file_path, sub_links=(), page_meta=None, record=None):
+        """Persist a page outcome so an interrupted crawl can be resumed, finish its report record"""
+        if page_meta and page_meta.get("captured_media"):
+            self.media_capture.release(page_meta.pop("captured_media"))  # Media jobs of the page are queued
+        gone = bool(page_meta and page_meta.get("gone"))
+        duplicate = bool(page_meta and page_meta.get("duplicate"))
+        if record is not None and self.crawl_report is not None:
+            if md_file_path:
+                record["outcome"] = record["outcome"] or "saved"
+                record["md_path"] = md_file_path
+            elif duplicate:
+                record["outcome"] = "duplicate"
+            elif self.count_reached():
+                record["outcome"] = "skipped"
+            else:
+                record["outcome"] = "gone" if gone else "failed"
+            self.crawl_report.add(record)
+        if self.crawl_manifest is not None and not md_file_path and not gone:
+            known_url = self.crawl_manifest.resolve(url)
+            if known_url in self.crawl_manifest.entries:
+                self.crawl_manifest.touch(known_url)  # Failed this time but not gone, do not report it as removed
+        failed = not (md_file_path or duplicate or gone or self.count_reached())
+        if failed:
+            self.retry_stats["failed"] += 1
+        if self.crawl_state is None:
+            return
+        if md_file_path:
+            self.crawl_state.mark_done(url, md_file_path, sorted(sub_links))
+        elif duplicate:
+            self.crawl_state.mark_duplicate(url)
+        elif gone:
+            self.crawl_state.mark_failed(url, "gone", status="gone")
+        elif failed:  # Pages skipped by --count stay queued
+            self.crawl_state.mark_failed(url, (page_meta or {}).get("error") or "no content saved")
+
+    # ---------- Crawl loops ----------
+
+    def crawl_depth_first(self, start_url):
+        """Crawl page and subpages depth-first (core crawl logic)
+        Visits pages in the same order as a recursive crawl, but keeps the pending sub links
+        of every level on an explicit stack, so long link chains cannot hit the recursion limit.
+        Termination conditions: 1. URL not allowed 2. URL crawled 3. Max count reached
+        """
+        stack = [iter([start_url])]
+        while stack:
+            url = next(stack[-1], None)
+            if url is None:
+                stack.pop()
+                continue
+            # Global termination: Max crawl count reached
+            if self.count_reached():
+                print(f"🔴 Crawl stopped: Reach max crawl count ({self.max_crawl_count})")
+                return
+            sub_links = self.crawl_page(url)
+            # Crawl sublinks next (depth-first)
+            if sub_links and not self.count_reached():
+                current_depth = self.calculate_relative_depth(url)
+                print(f"\n🔍 Found {len(sub_links)} legal subpages, start depth-first crawling (Current Depth: {current_depth})")
+                stack.append(iter(sorted(sub_links)))
+
+    def crawl_page(self, url):
+        """Fetch, convert and save one page of the depth-first crawl
+        :return: Set of sub links to crawl next (empty if the page was skipped or failed)
+        """
+        # Local termination: URL not allowed or already crawled (under any spelling)
+        if not url or not self.is_allowed_url(url):
+            return set()
+        url = self.claim_url(url)
+        record = new_page_record(url) if self.crawl_report is not None else None
+
+        # 1. Get dynamic HTML content (return final_url and browser's base_uri)
+        html, final_url, page_base_url, page_meta = self.fetch_page(url, record)
+        if html is None:
+            self.record_page_result(url, False, page_meta=page_meta, record=record)
+            return set()
+        page_url = self.resolve_page_url(url, html, final_url, page_meta)
+        if page_url is None:
+            page_meta["duplicate"] = True
+            self.record_page_result(url, False, page_meta=page_meta, record=record)
+            return set()
+
+        # 2. Extract links, fix local links, convert and save MD file
+        md_file_path, sub_links = self.process_page(page_url, html, final_url, page_base_url, page_meta, record)
+        self.record_page_result(url, md_file_path, sub_links, page_meta=page_meta, record=record)
+        return sub_links if md_file_path else set()
+
+    async def crawl_concurrent(self, start_urls, workers):
+        """Crawl with N browser tabs pulling from a shared FIFO frontier (--workers N)
+        Same rules as crawl_depth_first: a URL is claimed in crawled_urls when queued
+        (so each canonical URL is rendered once), depth/filename rules are unchanged, and a page is only
+        dispatched while saved + in-flight pages stay below --count, so the limit is exact.
+        All bookkeeping runs on the event loop thread, only browser I/O overlaps.
+        With --convert-procs, tabs hand rendered HTML to a bounded queue drained by
+        converter tasks (one per process) and move on to the next URL right away.
+        Tabs are contexts of the crawler's shared browser, Chromium is not launched per job.
+        """
+        frontier = self.frontier = self.new_frontier()
+        for start_url in start_urls:
+            if start_url and self.is_allowed_url(start_url):
+                frontier.put_nowait(self.claim_url(start_url))
+        if frontier.empty():
+            if isinstance(frontier, SpillQueue):
+                frontier.close()
+            self.frontier = None
+            return
+        in_flight = 0
+        budget = asyncio.Condition()  # Signalled whenever a page finishes (saved or failed)
+        pool = AsyncBrowserPool(
+            size=workers,  # One warm context per tab, the pool is sized by --workers only
+            recycle_after=self.playwright_config["recycle_after"],
+            headless=self.playwright_config["headless"],
+            context_options=self.get_browser_context_options(),
+            blocked_urls=self.get_blocked_url_patterns(),
+            host=self.crawler.browser_host if self.crawler is not None else None
+        )
+        page_slots = self.crawler.get_page_slots() if self.crawler is not None else None
+        convert_procs = self.crawl_config["convert_procs"] if self.convert_pool is not None else 0
+        # Bounded: tabs wait here when conversion falls behind, so queued HTML stays capped
+        convert_queue = asyncio.Queue(maxsize=convert_procs * self.crawl_config["convert_backlog"]) if convert_procs else None
+
+        def has_budget():
+            return self.max_crawl_count == 0 or self.crawled_count + in_flight < self.max_crawl_count or self.count_reached()
+
+        async def release_page():
+            nonlocal in_flight
+            async with budget:
+                in_flight -= 1
+                budget.notify_all()
+            frontier.task_done()
+
+        async def finish_page(url, html, final_url, page_base_url, page_meta, record):
+            if html is None:
+                self.record_page_result(url, False, page_meta=page_meta, record=record)
+                return
+            page_url = self.resolve_page_url(url, html, final_url, page_meta)
+            if page_url is None:
+                page_meta["duplicate"] = True
+                self.record_page_result(url, False, page_meta=page_meta, record=record)
+                return
+            if self.output_sink is not None and self.output_sink.backlogged():
+                # Writer behind the crawl: wait off the loop, adding a record must not block the other tabs
+                await asyncio.get_running_loop().run_in_executor(None, self.output_sink.wait_for_room)
+            if convert_queue is not None:
+                md_file_path, sub_links = await self.process_page_in_pool(page_url, html, final_url, page_base_url, page_meta, record)
+            else:
+                md_file_path, sub_links = self.process_page(page_url, html, final_url, page_base_url, page_meta, record)
+            self.record_page_result(url, md_file_path, sub_links, page_meta=page_meta, record=record)
+            if not md_file_path or self.count_reached():
+                return
+            # Claim new links before queueing them, so each URL is rendered once
+            new_links = [self.claim_url(link) for link in sorted(sub_links) if not self.is_claimed(link)]
+            if new_links:
+                print(f"\n🔍 Found {len(new_links)} new legal subpages, queued for crawling (Depth: {self.calculate_relative_depth(url)})")
+                for link in new_links:
+                    frontier.put_nowait(link)
+
+        async def worker():
+            nonlocal in_flight
+            while True:
+                url = await frontier.get()
+                if self.url_key(url) in self.page_keys:
+                    # Another fetch was redirected / canonicalised to this page meanwhile
+                    self.url_stats["merged"] += 1
+                    self.record_page_result(url, False, page_meta={"duplicate": True})
+                    frontier.task_done()
+                    continue
+                # Wait until the page fits in the --count budget (or the crawl is over)
+                async with budget:
+                    await budget.wait_for(has_budget)
+                    if self.count_reached():
+                        frontier.task_done()
+                        continue
+                    in_flight += 1
+                handed_off = False
+                record = new_page_record(url) if self.crawl_report is not None else None
+                page = None
+                try:
+                    if page_slots is not None:
+                        async with page_slots:  # Global limit shared with the other jobs
+                            page = await self.fetch_page_async(url, pool, record)
+                    else:
+                        page = await self.fetch_page_async(url, pool, record)
+                    if convert_queue is not None and page[0] is not None:
+                        await convert_queue.put((url, page, record))
+                        handed_off = True  # The converter task releases the page
+                    else:
+                        await finish_page(url, *page, record)
+                except Exception as e:
+                    # Keep the tab pulling URLs: a dead worker would leave its share of the frontier unfinished
+                    print(f"❌ Page failed: {str(e)[:80]} - {url}")
+                    self.record_page_result(url, False, page_meta=page[3] if page is not None else None, record=record)
+                finally:
+                    if not handed_off:
+                        await release_page()
+
+        async def converter():
+            while True:
+                url, page, record = await convert_queue.get()
+                try:
+                    await finish_page(url, *page, record)
+                except Exception as e:
+                    print(f"❌ Conversion failed: {str(e)[:80]} - {url}")
+                    self.record_page_result(url, False, page_meta=page[3], record=record)
+                finally:
+                    convert_queue.task_done()
+                    await release_page()
+
+        print(f"⚡ Concurrent crawl: {workers} browser tabs sharing one frontier queue" +
+              (f" ({self.crawl_config['order']} order)" if self.crawl_config["order"] != "discovery" else "") +
+              (f", {convert_procs} converter processes" if convert_procs else ""))
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        tasks += [asyncio.create_task(converter()) for _ in range(convert_procs)]
+        joined = asyncio.create_task(frontier.join())
+        try:
+            # Workers and converters only end by failing: re-raise then instead of waiting for their URLs
+            done, _ = await asyncio.wait([joined, *tasks], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            joined.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await pool.close()
+            if isinstance(frontier, SpillQueue):
+                frontier.close()
+            self.frontier = None
+        if self.count_reached():
+            print(f"🔴 Crawl stopped: Reach max crawl count ({self.max_crawl_count})")
+
+    # ---------- Job lifecycle ----------
+
+    def open(self, resume=False, incremental=False, report=None):
+        """Create the save dir, open state/manifest/report
+        SQLite handles are bound to the calling thread, which must also run the crawl loop.
+        :return: URLs to start from
+        """
+        if incremental and self.crawl_config["output"] != "files":
+            raise ValueError("--incremental compares pages with their MD files, it needs --output files")
+        os.makedirs(self.root_save_dir, exist_ok=True)
+        print(f"📁 Local save directory created: {self.root_save_dir}\n")
+        self.print_config()
+        print(f"\n🚀 Start Crawling (Base URL: {self.base_url} | Max Depth: {self.max_crawl_depth} | Max Count: {self.max_crawl_count})")
+        print("-" * 80)
+        if report:
+            self.open_crawl_report(report)
+        start_urls = self.open_crawl_state(resume)
+        if incremental:
+            self.open_crawl_manifest()
+        if self.crawl_config["html_cache"]:
+            self.open_html_cache()
+        if self.crawl_config["output"] != "files":
+            self.open_output_sink(append=bool(resume))
+        return start_urls
+
+    def close(self):
+        """Release everything the depth-first crawl opened, waiting for media downloads"""
+        self.close_browser_pool()
+        self.close_crawl_state()
+        self.close_html_cache()
+        self.media_result = self.finish_output()
+        self.finish_crawl_report()
+
+    async def aclose(self):
+        """asyncio twin of close (media downloads are waited for off the event loop)"""
+        self.close_crawl_state()
+        self.close_html_cache()
+        self.media_result = await asyncio.get_running_loop().run_in_executor(None, self.finish_output)
+        self.finish_crawl_report()
+
+    def run(self, resume=False, sitemap=False, incremental=False, report=None):
+        """Classic depth-first crawl on the job's own sync browser (CLI default with --workers 1)
+        :return: Crawl result (see result())
+        """
+        try:
+            start_urls = self.open(resume, incremental, report)
+            if sitemap:
+                start_urls = self.seed_from_sitemaps(list(start_urls))
+            for start_url in start_urls:
+                if self.count_reached():
+                    break
+                self.crawl_depth_first(start_url)
+        except BaseException:
+            self.close_crawl_manifest()
+            raise
+        finally:
+            self.close()
+        return self.result()
+
+    async def run_async(self, resume=False, sitemap=False, incremental=False, report=None):
+        """Concurrent crawl with crawl_config["workers"] tabs on the crawler's shared browser
+        :return: Crawl result (see result())
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            start_urls = self.open(resume, incremental, report)
+            if sitemap:
+                start_urls = list(start_urls)
+                seeds = await loop.run_in_executor(None, self.find_sitemap_seeds, start_urls)
+                start_urls = self.seed_from_sitemaps(start_urls, seeds)
+            elif self.crawl_config["order"] == "sitemap":
+                print(f"⚠️  --order sitemap without --sitemap: no sitemap priorities, shallowest pages first")
+            if self.crawl_config["convert_procs"] and self.crawler is not None:
+                self.convert_pool = self.crawler.get_convert_pool()
+            await self.crawl_concurrent(start_urls, self.crawl_config["workers"])
+        except BaseException:
+            self.close_crawl_manifest()
+            raise
+        finally:
+            await self.aclose()
+        return self.result()
+
+    def reconvert(self):
+        """Regenerate every MD file of the save dir from its HTML cache (--reconvert)
+        No network and no browser: cached pages are converted on crawl_config["convert_procs"] processes
+        (0 = one per CPU core), MD files whose content does not change are not rewritten.
+        :return: Crawl result (see result()) with a "reconvert" dict (written / unchanged / empty / failed pages)
+        """
+        if not os.path.exists(os.path.join(self.root_save_dir, HTML_CACHE_FILENAME)):
+            raise ValueError(f"No HTML cache in {self.root_save_dir}, crawl it first (with the crawl config html_cache on)")
+        self.open_html_cache(reconvert=True)
+        if self.crawl_config["output"] != "files":
+            self.open_output_sink()
+        write = self.output_sink is None
+        procs = self.crawl_config["convert_procs"] or os.cpu_count() or 1
+        print(f"♻️  Reconverting {self.html_cache.count()} cached pages of {self.target_url} into {self.root_save_dir} "
+              f"({procs} converter processes, no network)")
+        print("-" * 80)
+        stats = {"written": 0, "unchanged": 0, "empty": 0, "failed": 0}
+        media = [0, 0]  # (linked, missing)
+        settings = self.get_convert_settings()
+        max_pending = procs * self.crawl_config["convert_backlog"]  # Bounds the cached HTML held in memory
+
+        def finish(future):
+            url = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Conversion failed: {str(e)[:80]} - {url}")
+                stats["failed"] += 1
+                return
+            linked, missing = self.link_offline_media(result["media"])
+            media[0] += linked
+            media[1] += missing
+            if result["status"] == "converted":  # Output sink
+                result["status"] = "written" if self.write_page(result["markdown"], url, result["md_hash"],
+                                                                result["page_links"]) else "failed"
+            stats[result["status"]] += 1
+            if result["status"] == "written":
+                self.count_saved_md(result["md_path"], url)
+            elif result["status"] == "unchanged":
+                self.crawled_count += 1
+
+        pending = {}
+        try:
+            with ProcessPoolExecutor(max_workers=procs, mp_context=multiprocessing.get_context("spawn")) as pool:
+                for url, kind, body, final_url, page_base_url in self.html_cache.iter_pages():
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            finish(future)
+                    pending[pool.submit(reconvert_page_job, settings, url, kind, body, final_url, page_base_url, write)] = url
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finish(future)
+        finally:
+            self.close_html_cache()
+            self.close_output_sink()
+        self.media_result = (0, 0, media[0], media[1])
+        print(f"📊 Reconvert: {stats['written']} MD files rewritten | {stats['unchanged']} unchanged | "
+              f"{stats['empty']} without content | {stats['failed']} failed" +
+              (f" | {media[1]} media files not available offline (original URL kept)" if media[1] else ""))
+        result = self.result()
+        result["reconvert"] = stats
+        return result
+
+    def result(self):
+        """Print completion statistics
+        :return: Dict with target_url, base_url, save_dir, pages, fetch_paths, urls (canonicalisation), rate,
+                 retries (retries / recovered / failed pages), media, incremental and output (bundle) stats
+        """
+        downloaded, captured, reused, failed = self.media_result
+        print("-" * 80)
+        print(f"\n🎉 Crawl Task Completed!")
+        print(f"📊 Statistics: Total crawled {self.crawled_count} valid pages")
+        if self.crawl_config["canonical_urls"]:
+            print(f"📊 URL canonicalisation: {self.url_stats['merged']} fetches saved on duplicate URL spellings | "
+                  f"{self.url_stats['duplicates']} redirect/rel=canonical duplicates not converted")
+        self.finish_incremental_report()
+        if self.fetch_config["mode"] == "auto":
+            print(f"📊 Fetch paths: {self.fetch_stats['static']} static | {self.fetch_stats['browser']} browser-rendered "
+                  f"({self.fetch_stats['fallback']} fell back from static)" +
+                  (f" | {self.fetch_stats['unchanged']} unchanged (304 / same HTML)" if self.fetch_stats["unchanged"] else ""))
+        scheduler = self.get_scheduler()
+        rate = scheduler.summary(self.base_url) if scheduler is not None else None
+        if rate and self.fetch_config["adaptive_rate"]:
+            print(f"📊 Host rate ({rate['host']}): {rate['requests']} requests | window {rate['limit']} "
+                  f"(peak {rate['peak_limit']}) | {rate['throttled']} throttled | {rate['errors']} errors | "
+                  f"{rate['slowdowns']} slowdowns" + (f" | Crawl-delay {rate['crawl_delay']}s" if rate['crawl_delay'] else ""))
+        if self.retry_stats["retries"] or self.retry_stats["failed"]:
+            print(f"📊 Retries: {self.retry_stats['retries']} retries, {self.retry_stats['recovered']} pages recovered, "
+                  f"{self.retry_stats['failed']} failed" + (" (run again with --retry-failed to fetch only those)"
+                                                            if self.retry_stats["failed"] else ""))
+        print(f"📂 All files saved to: {self.root_save_dir}")
+        if self.output_result:
+            output, path, written = self.output_result
+            print(f"📦 Output: {written} pages written to {'stdout' if path == '-' else path} ({output})")
+        if self.crawl_picture or self.crawl_video:
+            media_tips = []
+            if self.crawl_picture: media_tips.append("Pictures (images/)")
+            if self.crawl_video: media_tips.append("Videos (videos/)")
+            print(f"📌 Crawled {'+'.join(media_tips)}, saved to MD same-level directories (no parent dir restriction)")
+            print(f"📊 Media: {downloaded} downloaded, " + (f"{captured} captured from the browser, " if captured else "") +
+                  (f"{reused} reused from other crawls / the media store, " if reused else "") +
+                  f"{failed} failed (failed ones keep their original URL)")
+        print(f"\n💡 Tip: Open {self.root_save_dir} to view generated MD files and media resources")
+        return {
+            "target_url": self.target_url,
+            "base_url": self.base_url,
+            "save_dir": self.root_save_dir,
+            "pages": self.crawled_count,
+            "fetch_paths": dict(self.fetch_stats),
+            "urls": dict(self.url_stats),
+            "rate": rate,
+            "retries": dict(self.retry_stats),
+            "media": {"downloaded": downloaded, "captured": captured, "reused": reused, "failed": failed},
+            "incremental": self.incremental_stats,
+            "output": dict(zip(("format", "path", "pages"), self.output_result)) if self.output_result else None
+        }
+
+
+class Crawler:
+    """Long-lived crawler: runs crawl jobs on one warm browser and shared HTTP/converter pools
+    The browser belongs to the event loop that launched it: switching between the sync API and
+    crawl_async on another loop needs a close() / aclose() in between.
+    :param config: Overrides per config section, e.g. {"fetch": {"mode": "auto"}, "crawl": {"workers": 4}}
+                   (sections: playwright, media, fetch, crawl, markdown - see the *_CONFIG dicts)
+    """
+
+    def __init__(self, config=None):
+        self.config = build_config(config)
+        self.browser_host = AsyncBrowserHost(headless=self.config["playwright"]["headless"])
+        self._http_session = None
+        self._media_session = None
+        self._convert_pool = None
+        self._page_slots = None        # (event loop, semaphore of crawl_config["max_in_flight"]) of the running jobs
+        self._scheduler = None         # Per-host HostScheduler (rate window, circuit breaker)
+        self.media_cache = MediaCache()  # Media downloaded by any job, reused by the others
+        self._media_store = None       # Cross-run content-addressed MediaStore (media config "store")
+        self._lock = threading.Lock()  # Lazy session/pool creation from executor threads
+        self._loop = None              # Event loop of the sync API
+        self.jobs = 0                  # Crawl jobs started
+
+    def get_http_session(self):
+        """Pooled HTTP session for static fetches and sitemap discovery, created on first use"""
+        with self._lock:
+            if self._http_session is None:
+                self._http_session = create_http_session(
+                    pool_size=self.config["fetch"]["pool_size"],
+                    user_agent=self.config["playwright"]["user_agent"]
+                )
+            return self._http_session
+
+    def get_media_session(self):
+        """Pooled HTTP session shared by the media downloaders of all jobs, created on first use"""
+        with self._lock:
+            if self._media_session is None:
+                self._media_session = create_http_session(
+                    pool_size=self.config["media"]["workers"],
+                    user_agent=self.config["playwright"]["user_agent"]
+                )
+            return self._media_session
+
+    def get_media_store(self):
+        """Content-addressed media store shared by all jobs and runs, opened on first use / None (disabled)"""
+        media_config = self.config["media"]
+        if not media_config["store"]:
+            return None
+        with self._lock:
+            if self._media_store is None:
+                self._media_store = MediaStore(media_config["store_dir"] or default_media_store_dir(),
+                                               max_bytes=int(media_config["store_max_mb"] * 1024 * 1024))
+            return self._media_store
+
+    def get_scheduler(self):
+        """Per-host scheduler shared by all jobs (page fetches and media): rate window + circuit breaker"""
+        fetch_config = self.config["fetch"]
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = HostScheduler(
+                    fetch_config,
+                    fetch_robots=lambda url: fetch_robots_txt(self.get_http_session(), url, fetch_config["timeout"]),
+                    user_agent=self.config["playwright"]["user_agent"]
+                )
+            return self._scheduler
+
+    def get_convert_pool(self):
+        """HTML→MD converter process pool (crawl_config["convert_procs"] processes), started on first use
+        Processes are spawned (not forked): the crawl process runs browser and download threads.
+        """
+        with self._lock:
+            if self._convert_pool is None:
+                self._convert_pool = ProcessPoolExecutor(
+                    max_workers=self.config["crawl"]["convert_procs"],
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._convert_pool
+
+    def get_page_slots(self):
+        """Semaphore capping pages fetched at the same time by all jobs / None (no global limit)
+        Created on the running loop: jobs on another loop (crawl_async after a sync crawl) get their own.
+        """
+        if not self.config["crawl"]["max_in_flight"]:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._page_slots is None or self._page_slots[0] is not loop:
+            self._page_slots = (loop, asyncio.Semaphore(self.config["crawl"]["max_in_flight"]))
+        return self._page_slots[1]
+
+    def new_job(self, url, save_dir=None, depth=None, count=None, picture=False, video=False):
+        """CrawlJob bound to this crawler (not started)"""
+        self.jobs += 1
+        return CrawlJob(url, save_dir, depth, count, picture, video, config=self.config, crawler=self)
+
+    def reconvert(self, url, save_dir=None, picture=False, video=False):
+        """Regenerate the MD files of an earlier crawl of url from its HTML cache, without network or browser
+        :param picture: Keep local picture links (missing files are taken from the media store, never downloaded)
+        :param video: Same for videos
+        :return: Crawl result dict (see CrawlJob.reconvert)
+        """
+        job = self.new_job(url, save_dir, count=0, picture=picture, video=video)
+        return job.reconvert()
+
+    async def crawl_async(self, url, save_dir=None, depth=None, count=None, picture=False, video=False,
+                          sitemap=False, resume=False, incremental=False, report=None):
+        """Crawl url and its subpages into save_dir; safe to run several at once on one event loop
+        :param url: Target URL (its parent dir is the crawl scope)
+        :param save_dir: Local root save directory (None = generated from the base URL)
+        :param depth: Max relative crawl depth (None = crawl config max_depth)
+        :param count: Max crawl file count, 0 = unlimited (None = crawl config max_count)
+        :param picture: Download pictures next to the MD files
+        :param video: Download videos next to the MD files
+        :param sitemap: Seed the frontier from robots.txt / sitemap.xml
+        :param resume: Continue a previous crawl into the same save dir ("failed" = retry its failed pages too)
+        :param incremental: Skip conversion and writes for pages unchanged since the last run
+        :param report: Per-page JSONL report path
+        :return: Crawl result dict (see CrawlJob.result)
+        """
+        job = self.new_job(url, save_dir, depth, count, picture, video)
+        return await job.run_async(resume, sitemap, incremental, report)
+
+    def crawl(self, url, save_dir=None, depth=None, count=None, picture=False, video=False,
+              sitemap=False, resume=False, incremental=False, report=None, depth_first=False):
+        """Blocking crawl_async on the crawler's private event loop (browser stays warm between calls)
+        :param depth_first: Classic depth-first crawl on a sync browser owned by the job
+                            (what the CLI does with --workers 1), nothing is shared with other jobs,
+                            crawl config "order" does not apply
+        :return: Crawl result dict (see CrawlJob.result)
+        """
+        if depth_first:
+            job = self.new_job(url, save_dir, depth, count, picture, video)
+            return job.run(resume, sitemap, incremental, report)
+        return self._run(self.crawl_async(url, save_dir, depth, count, picture, video, sitemap, resume, incremental, report))
+
+    async def crawl_batch_async(self, seeds, sitemap=False, resume=False, incremental=False, report=None):
+        """Crawl many seeds, crawl_config["batch_jobs"] of them at the same time
+        A failing seed does not stop the others, its result carries the error instead.
+        :param seeds: Dicts with url and optional save_dir/depth/count/picture/video (crawl_async arguments)
+        :param report: Function seed index → per-seed report path / None
+        :return: Crawl result dicts in seed order, each with an "error" key (None = crawled)
+        """
+        running = asyncio.Semaphore(max(1, self.config["crawl"]["batch_jobs"]))
+
+        async def crawl_seed(index, seed):
+            async with running:
+                try:
+                    result = await self.crawl_async(sitemap=sitemap, resume=resume, incremental=incremental,
+                                                    report=report(index) if report else None, **seed)
+                    result["error"] = None
+                except Exception as e:
+                    print(f"❌ Seed crawl aborted: {str(e)[:80]} - {seed['url']}")
+                    result = {"target_url": seed["url"], "save_dir": seed.get("save_dir"), "pages": 0, "error": str(e)}
+                return result
+
+        return await asyncio.gather(*(crawl_seed(index, seed) for index, seed in enumerate(seeds, 1)))
+
+    def crawl_batch(self, seeds, sitemap=False, resume=False, incremental=False, report=None):
+        """Blocking crawl_batch_async on the crawler's private event loop"""
+        return self._run(self.crawl_batch_async(seeds, sitemap, resume, incremental, report))
+
+    def _get_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def _run(self, coro):
+        """Run coro on the private loop; on Ctrl-C cancel it and let the jobs close their files"""
+        loop = self._get_loop()
+        task = loop.create_task(coro)
+        try:
+            return loop.run_until_complete(task)
+        except BaseException:
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+            raise
+
+    async def aclose(self):
+        """Close the shared browser, HTTP sessions and converter processes"""
+        self._page_slots = None
+        try:
+            await self.browser_host.close()
+        finally:
+            with self._lock:
+                for session in (self._http_session, self._media_session):
+                    if session is not None:
+                        session.close()
+                self._http_session = self._media_session = None
+                if self._media_store is not None:
+                    self._media_store.close()
+                    self._media_store = None
+                if self._convert_pool is not None:
+                    # Queued conversions were cancelled with their jobs (asyncio cancels the executor futures),
+                    # only running ones are waited for (no cancel_futures=, it needs Python 3.9)
+                    self._convert_pool.shutdown(wait=True)
+                    self._convert_pool = None
+
+    def close(self):
+        """Blocking aclose (for the sync API)"""
+        loop = self._get_loop()
+        try:
+            loop.run_until_complete(self.aclose())
+        finally:
+            loop.close()
+            self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,154 @@
+"""URL discovery without rendering: robots.txt Sitemap: entries and sitemap.xml
+
+robots.txt Crawl-delay is parsed here too (used by the per-host rate scheduler).
+
+Sitemap indexes are followed recursively and gzipped sitemaps (*.xml.gz or a
+gzip body) are decompressed. XML is parsed with lxml with entity resolution
+and network access disabled.
+"""
+from urllib.parse import urlparse, urljoin
+from datetime import datetime, timezone
+import gzip
+from lxml import etree
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+
+def get_robots_url(url):
+    """robots.txt URL of the host serving url"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+
+
+def fetch_robots_txt(session, url, timeout):
+    """Fetch robots.txt of url's host
+    :return: robots.txt text / "" if missing or unreachable
+    """
+    try:
+        response = session.get(get_robots_url(url), timeout=timeout)
+        if response.status_code >= 400:
+            return ""
+        return response.text
+    except Exception:
+        return ""
+
+
+def parse_robots_sitemaps(robots_txt):
+    """Extract Sitemap: URLs from robots.txt text"""
+    sitemaps = []
+    for line in robots_txt.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "sitemap" and value.strip():
+            sitemaps.append(value.strip())
+    return sitemaps
+
+
+def parse_robots_crawl_delay(robots_txt, user_agent="*"):
+    """Crawl-delay (s) of the robots.txt group that applies to user_agent
+    A group naming a token of user_agent wins over the "*" group.
+    :return: Delay in seconds / None if not set
+    """
+    agent = (user_agent or "").lower()
+    delays = {}         # "specific" / "*" -> delay
+    group_agents = []   # User-agent lines of the current group
+    in_rules = False
+    for line in robots_txt.splitlines():
+        key, _, value = line.split("#", 1)[0].partition(":")
+        key, value = key.strip().lower(), value.strip()
+        if key == "user-agent":
+            if in_rules:
+                group_agents, in_rules = [], False
+            group_agents.append(value.lower())
+        elif key:
+            in_rules = True
+            if key != "crawl-delay":
+                continue
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            for name in group_agents:
+                if name == "*":
+                    delays.setdefault("*", delay)
+                elif name and name in agent:
+                    delays.setdefault("specific", delay)
+    return delays.get("specific", delays.get("*"))
+
+
+def _local_name(tag):
+    return tag[len(SITEMAP_NS):] if tag.startswith(SITEMAP_NS) else tag.rsplit("}", 1)[-1]
+
+
+def parse_sitemap(data):
+    """Parse sitemap XML (urlset or sitemapindex)
+    :return: (page_entries, child_sitemaps) - page entries are {"loc", "priority", "lastmod"}
+    """
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    parser = etree.XMLParser(resolve_entities=False, no_network=True, recover=True, huge_tree=True)
+    root = etree.fromstring(data, parser=parser)
+    if root is None:
+        return [], []
+    entries, children = [], []
+    is_index = _local_name(root.tag) == "sitemapindex"
+    for node in root:
+        if not isinstance(node.tag, str):
+            continue
+        fields = {_local_name(child.tag): (child.text or "").strip() for child in node if isinstance(child.tag, str)}
+        loc = fields.get("loc")
+        if not loc:
+            continue
+        if is_index or _local_name(node.tag) == "sitemap":
+            children.append(loc)
+        else:
+            try:
+                priority = float(fields.get("priority") or 0.5)
+            except ValueError:
+                priority = 0.5
+            entries.append({"loc": loc, "priority": priority, "lastmod": fields.get("lastmod") or None})
+    return entries, children
+
+
+def parse_lastmod(value):
+    """Sitemap <lastmod> (W3C datetime: 2024-05-01 / 2024-05-01T10:00:00+00:00 / ...Z) as a timestamp
+    :return: Seconds since the epoch / 0 if missing or unparsable
+    """
+    if not value:
+        return 0
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def discover_sitemap_urls(session, url, timeout, max_sitemaps=50, robots_txt=None):
+    """Collect page URLs from robots.txt Sitemap: entries, /sitemap.xml and sitemap indexes
+    :param robots_txt: Already fetched robots.txt text (fetched here if None)
+    :param max_sitemaps: Stop after fetching this many sitemap files
+    :return: (entries, sitemaps_read) - entries are {"loc", "priority", "lastmod"}, deduplicated
+    """
+    if robots_txt is None:
+        robots_txt = fetch_robots_txt(session, url, timeout)
+    pending = parse_robots_sitemaps(robots_txt) or [urljoin(get_robots_url(url), "/sitemap.xml")]
+    seen_sitemaps = set()
+    entries = {}
+    while pending and len(seen_sitemaps) < max_sitemaps:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in seen_sitemaps:
+            continue
+        seen_sitemaps.add(sitemap_url)
+        try:
+            response = session.get(sitemap_url, timeout=timeout)
+            if response.status_code >= 400:
+                continue
+            page_entries, children = parse_sitemap(response.content)
+        except Exception as e:
+            print(f"⚠️  Sitemap read failed: {str(e)[:50]} - {sitemap_url}")
+            continue
+        pending.extend(child for child in children if child not in seen_sitemaps)
+        for entry in page_entries:
+            entries.setdefault(entry["loc"], entry)
+    return list(entries.values()), len(seen_sitemaps)
@@ -0,0 +1,426 @@
+"""Fast HTML → Markdown engine working directly on lxml trees (--converter fast)
+
+Output follows markdownify for the options web2md uses (ATX headings, bullet
+cycle, pipe tables, lists, inline links, images, videos, fenced code blocks),
+so both engines are interchangeable; benchmarks/compare_converters.py checks
+them against each other. The speed comes from skipping BeautifulSoup: lxml
+parses in C, and the walk keeps per-node work constant (list numbers, <ul>
+nesting and <pre> ancestry are carried down instead of searched for).
+"""
+import re
+import lxml.html
+from lxml import etree
+
+RE_WHITESPACE = re.compile(r"[\t ]+")
+RE_ALL_WHITESPACE = re.compile(r"[\t \r\n]+")
+RE_NEWLINE_WHITESPACE = re.compile(r"[\t \r\n]*[\r\n][\t \r\n]*")
+RE_EXTRACT_NEWLINES = re.compile(r"^(\n*)((?:.*[^\n])?)(\n*)$", flags=re.DOTALL)
+RE_LINE_WITH_CONTENT = re.compile(r"^(.*)", flags=re.MULTILINE)
+RE_PRE_LSTRIP = re.compile(r"^[ \n]*\n")
+RE_PRE_RSTRIP = re.compile(r"[ \n]*$")
+RE_BACKTICK_RUNS = re.compile(r"`+")
+
+HEADINGS = {f"h{n}": n for n in range(1, 7)}
+# Whitespace-only text right inside these is dropped (markdownify rules)
+BLOCK_TAGS = frozenset(["p", "blockquote", "article", "div", "section", "ol", "ul", "li", "dl", "dt", "dd",
+                        "table", "thead", "tbody", "tfoot", "tr", "td", "th"]) | frozenset(HEADINGS)
+NOFORMAT_TAGS = frozenset(["pre", "code", "kbd", "samp"])
+SKIP_TEXT_TAGS = frozenset(["script", "style", "template", "noscript"])
+# huge_tree: libxml2 otherwise drops everything nested deeper than ~255 levels (page builder markup)
+HTML_PARSER = lxml.html.HTMLParser(huge_tree=True)
+HTML_BYTES_PARSER = lxml.html.HTMLParser(encoding="utf-8", huge_tree=True)
+
+
+def parse_html(html):
+    """Parse HTML text into an lxml document
+    :return: Root <html> element / None if there is nothing to parse
+    """
+    if not html:
+        return None
+    try:
+        return lxml.html.document_fromstring(html, parser=HTML_PARSER)
+    except ValueError:
+        # str with an XML encoding declaration: hand lxml the bytes instead
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=HTML_BYTES_PARSER)
+    except etree.ParserError:
+        return None
+
+
+def is_element(node):
+    """True for real elements (lxml comments and processing instructions have non-str tags)"""
+    return isinstance(node.tag, str)
+
+
+def find_first(root, tag, attrs):
+    """First <tag> below root whose attributes match attrs (BeautifulSoup find() semantics)
+    "class"/"class_" match one of the element's classes, other keys the exact value.
+    """
+    for el in root.iter(tag):
+        for key, value in attrs.items():
+            if key in ("class", "class_"):
+                if value not in (el.get("class") or "").split():
+                    break
+            elif el.get(key) != value:
+                break
+        else:
+            return el
+    return None
+
+
+def iter_text(el):
+    """Text nodes below el in document order (script/style contents excluded, like BeautifulSoup get_text)"""
+    if el.text and el.tag not in SKIP_TEXT_TAGS:
+        yield el.text
+    for child in el:
+        if is_element(child):
+            yield from iter_text(child)
+        if child.tail:
+            yield child.tail
+
+
+def _chomp(text):
+    prefix = " " if text and text[0] == " " else ""
+    suffix = " " if text and text[-1] == " " else ""
+    return prefix, suffix, text.strip()
+
+
+def _previous_element(el):
+    node = el.getprevious()
+    while node is not None and not is_element(node):
+        node = node.getprevious()
+    return node
+
+
+def _next_block_content(el):
+    """Tag name of the next content sibling ("" for plain text), None if there is none"""
+    if el.tail and el.tail.strip():
+        return ""
+    node = el.getnext()
+    while node is not None:
+        if is_element(node):
+            return node.tag
+        if node.tail and node.tail.strip():
+            return ""
+        node = node.getnext()
+    return None
+
+
+class MarkdownConverter:
+    """markdownify-compatible converter for lxml elements
+    Honours heading_style, bullets, code_language, strong_em_symbol, newline_style,
+    autolinks, escape_asterisks and escape_underscores; other markdownify options are ignored.
+    """
+
+    def __init__(self, **options):
+        self.heading_style = str(options.get("heading_style", "underlined")).lower()
+        self.bullets = options.get("bullets", "*+-")
+        self.code_language = options.get("code_language", "")
+        self.strong_em = options.get("strong_em_symbol", "*")
+        self.newline_style = str(options.get("newline_style", "spaces")).lower()
+        self.autolinks = options.get("autolinks", True)
+        self.escape_asterisks = options.get("escape_asterisks", True)
+        self.escape_underscores = options.get("escape_underscores", True)
+        self.inline_markup = {"b": 2 * self.strong_em, "strong": 2 * self.strong_em, "em": self.strong_em,
+                              "i": self.strong_em, "del": "~~", "s": "~~", "sub": "", "sup": ""}
+        self._converters = {}  # tag name -> convert_<tag> method (None if there is none)
+        self._child_tags = {}  # (parent_tags, tag name) -> parent_tags of the children
+
+    def convert(self, el):
+        """Convert an lxml element (and everything below it) to Markdown"""
+        if el is None:
+            return ""
+        return self.process_tag(el, frozenset(), 0, 0)
+
+    def escape(self, text):
+        if self.escape_asterisks:
+            text = text.replace("*", r"\*")
+        if self.escape_underscores:
+            text = text.replace("_", r"\_")
+        return text
+
+    def process_text(self, text, prev, next_, at_edge_prev, at_edge_next, parent_tags):
+        if "pre" not in parent_tags:
+            text = RE_NEWLINE_WHITESPACE.sub("\n", text)
+            text = RE_WHITESPACE.sub(" ", text)
+        if "_noformat" not in parent_tags:
+            text = self.escape(text)
+        if (prev is not None and (prev.tag in BLOCK_TAGS or prev.tag == "pre")) or at_edge_prev:
+            text = text.lstrip(" \t\r\n")
+        if (next_ is not None and (next_.tag in BLOCK_TAGS or next_.tag == "pre")) or at_edge_next:
+            text = text.rstrip()
+        return text
+
+    def process_tag(self, el, parent_tags, ul_depth, position):
+        """Convert el, parent_tags = names of its ancestors (+ _inline/_noformat markers)
+        :param ul_depth: Number of <ul> ancestors
+        :param position: 1-based index of el among its <li> siblings (list items only)
+        """
+        name = el.tag
+        if name in ("script", "style"):
+            return ""
+        remove_inside = name in BLOCK_TAGS
+        child_tags = self._child_tags.get((parent_tags, name))
+        if child_tags is None:
+            child_tags = parent_tags | {name}
+            if name in HEADINGS or name in ("td", "th"):
+                child_tags = child_tags | {"_inline"}
+            if name in NOFORMAT_TAGS:
+                child_tags = child_tags | {"_noformat"}
+            self._child_tags[(parent_tags, name)] = child_tags
+        child_ul_depth = ul_depth + 1 if name == "ul" else ul_depth
+
+        # Children as a flat list of elements and text runs (comments stay as empty siblings)
+        nodes = []
+        if el.text:
+            nodes.append(el.text)
+        for child in el:
+            nodes.append(child)
+            if child.tail:
+                nodes.append(child.tail)
+
+        strings = []
+        li_count = 0
+        last = len(nodes) - 1
+        for index, node in enumerate(nodes):
+            prev = nodes[index - 1] if index > 0 else None
+            next_ = nodes[index + 1] if index < last else None
+            if isinstance(node, str):
+                if not node.strip():
+                    if remove_inside and (prev is None or next_ is None):
+                        continue
+                    if ((prev is not None and (prev.tag in BLOCK_TAGS or prev.tag == "pre"))
+                            or (next_ is not None and (next_.tag in BLOCK_TAGS or next_.tag == "pre"))):
+                        continue
+                text = self.process_text(node, prev, next_, remove_inside and prev is None,
+                                         remove_inside and next_ is None, child_tags)
+            elif not is_element(node):
+                continue
+            else:
+                if node.tag == "li":
+                    li_count += 1
+                text = self.process_tag(node, child_tags, child_ul_depth, li_count)
+            if text:
+                strings.append(text)
+
+        if name == "pre" or "pre" in parent_tags:
+            text = "".join(strings)
+        else:
+            # Collapse newlines at child boundaries (max two)
+            collapsed = [""]
+            for string in strings:
+                leading, content, trailing = RE_EXTRACT_NEWLINES.match(string).groups()
+                if collapsed[-1] and leading:
+                    previous = collapsed.pop()
+                    leading = "\n" * min(2, max(len(previous), len(leading)))
+                collapsed.extend([leading, content, trailing])
+            text = "".join(collapsed)
+
+        convert = self._converters.get(name)
+        if convert is None and name not in self._converters:
+            convert = self._converters[name] = getattr(self, f"convert_{name}", None)
+        if convert is not None:
+            return convert(el, text, parent_tags, ul_depth, position)
+        if name in HEADINGS:
+            return self.heading_markdown(HEADINGS[name], text, parent_tags)
+        if name in self.inline_markup:
+            return self.inline_markdown(self.inline_markup[name], text, parent_tags)
+        return text
+
+    # ----- Inline elements -----
+    def inline_markdown(self, markup, text, parent_tags):
+        if "_noformat" in parent_tags:
+            return text
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        return f"{prefix}{markup}{text}{markup}{suffix}"
+
+    def convert_a(self, el, text, parent_tags, ul_depth, position):
+        if "_noformat" in parent_tags:
+            return text
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        href = el.get("href")
+        title = el.get("title")
+        if self.autolinks and text.replace(r"\_", "_") == href and not title:
+            return f"<{href}>"
+        title_part = ' "%s"' % title.replace('"', r'\"') if title else ""
+        return f"{prefix}[{text}]({href}{title_part}){suffix}" if href else text
+
+    def convert_code(self, el, text, parent_tags, ul_depth, position):
+        if "_noformat" in parent_tags:
+            return text
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        max_backticks = max((len(run) for run in RE_BACKTICK_RUNS.findall(text)), default=0)
+        delimiter = "`" * (max_backticks + 1)
+        if max_backticks > 0:
+            text = f" {text} "
+        return f"{prefix}{delimiter}{text}{delimiter}{suffix}"
+
+    convert_kbd = convert_code
+    convert_samp = convert_code
+
+    def convert_br(self, el, text, parent_tags, ul_depth, position):
+        if "_inline" in parent_tags:
+            return text + " " if text else " "
+        return ("\\\n" if self.newline_style == "backslash" else "  \n") + text
+
+    def convert_q(self, el, text, parent_tags, ul_depth, position):
+        return f'"{text}"'
+
+    def convert_img(self, el, text, parent_tags, ul_depth, position):
+        alt = el.get("alt") or ""
+        src = el.get("src") or ""
+        title = el.get("title") or ""
+        if "_inline" in parent_tags:
+            return alt
+        title_part = ' "%s"' % title.replace('"', r'\"') if title else ""
+        return f"![{alt}]({src}{title_part})"
+
+    def convert_video(self, el, text, parent_tags, ul_depth, position):
+        if "_inline" in parent_tags:
+            return text
+        src = el.get("src") or ""
+        if not src:
+            source = next((s for s in el.iter("source") if s.get("src") is not None), None)
+            src = (source.get("src") or "") if source is not None else ""
+        poster = el.get("poster") or ""
+        if src and poster:
+            return f"[![{text}]({poster})]({src})"
+        if src:
+            return f"[{text}]({src})"
+        if poster:
+            return f"![{text}]({poster})"
+        return text
+
+    # ----- Block elements -----
+    def heading_markdown(self, level, text, parent_tags):
+        if "_inline" in parent_tags:
+            return text
+        text = text.strip()
+        if self.heading_style == "underlined" and level <= 2:
+            text = text.rstrip()
+            return "\n\n%s\n%s\n\n" % (text, ("=" if level == 1 else "-") * len(text)) if text else ""
+        text = RE_ALL_WHITESPACE.sub(" ", text)
+        hashes = "#" * level
+        if self.heading_style == "atx_closed":
+            return f"\n\n{hashes} {text} {hashes}\n\n"
+        return f"\n\n{hashes} {text}\n\n"
+
+    def convert_p(self, el, text, parent_tags, ul_depth, position):
+        if "_inline" in parent_tags:
+            return " " + text.strip(" \t\r\n") + " "
+        text = text.strip(" \t\r\n")
+        return f"\n\n{text}\n\n" if text else ""
+
+    def convert_div(self, el, text, parent_tags, ul_depth, position):
+        if "_inline" in parent_tags:
+            return " " + text.strip() + " "
+        text = text.strip()
+        return f"\n\n{text}\n\n" if text else ""
+
+    convert_article = convert_div
+    convert_section = convert_div
+    convert_dl = convert_div
+
+    def convert_blockquote(self, el, text, parent_tags, ul_depth, position):
+        text = (text or "").strip(" \t\r\n")
+        if "_inline" in parent_tags:
+            return " " + text + " "
+        if not text:
+            return "\n"
+        text = RE_LINE_WITH_CONTENT.sub(lambda m: "> " + m.group(1) if m.group(1) else ">", text)
+        return "\n" + text + "\n\n"
+
+    def convert_dt(self, el, text, parent_tags, ul_depth, position):
+        text = RE_ALL_WHITESPACE.sub(" ", (text or "").strip())
+        if "_inline" in parent_tags:
+            return " " + text + " "
+        return f"\n\n{text}\n" if text else "\n"
+
+    def convert_dd(self, el, text, parent_tags, ul_depth, position):
+        text = (text or "").strip()
+        if "_inline" in parent_tags:
+            return " " + text + " "
+        if not text:
+            return "\n"
+        text = RE_LINE_WITH_CONTENT.sub(lambda m: "    " + m.group(1) if m.group(1) else "", text)
+        return ":" + text[1:] + "\n"
+
+    def convert_hr(self, el, text, parent_tags, ul_depth, position):
+        return "\n\n---\n\n"
+
+    def convert_pre(self, el, text, parent_tags, ul_depth, position):
+        if not text:
+            return ""
+        text = RE_PRE_RSTRIP.sub("", RE_PRE_LSTRIP.sub("", text))
+        return f"\n\n```{self.code_language}\n{text}\n```\n\n"
+
+    def convert_ul(self, el, text, parent_tags, ul_depth, position):
+        if "li" in parent_tags:
+            return "\n" + text.rstrip()
+        next_tag = _next_block_content(el)
+        before_paragraph = next_tag is not None and next_tag not in ("ul", "ol")
+        return "\n\n" + text + ("\n" if before_paragraph else "")
+
+    convert_ol = convert_ul
+
+    def convert_li(self, el, text, parent_tags, ul_depth, position):
+        text = (text or "").strip()
+        if not text:
+            return "\n"
+        parent = el.getparent()
+        if parent is not None and parent.tag == "ol":
+            start = parent.get("start")
+            start = int(start) if start and start.isnumeric() else 1
+            bullet = f"{start + position - 1}."
+        else:
+            bullet = self.bullets[(ul_depth - 1) % len(self.bullets)]
+        bullet += " "
+        indent = " " * len(bullet)
+        text = RE_LINE_WITH_CONTENT.sub(lambda m: indent + m.group(1) if m.group(1) else "", text)
+        return bullet + text[len(bullet):] + "\n"
+
+    # ----- Tables -----
+    def convert_table(self, el, text, parent_tags, ul_depth, position):
+        return "\n\n" + text.strip() + "\n\n"
+
+    def convert_caption(self, el, text, parent_tags, ul_depth, position):
+        return text.strip() + "\n\n"
+
+    def convert_figcaption(self, el, text, parent_tags, ul_depth, position):
+        return "\n\n" + text.strip() + "\n\n"
+
+    def convert_td(self, el, text, parent_tags, ul_depth, position):
+        return " " + text.strip().replace("\n", " ") + " |" * _colspan(el)
+
+    convert_th = convert_td
+
+    def convert_tr(self, el, text, parent_tags, ul_depth, position):
+        cells = [cell for cell in el.iter("td", "th") if cell is not el]
+        parent = el.getparent()
+        parent_tag = parent.tag if parent is not None else None
+        is_first_row = _previous_element(el) is None
+        is_headrow = (all(cell.tag == "th" for cell in cells)
+                      or (parent_tag == "thead" and sum(1 for _ in parent.iter("tr")) == 1))
+        grandparent = parent.getparent() if parent is not None else None
+        is_head_row_missing = is_first_row and (
+            parent_tag != "tbody"
+            or (grandparent is not None and next(grandparent.iter("thead"), None) is None))
+        full_colspan = sum(_colspan(cell) for cell in cells)
+        overline = underline = ""
+        if is_headrow and is_first_row:
+            underline = "| " + " | ".join(["---"] * full_colspan) + " |\n"
+        elif is_head_row_missing or (is_first_row and (parent_tag == "table" or (
+                parent_tag == "tbody" and _previous_element(parent) is None))):
+            overline = "| " + " | ".join([""] * full_colspan) + " |\n"
+            overline += "| " + " | ".join(["---"] * full_colspan) + " |\n"
+        return overline + "|" + text + "\n" + underline
+
+
+def _colspan(cell):
+    colspan = cell.get("colspan") or ""
+    return max(1, min(1000, int(colspan))) if colspan.isdigit() else 1
@@ -0,0 +1,63 @@
+"""Plain HTTP fetching (no browser) for server-rendered pages
+
+A single requests.Session keeps keep-alive connections per host, so static
+pages cost one round trip instead of a full Chromium render.
+"""
+from urllib.parse import urljoin
+import re
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+# SSL verification is disabled on purpose (same as the media opener)
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+BASE_HREF_RE = re.compile(r'<base\s[^>]*href\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+
+
+def create_http_session(pool_size=16, user_agent=None, headers=None):
+    """Create a pooled HTTP session (keep-alive connections reused per host)
+    :param pool_size: Max kept-alive connections per host
+    :param user_agent: User-Agent header (same as the browser for consistent responses)
+    :param headers: Extra default headers (e.g. Referer)
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.verify = False
+    if user_agent:
+        session.headers["User-Agent"] = user_agent
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def is_transient_error(error):
+    """Timeouts and connection errors are worth a retry, TLS and protocol errors are not"""
+    return (isinstance(error, (requests.Timeout, requests.ConnectionError))
+            and not isinstance(error, requests.exceptions.SSLError))
+
+
+def fetch_static_html(session, url, timeout, headers=None):
+    """Fetch raw HTML without rendering
+    :param headers: Extra request headers (e.g. If-None-Match / If-Modified-Since)
+    :return: (html, final_url, base_uri, validators) - html is None if not a usable HTML page,
+             validators = {"status", "etag", "last_modified", "retry_after"} (status 304 = not modified)
+    """
+    response = session.get(url, timeout=timeout, headers=headers)
+    validators = {
+        "status": response.status_code,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "retry_after": response.headers.get("Retry-After")
+    }
+    content_type = response.headers.get("Content-Type", "")
+    if response.status_code == 304 or response.status_code >= 400 or "html" not in content_type.lower():
+        return None, response.url, None, validators
+    html = response.text
+    final_url = response.url
+    # Same resolution as document.baseURI: <base href> relative to the final URL
+    match = BASE_HREF_RE.search(html[:65536])
+    base_uri = urljoin(final_url, match.group(1)) if match else final_url
+    return html, final_url, base_uri, validators
@@ -0,0 +1,59 @@
+"""Priority-ordered crawl frontier (--order)
+
+The default frontier is a FIFO queue (concurrent crawl) or a depth-first
+stack (serial crawl), so a crawl capped by --count can spend its whole budget
+in the first subtree it meets. A PriorityFrontier hands out the most valuable
+queued URL first instead, ranked by a key the crawl job supplies:
+    depth    - shallowest pages first (breadth-first by relative depth)
+    inlinks  - pages linked from the most crawled pages first
+    sitemap  - highest sitemap <priority>, then newest <lastmod>, then shallowest
+Ties keep discovery order. Keys may improve while a URL waits (one more
+in-link): bump() pushes a fresh heap entry and the outdated one is skipped
+when it surfaces, so re-ranking costs O(log n) without touching the heap.
+"""
+import asyncio
+import heapq
+import itertools
+
+
+class PriorityFrontier(asyncio.Queue):
+    """asyncio queue of URLs handed out by smallest key (ties in insertion order)
+    :param key: Function url → sortable key, smaller = crawled sooner (evaluated on put / bump)
+    :param ident: Function url → identity used by bump() (e.g. the canonical URL key)
+    """
+
+    def __init__(self, key, ident=None):
+        self.key = key
+        self.ident = ident or (lambda url: url)
+        super().__init__()
+
+    def _init(self, maxsize):
+        self._queue = []                 # Heap of (key, seq, url), may hold outdated entries
+        self._entries = {}               # ident -> (seq, url) of the live entry
+        self._seq = itertools.count()
+
+    def _qsize(self):
+        return len(self._entries)
+
+    def _put(self, url):
+        self._push(self.ident(url), url)
+
+    def _push(self, ident, url):
+        seq = next(self._seq)
+        self._entries[ident] = (seq, url)
+        heapq.heappush(self._queue, (self.key(url), seq, url))
+
+    def _get(self):
+        while True:
+            _, seq, url = heapq.heappop(self._queue)
+            ident = self.ident(url)
+            entry = self._entries.get(ident)
+            if entry is not None and entry[0] == seq:
+                del self._entries[ident]
+                return url
+
+    def bump(self, ident):
+        """Re-rank a queued URL whose key changed (no-op if it is not waiting)"""
+        entry = self._entries.get(ident)
+        if entry is not None:
+            self._push(ident, entry[1])
@@ -0,0 +1,194 @@
+"""Memory-bounded crawl structures for very large sites (--large-crawl)
+
+A normal crawl keeps every URL it has seen in Python sets and the whole
+frontier in an in-memory queue, so memory grows with every discovered link.
+In large-crawl mode:
+    BloomFilter  - fixed-size bit array answering "maybe seen / surely new"
+    DiskUrlSet   - BloomFilter in front of an exact on-disk table: new URLs
+                   (the common case for a miss) never touch the disk, only
+                   Bloom hits are confirmed with one indexed lookup
+    SpillQueue   - asyncio.Queue that keeps at most N URLs in memory and
+                   spills the rest, in FIFO order, to an on-disk table
+Memory stays roughly constant (a few MB of bit arrays plus the in-memory part
+of the frontier) whatever the number of URLs. The on-disk tables live next to
+the crawl state and are deleted when the job closes: they are rebuilt from the
+crawl state on --resume.
+"""
+from collections import deque
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+
+LARGE_STORE_FILENAME = ".web2md_seen.sqlite"
+FRONTIER_FILENAME = ".web2md_frontier.sqlite"
+
+
+def open_scratch_db(path):
+    """SQLite connection for throw-away data (no journal, no fsync), starting from an empty file"""
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    return conn
+
+
+def remove_scratch_db(conn, path):
+    conn.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings (false positives possible, false negatives never)
+    :param capacity: Expected number of items (the error rate grows past it)
+    :param error_rate: False-positive rate at capacity
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(1, capacity)
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        """Add item
+        :return: True if item was surely not in the filter before
+        """
+        new = False
+        bits = self.bits
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                new = True
+        return new
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class LargeCrawlStore:
+    """On-disk scratch DB holding the exact tables behind the DiskUrlSets of one job
+    :param save_dir: Crawl save directory (the DB lives inside it)
+    :param commit_every: Writes between commits (keeps the open transaction small)
+    """
+
+    def __init__(self, save_dir, commit_every=5000):
+        self.path = os.path.join(save_dir, LARGE_STORE_FILENAME)
+        self.conn = open_scratch_db(self.path)
+        self.lock = threading.Lock()  # Sitemap discovery checks URLs from a worker thread
+        self.commit_every = commit_every
+        self._writes = 0
+
+    def url_set(self, table, capacity, error_rate=0.001):
+        """New empty DiskUrlSet stored in table"""
+        self.conn.execute(f"CREATE TABLE {table} (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        return DiskUrlSet(self, table, capacity, error_rate)
+
+    def wrote(self):
+        self._writes += 1
+        if self._writes >= self.commit_every:
+            self.conn.commit()
+            self._writes = 0
+
+    def close(self):
+        remove_scratch_db(self.conn, self.path)
+
+
+class DiskUrlSet:
+    """Set of strings (add / update / in) backed by a BloomFilter and an exact on-disk table
+    Created by LargeCrawlStore.url_set().
+    """
+
+    def __init__(self, store, table, capacity, error_rate=0.001):
+        self.store = store
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._insert = f"INSERT OR IGNORE INTO {table} (key) VALUES (?)"
+        self._select = f"SELECT 1 FROM {table} WHERE key = ?"
+
+    def add(self, key):
+        with self.store.lock:
+            self.bloom.add(key)
+            self.store.conn.execute(self._insert, (key,))
+            self.store.wrote()
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        if key not in self.bloom:
+            return False  # Surely new: no disk access
+        with self.store.lock:
+            return self.store.conn.execute(self._select, (key,)).fetchone() is not None
+
+
+class SpillQueue(asyncio.Queue):
+    """FIFO asyncio queue of strings keeping at most memory_size items in memory, the rest on disk
+    :param path: Scratch DB file for spilled items (deleted by close())
+    :param memory_size: Items kept in memory, also the number moved back per refill
+    """
+
+    def __init__(self, path, memory_size=10000):
+        self.path = path
+        self.memory_size = max(1, memory_size)
+        self.conn = open_scratch_db(path)
+        self.conn.execute("CREATE TABLE spill (seq INTEGER PRIMARY KEY AUTOINCREMENT, item TEXT)")
+        self._pending = []  # Spilled items not written yet (flushed in batches)
+        self._spilled = 0
+        super().__init__()
+
+    def _init(self, maxsize):
+        self._queue = deque()
+
+    def _qsize(self):
+        return len(self._queue) + self._spilled
+
+    def empty(self):
+        return self._qsize() == 0  # asyncio.Queue.empty() only looks at the in-memory deque
+
+    def _put(self, item):
+        # Once anything is spilled, later items must queue behind it on disk to keep FIFO order
+        if self._spilled or len(self._queue) >= self.memory_size:
+            self._pending.append((item,))
+            self._spilled += 1
+            if len(self._pending) >= 1000:
+                self._flush()
+        else:
+            self._queue.append(item)
+
+    def _get(self):
+        if not self._queue:
+            self._refill()
+        return self._queue.popleft()
+
+    def _flush(self):
+        if self._pending:
+            self.conn.executemany("INSERT INTO spill (item) VALUES (?)", self._pending)
+            self.conn.commit()
+            self._pending = []
+
+    def _refill(self):
+        """Move the oldest spilled items back into memory"""
+        self._flush()
+        rows = self.conn.execute("SELECT seq, item FROM spill ORDER BY seq LIMIT ?", (self.memory_size,)).fetchall()
+        if rows:
+            self.conn.execute("DELETE FROM spill WHERE seq <= ?", (rows[-1][0],))
+            self.conn.commit()
+        self._queue.extend(item for _, item in rows)
+        self._spilled -= len(rows)
+
+    def close(self):
+        remove_scratch_db(self.conn, self.path)
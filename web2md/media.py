@@ -0,0 +1,376 @@
+"""Background media downloader (images/videos)
+
+Downloads run on a thread pool so page conversion never waits for media.
+Each file is streamed to disk in chunks through a temp file that is renamed
+into place once complete, so a crash never leaves a truncated image behind and
+large videos never sit in memory. One pooled HTTP session keeps keep-alive
+connections per host across all downloads (and across crawl jobs, when a
+long-lived Crawler passes its own session in). A MediaCache shared by the
+jobs of one Crawler remembers finished downloads, so a file used by several
+crawls (logos, shared diagrams) is fetched once and linked/copied afterwards.
+
+Media the browser already loaded while rendering a page (with the page's
+cookies) is kept in a MediaCapture until the page is converted; such files
+are written from the captured body instead of being downloaded a second
+time. Only lazy-loaded files the browser never requested are downloaded.
+
+A MediaStore keeps every finished file across runs, content-addressed by its
+SHA-256: files with identical content (CDN variants, query strings) are
+stored once, and a persistent URL → hash index lets the next crawl hard-link
+a known URL into its images/ / videos/ dirs without requesting it again. The
+least recently used files are evicted once the store exceeds its size bound.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from .fetch import create_http_session, is_transient_error
+from .ratelimit import RETRY_STATUSES, UNSCHEDULED, backoff_delay
+
+
+class MediaTooLarge(Exception):
+    """Raised when a media file exceeds the configured max size"""
+
+
+class MediaCache:
+    """Thread-safe map of media URL → local file of a finished download"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def get(self, url):
+        """Local file holding url / None if not downloaded yet (or deleted since)"""
+        with self._lock:
+            path = self._paths.get(url)
+        return path if path and os.path.exists(path) else None
+
+    def put(self, url, path):
+        with self._lock:
+            self._paths.setdefault(url, path)
+
+
+class MediaCapture:
+    """Thread-safe map of media URL → response body captured from the browser
+    Bodies are reference-counted per page: add() when a page is rendered, release() once it is converted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bodies = {}   # url -> [body, pages holding it]
+
+    def add(self, bodies):
+        """Keep captured bodies ({url: bytes}) for one page
+        :return: URLs to release() after the page
+        """
+        with self._lock:
+            for url, body in bodies.items():
+                entry = self._bodies.setdefault(url, [body, 0])
+                entry[1] += 1
+        return list(bodies)
+
+    def get(self, url):
+        with self._lock:
+            entry = self._bodies.get(url)
+        return entry[0] if entry else None
+
+    def release(self, urls):
+        with self._lock:
+            for url in urls:
+                entry = self._bodies.get(url)
+                if entry:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self._bodies[url]
+
+
+def link_or_copy(src, dst):
+    """Hard-link src to dst (same file system), copy it otherwise"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def default_media_store_dir():
+    """Per-user media store location: $XDG_CACHE_HOME/web2md/media (~/.cache/web2md/media)"""
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "web2md", "media")
+
+
+class MediaStore:
+    """Content-addressed media files shared by all runs: objects/<sha256[:2]>/<sha256> + a URL → hash index
+    Thread-safe; several processes may use one store (SQLite serialises the index writes).
+    :param root: Store directory
+    :param max_bytes: Evict least recently used files past this total size (0 = unbounded)
+    """
+
+    INDEX_FILENAME = "index.sqlite"
+
+    def __init__(self, root, max_bytes=0):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(root, self.INDEX_FILENAME), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS objects (hash TEXT PRIMARY KEY, size INTEGER, used REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS urls_hash ON urls (hash)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS objects_used ON objects (used)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        self.deduplicated = 0    # Files stored under a new URL whose content was already there
+        self.evicted = 0
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def get(self, url):
+        """Stored file of url / None (unknown URL, or its file was evicted / deleted since)"""
+        with self._lock:
+            row = self.conn.execute("SELECT hash FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            path = self.object_path(row[0])
+            if not os.path.exists(path):
+                self._forget(row[0])
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE objects SET used = ? WHERE hash = ?", (time.time(), row[0]))
+            self.conn.commit()
+        return path
+
+    def put(self, url, path, digest):
+        """Add a finished file (its content already hashed) under url
+        :param digest: SHA-256 hex digest of the file
+        :return: Stored file with that content - an older one if the content was already stored
+        """
+        stored = self.object_path(digest)
+        with self._lock:
+            known = self.conn.execute("SELECT size FROM objects WHERE hash = ?", (digest,)).fetchone()
+            if known is None or not os.path.exists(stored):
+                os.makedirs(os.path.dirname(stored), exist_ok=True)
+                tmp_path = f"{stored}.{uuid.uuid4().hex[:8]}.part"
+                link_or_copy(path, tmp_path)
+                os.replace(tmp_path, stored)
+                size = os.path.getsize(stored)
+                if known is None:
+                    self.total_bytes += size
+            else:
+                size = known[0]
+                self.deduplicated += 1
+            self.conn.execute("INSERT OR REPLACE INTO objects (hash, size, used) VALUES (?, ?, ?)",
+                              (digest, size, time.time()))
+            self.conn.execute("INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)", (url, digest))
+            if self.max_bytes and self.total_bytes > self.max_bytes:
+                self._evict(keep=digest)
+            self.conn.commit()
+        return stored
+
+    def _evict(self, keep):
+        """Delete least recently used files down to 90% of max_bytes (so eviction does not run on every put)"""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT hash, size FROM objects WHERE hash != ? ORDER BY used", (keep,)).fetchall()
+        for digest, size in rows:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(self.object_path(digest))  # Hard links in crawl dirs keep their content
+            except FileNotFoundError:
+                pass
+            self._forget(digest)
+            self.total_bytes -= size
+            self.evicted += 1
+
+    def _forget(self, digest):
+        self.conn.execute("DELETE FROM objects WHERE hash = ?", (digest,))
+        self.conn.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+
+    def close(self):
+        self.conn.close()
+
+
+def share_stored_file(stored, path):
+    """Replace path by a hard link to the stored file with the same content (keeps path if linking fails)"""
+    try:
+        if os.path.samefile(stored, path):
+            return
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        os.link(stored, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+class MediaDownloader:
+    """Thread pool that streams media files to disk
+    :param workers: Concurrent downloads
+    :param max_bytes: Skip files larger than this (0 = unlimited)
+    :param timeout: Connect/read timeout per request (s)
+    :param user_agent: User-Agent header for media requests
+    :param chunk_size: Bytes written per chunk
+    :param on_finish: Optional callback(url, seconds, bytes_written, ok) run after each download
+    :param session: Shared HTTP session (kept open by close()), default: a new pooled session
+    :param cache: Shared MediaCache, URLs already downloaded there are linked/copied instead of fetched
+    :param store: Cross-run MediaStore, known URLs are linked from it and finished files added to it
+    :param scheduler: Shared HostScheduler pacing downloads per host (None = no pacing)
+    :param retries: Retries after a transient failure (timeout, connection error, 429/5xx)
+    :param backoff: (first delay, max delay) of the exponential retry backoff (s)
+    """
+
+    def __init__(self, workers=4, max_bytes=0, timeout=30, user_agent=None, chunk_size=64 * 1024, on_finish=None,
+                 session=None, cache=None, store=None, scheduler=None, retries=0, backoff=(1.0, 30)):
+        self.on_finish = on_finish
+        self.scheduler = scheduler
+        self.retries = retries
+        self.backoff = backoff
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.store = store
+        self._owns_session = session is None
+        self.session = session or create_http_session(pool_size=workers, user_agent=user_agent)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="web2md-media")
+        self._lock = threading.Lock()
+        self._jobs = {}          # save_path -> {"url", "future", "refs"}
+        self.downloaded = 0
+        self.reused = 0          # Files taken from the cache / media store instead of downloaded
+        self.captured = 0        # Files written from a body the browser already loaded
+        self.retried = 0         # Download retries after transient failures
+        self.bytes_written = 0
+
+    def submit(self, url, save_path, ref_file=None, label="media", body=None):
+        """Queue a download (once per save_path), remember which file references it
+        :param ref_file: File whose link to save_path must be reverted if the download fails
+        :param body: Content captured from the browser (written as is, no request)
+        """
+        with self._lock:
+            job = self._jobs.get(save_path)
+            if job is None:
+                job = {"url": url, "refs": set(), "label": label}
+                job["future"] = self._executor.submit(self._download, url, save_path, label, body)
+                self._jobs[save_path] = job
+            if ref_file:
+                job["refs"].add(ref_file)
+        return job["future"]
+
+    def _fetch(self, url, tmp_path):
+        """Stream url into tmp_path through a host slot of the scheduler
+        :return: (bytes written, SHA-256 hex digest)
+        """
+        written = 0
+        digest = hashlib.sha256()
+        host_request = self.scheduler.request(url) if self.scheduler is not None else UNSCHEDULED
+        with host_request, self.session.get(url, stream=True, timeout=self.timeout) as response:
+            host_request.set_response(response.status_code, response.headers.get("Retry-After"))
+            response.raise_for_status()
+            declared = int(response.headers.get("Content-Length") or 0)
+            if self.max_bytes and declared > self.max_bytes:
+                raise MediaTooLarge(f"{declared / 1048576:.1f}MB > limit {self.max_bytes / 1048576:.1f}MB")
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    written += len(chunk)
+                    if self.max_bytes and written > self.max_bytes:
+                        raise MediaTooLarge(f"exceeds limit {self.max_bytes / 1048576:.1f}MB")
+                    f.write(chunk)
+                    digest.update(chunk)
+        return written, digest.hexdigest()
+
+    def _fetch_with_retries(self, url, tmp_path, label):
+        """_fetch, retried with exponential backoff while the failure looks transient"""
+        attempt = 0
+        while True:
+            try:
+                return self._fetch(url, tmp_path)
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if attempt >= self.retries or not (is_transient_error(e) or status in RETRY_STATUSES):
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retried += 1
+                print(f"🔄 {label.capitalize()} download retry {attempt}/{self.retries} ({str(e)[:50]}) - {url}")
+                time.sleep(backoff_delay(attempt, *self.backoff))
+
+    def _write_body(self, body, tmp_path):
+        """Write a captured body to tmp_path (same size limit as downloads)
+        :return: (bytes written, SHA-256 hex digest)
+        """
+        if self.max_bytes and len(body) > self.max_bytes:
+            raise MediaTooLarge(f"{len(body) / 1048576:.1f}MB > limit {self.max_bytes / 1048576:.1f}MB")
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        return len(body), hashlib.sha256(body).hexdigest()
+
+    def _download(self, url, save_path, label, body=None):
+        tmp_path = f"{save_path}.{uuid.uuid4().hex[:8]}.part"
+        start = time.perf_counter()
+        cached = self.cache.get(url) if self.cache is not None else None
+        if not cached and self.store is not None:
+            cached = self.store.get(url)
+        if cached:
+            try:
+                link_or_copy(cached, tmp_path)
+                os.replace(tmp_path, save_path)
+                with self._lock:
+                    self.reused += 1
+                return save_path
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)  # Fall back to downloading it
+        try:
+            if body is not None:
+                written, digest = self._write_body(body, tmp_path)
+            else:
+                written, digest = self._fetch_with_retries(url, tmp_path, label)
+            os.replace(tmp_path, save_path)
+            if self.store is not None:
+                try:
+                    share_stored_file(self.store.put(url, save_path, digest), save_path)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"⚠️  Media store update failed: {str(e)[:50]} - {url}")
+            with self._lock:
+                if body is not None:
+                    self.captured += 1
+                else:
+                    self.downloaded += 1
+                self.bytes_written += written
+            if self.cache is not None:
+                self.cache.put(url, save_path)
+            if self.on_finish:
+                self.on_finish(url, time.perf_counter() - start, written, True)
+            return save_path
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"⚠️  {label.capitalize()} download failed: {str(e)[:50]} - {url}")
+            if self.on_finish:
+                self.on_finish(url, time.perf_counter() - start, 0, False)
+            raise
+
+    def wait(self):
+        """Wait for all queued downloads
+        :return: List of failed jobs: (url, save_path, ref_files)
+        """
+        failed = []
+        with self._lock:
+            jobs = list(self._jobs.items())
+        for save_path, job in jobs:
+            try:
+                job["future"].result()
+            except Exception:
+                failed.append((job["url"], save_path, sorted(job["refs"])))
+        return failed
+
+    def close(self):
+        """Stop worker threads and close pooled connections (unless the session is shared)"""
+        self._executor.shutdown(wait=True)
+        if self._owns_session:
+            self.session.close()
@@ -0,0 +1,343 @@
+"""Adaptive per-host request scheduler (AIMD concurrency + robots.txt Crawl-delay)
+
+Every page navigation, static fetch and media download asks the scheduler of
+its host for a slot first. Each host has a concurrency limit that adapts to
+how the host behaves:
+    success, latency near the host's best    → limit + 1/limit (about +1 per full window),
+                                               10x slower close to where the host last throttled
+    latency well above the best seen         → limit x latency_decrease
+    429 / 503 / timeouts / connection errors → limit x throttle_decrease,
+                                               Retry-After pauses the whole host
+A host whose robots.txt sets Crawl-delay gets one request at a time, spaced
+by the delay. Decreases are applied at most once per cooldown, so a burst of
+errors from requests that were already in flight counts as one signal.
+
+Each host also has a circuit breaker: after circuit_failures consecutive
+failures (timeouts, connection errors, 5xx) requests fail fast with
+HostUnavailable for circuit_open_s, then a single probe request decides
+whether the host is back (closed again) or still down (open twice as long).
+The breaker works even when adaptive_rate is off. backoff_delay() gives the
+wait before retrying a transient failure (exponential, with jitter).
+
+Thread code (static fetches, media downloads, the sync browser) uses
+`with scheduler.request(url)`, asyncio code `async with scheduler.request(url)`.
+Both share the same per-host state.
+"""
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import asyncio
+import random
+import threading
+import time
+from .discovery import parse_robots_crawl_delay
+
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)  # Transient server answers worth retrying
+
+
+class HostUnavailable(Exception):
+    """Request refused without touching the network: the host's circuit breaker is open"""
+
+
+def backoff_delay(attempt, base, cap):
+    """Seconds to wait before retry number attempt (1, 2...): base x 2^(attempt-1) capped, half of it jittered"""
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date) / None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class HostState:
+    """Concurrency window, pacing and latency statistics of one host"""
+
+    def __init__(self, host, config):
+        self.host = host
+        self.config = config
+        self.limit = float(min(config["host_start_concurrency"], config["host_max_concurrency"]))
+        self.in_flight = 0
+        self.next_allowed = 0.0     # monotonic time before which no request may start (Crawl-delay, Retry-After)
+        self.interval = 0.0         # Minimum spacing between request starts (Crawl-delay)
+        self.crawl_delay = None
+        self.robots_loaded = False
+        self.best_latency = {}      # kind -> best response time seen (s)
+        self.avg_latency = {}       # kind -> EWMA of response times (s)
+        self.cooldown_until = 0.0
+        self.throttle_point = None  # Window at the last 429/503: growth slows down when approaching it
+        self.peak_limit = self.limit
+        self.failures = 0           # Consecutive failed requests (circuit breaker)
+        self.circuit_until = None   # monotonic time the open circuit allows a probe / None = closed
+        self.circuit_open_s = config["circuit_open_s"]
+        self.probing = False
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "slowdowns": 0, "fast_failed": 0, "circuit_opened": 0}
+        self.cond = threading.Condition()
+        self.async_waiters = []     # (loop, future) of asyncio tasks waiting for a free slot
+
+    def max_limit(self):
+        return 1 if self.crawl_delay else self.config["host_max_concurrency"]
+
+    def set_crawl_delay(self, delay):
+        """Apply robots.txt Crawl-delay (capped by max_crawl_delay)"""
+        if delay:
+            self.crawl_delay = min(delay, self.config["max_crawl_delay"])
+            self.interval = self.crawl_delay
+            self.limit = self.peak_limit = 1.0
+        self.robots_loaded = True
+
+    def try_acquire(self, now):
+        """Take a slot if one is free (caller holds cond)
+        :return: 0 (slot taken) / seconds until pacing allows a start / None (wait for a release)
+        :raise HostUnavailable: The circuit is open (or its probe request is still running)
+        """
+        if self.circuit_until is not None and (now < self.circuit_until or self.probing):
+            self.stats["fast_failed"] += 1
+            raise HostUnavailable(f"{self.host} looks down ({self.failures} failures in a row), "
+                                  f"next try in {max(0, int(self.circuit_until - now))}s")
+        if self.config["adaptive_rate"]:
+            if self.in_flight >= max(1, int(self.limit)):
+                return None
+            if now < self.next_allowed:
+                return self.next_allowed - now
+            self.next_allowed = now + self.interval
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        self.probing = self.circuit_until is not None  # Half-open: this request tests the host
+        return 0
+
+    def increase(self):
+        step = 1.0 / self.limit
+        if self.throttle_point is not None and self.limit + 1 >= self.throttle_point:
+            step /= 10  # Probe carefully around the window that got throttled last time
+        self.limit = min(self.max_limit(), self.limit + step)
+
+    def decrease(self, factor, now, stat):
+        self.stats[stat] += 1
+        if now >= self.cooldown_until:
+            self.limit = max(1.0, self.limit * factor)
+            self.cooldown_until = now + max([self.config["decrease_cooldown"]] + list(self.avg_latency.values()))
+
+    def finish(self, now, latency, status=None, retry_after=None, error=False, kind=None):
+        """Release a slot, update the circuit breaker and adapt the window to the outcome (caller holds cond)
+        :param kind: Latency class of the request (browser / static...), None = no latency signal
+        """
+        self.in_flight -= 1
+        self.update_circuit(now, error or (status is not None and status >= 500), status == 429)
+        if not self.config["adaptive_rate"]:
+            return
+        if status in THROTTLE_STATUSES:
+            if now >= self.cooldown_until:
+                self.throttle_point = self.limit
+            self.decrease(self.config["throttle_decrease"], now, "throttled")
+            pause = min(retry_after if retry_after is not None else self.config["throttle_pause"],
+                        self.config["max_retry_after"])
+            self.next_allowed = max(self.next_allowed, now + pause)
+        elif error:
+            self.decrease(self.config["throttle_decrease"], now, "errors")
+        elif kind is not None:
+            best = self.best_latency[kind] = min(self.best_latency.get(kind, latency), latency)
+            avg = self.avg_latency[kind] = 0.8 * self.avg_latency.get(kind, latency) + 0.2 * latency
+            if avg > best * self.config["latency_factor"] + 0.05:
+                self.decrease(self.config["latency_decrease"], now, "slowdowns")
+            else:
+                self.increase()
+        else:
+            self.increase()
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    def update_circuit(self, now, failed, throttled):
+        if self.probing:
+            self.probing = False
+            if failed:
+                self.circuit_open_s = min(self.circuit_open_s * 2, self.config["circuit_max_open_s"])
+                self.circuit_until = now + self.circuit_open_s
+                print(f"⛔ {self.host} still down, next try in {int(self.circuit_open_s)}s")
+                return
+        if failed:
+            self.failures += 1
+            threshold = self.config["circuit_failures"]
+            if threshold and self.circuit_until is None and self.failures >= threshold:
+                self.circuit_until = now + self.circuit_open_s
+                self.stats["circuit_opened"] += 1
+                print(f"⛔ {self.host} failed {self.failures} times in a row, "
+                      f"failing its requests fast for {int(self.circuit_open_s)}s")
+        elif not throttled:  # A 429 proves the host is up, but not that it serves pages
+            if self.circuit_until is not None:
+                print(f"✅ {self.host} is back, circuit closed")
+            self.failures = 0
+            self.circuit_until = None
+            self.circuit_open_s = self.config["circuit_open_s"]
+
+    def summary(self):
+        return dict(self.stats, host=self.host, limit=round(self.limit, 2), peak_limit=round(self.peak_limit, 2),
+                    crawl_delay=self.crawl_delay,
+                    avg_latency_s={kind: round(value, 4) for kind, value in self.avg_latency.items()})
+
+
+class HostRequest:
+    """One scheduled request: `with` (threads) or `async with` (event loop) around the actual I/O
+    Set status / retry_after from the response inside the block; an exception leaving the
+    block without a status counts as an error (timeout, connection reset...).
+    """
+
+    def __init__(self, scheduler, url, kind=None):
+        self.scheduler = scheduler
+        self.state = scheduler.get_host(url)
+        self.url = url
+        self.kind = kind
+        self.status = None
+        self.retry_after = None
+        self.started = None
+
+    def set_response(self, status, retry_after=None):
+        """Note the HTTP status and Retry-After header of the response"""
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+    def __enter__(self):
+        if not self.state.robots_loaded:
+            self.scheduler.load_robots(self.url, self.state)
+        state = self.state
+        with state.cond:
+            while True:
+                wait = state.try_acquire(time.monotonic())
+                if wait == 0:
+                    break
+                state.cond.wait(wait)
+        self.started = time.monotonic()
+        return self
+
+    async def __aenter__(self):
+        state = self.state
+        if not state.robots_loaded:
+            await asyncio.get_running_loop().run_in_executor(None, self.scheduler.load_robots, self.url, state)
+        while True:
+            with state.cond:
+                wait = state.try_acquire(time.monotonic())
+                if wait is None:
+                    future = asyncio.get_running_loop().create_future()
+                    state.async_waiters.append((asyncio.get_running_loop(), future))
+            if wait == 0:
+                break
+            if wait is None:
+                await future
+            else:
+                await asyncio.sleep(wait)
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release(exc_type is not None and exc_type is not asyncio.CancelledError)
+        return False
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__exit__(exc_type, exc, tb)
+        return False
+
+    def release(self, failed):
+        state = self.state
+        now = time.monotonic()
+        with state.cond:
+            state.finish(now, now - self.started, self.status, self.retry_after,
+                         error=failed and self.status is None, kind=self.kind)
+            state.cond.notify_all()
+            waiters, state.async_waiters = state.async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+
+class UnscheduledRequest:
+    """Stand-in for HostRequest when no scheduler is in use (same `with` / `async with` interface)"""
+
+    def set_response(self, status, retry_after=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+UNSCHEDULED = UnscheduledRequest()
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class HostScheduler:
+    """Per-host HostStates, shared by all jobs of a Crawler
+    :param config: fetch config (host_* / *_decrease / crawl-delay keys)
+    :param fetch_robots: Callable(url) -> robots.txt text of url's host ("" if missing), None = no Crawl-delay
+    :param user_agent: User-Agent matched against robots.txt groups
+    """
+
+    def __init__(self, config, fetch_robots=None, user_agent="*"):
+        self.config = config
+        self.fetch_robots = fetch_robots
+        self.user_agent = user_agent
+        self._hosts = {}
+        self._robots = {}
+        self._lock = threading.Lock()
+
+    def get_host(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = HostState(host, self.config)
+            return state
+
+    def get_robots_txt(self, url):
+        """robots.txt of url's host, fetched once per host (blocking)"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host in self._robots:
+                return self._robots[host]
+        text = self.fetch_robots(url) if self.fetch_robots is not None else ""
+        with self._lock:
+            return self._robots.setdefault(host, text)
+
+    def load_robots(self, url, state=None):
+        """Apply the host's Crawl-delay before its first request (blocking, once per host)"""
+        state = state or self.get_host(url)
+        if state.robots_loaded:
+            return
+        delay = None
+        if self.config["adaptive_rate"] and self.config["respect_crawl_delay"] and self.fetch_robots is not None:
+            delay = parse_robots_crawl_delay(self.get_robots_txt(url), self.user_agent)
+            if delay:
+                print(f"🐢 robots.txt Crawl-delay {delay}s for {state.host}, one request at a time")
+        with state.cond:
+            if not state.robots_loaded:
+                state.set_crawl_delay(delay)
+
+    def request(self, url, kind=None):
+        """Slot for one request to url's host: `with scheduler.request(url) as req:` / `async with ...`
+        :param kind: Latency class (e.g. "browser", "static"), response times are only compared within
+                     a class; None = no latency signal (media downloads, whose time depends on file size)
+        """
+        return HostRequest(self, url, kind)
+
+    def summary(self, url):
+        """Statistics of url's host (None if it was never requested)"""
+        with self._lock:
+            state = self._hosts.get(urlparse(url).netloc.lower())
+        return state.summary() if state is not None else None
@@ -0,0 +1,131 @@
+"""Per-page timing instrumentation and machine-readable crawl report (--report)
+
+Each page gets a record with per-stage timings (fetch, extract_links,
+fix_links, strip_tags, media, extract_core, html2md, save), sizes and outcome.
+Records are streamed to a JSONL file as pages finish; the aggregate summary
+(per-stage count/mean/p50/p95/max + log-scale histograms, outcome and fetch
+path counts, background media downloads, URL canonicalisation counters) goes to
+<report>.summary.json.
+"""
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+# Histogram bucket upper bounds (ms), last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+def new_page_record(url):
+    """Empty per-page record (filled by timed() and the crawl loop)"""
+    return {"url": url, "outcome": None, "fetch_path": None, "md_path": None,
+            "timings": {}, "sizes": {}, "started": time.time()}
+
+
+@contextmanager
+def timed(record, stage):
+    """Add the duration of the with-block to record["timings"][stage] (no-op if record is None)"""
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = record["timings"]
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summarize(values):
+    """count/sum/mean/p50/p95/max (seconds) + histogram (ms buckets) of a list of durations"""
+    values = sorted(values)
+    histogram = {}
+    for value in values:
+        ms = value * 1000
+        bucket = next((f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS if ms <= bound),
+                      f">{HISTOGRAM_BUCKETS_MS[-1]}ms")
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    total = sum(values)
+    return {
+        "count": len(values),
+        "sum_s": round(total, 4),
+        "mean_s": round(total / len(values), 4) if values else 0.0,
+        "p50_s": round(_percentile(values, 50), 4),
+        "p95_s": round(_percentile(values, 95), 4),
+        "max_s": round(values[-1], 4) if values else 0.0,
+        "histogram": histogram
+    }
+
+
+class CrawlReport:
+    """Collects page records, streams them as JSONL and writes the aggregate summary
+    :param path: JSONL output path (summary goes next to it as <path>.summary.json)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.summary_path = (path[:-len(".jsonl")] if path.endswith(".jsonl") else path) + ".summary.json"
+        self._file = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._stage_values = {}
+        self._totals = []
+        self._outcomes = {}
+        self._fetch_paths = {}
+        self._bytes = {"html": 0, "md": 0}
+        self._media = {"ok": 0, "failed": 0, "bytes": 0, "durations": []}
+        self.started = time.time()
+
+    def add(self, record):
+        """Finish a page record: compute its total time, stream it, aggregate it"""
+        record["total_s"] = round(time.time() - record.pop("started"), 4)
+        record["timings"] = {stage: round(value, 4) for stage, value in record["timings"].items()}
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            for stage, value in record["timings"].items():
+                self._stage_values.setdefault(stage, []).append(value)
+            self._totals.append(record["total_s"])
+            self._outcomes[record["outcome"]] = self._outcomes.get(record["outcome"], 0) + 1
+            if record["fetch_path"]:
+                self._fetch_paths[record["fetch_path"]] = self._fetch_paths.get(record["fetch_path"], 0) + 1
+            self._bytes["html"] += record["sizes"].get("html_bytes", 0)
+            self._bytes["md"] += record["sizes"].get("md_bytes", 0)
+
+    def add_media(self, url, seconds, size, ok):
+        """Record one background media download (called from downloader threads)"""
+        with self._lock:
+            self._media["ok" if ok else "failed"] += 1
+            self._media["bytes"] += size
+            self._media["durations"].append(seconds)
+
+    def close(self, **extra):
+        """Write the aggregate summary
+        :param extra: Additional top-level summary fields (e.g. urls = canonicalisation counters)
+        :return: Summary dict
+        """
+        with self._lock:
+            elapsed = time.time() - self.started
+            summary = {
+                "pages": len(self._totals),
+                "elapsed_s": round(elapsed, 3),
+                "pages_per_sec": round(len(self._totals) / elapsed, 3) if elapsed else 0.0,
+                "outcomes": self._outcomes,
+                "fetch_paths": self._fetch_paths,
+                "bytes": self._bytes,
+                "page_total": summarize(self._totals),
+                "stages": {stage: summarize(values) for stage, values in self._stage_values.items()},
+                "media": {"ok": self._media["ok"], "failed": self._media["failed"],
+                          "bytes": self._media["bytes"], "download": summarize(self._media["durations"])}
+            }
+            summary.update(extra)
+            self._file.close()
+        with open(self.summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
@@ -0,0 +1,308 @@
+"""Bundle outputs (--output): pages as records of one file instead of one MD file each
+
+Creating tens of thousands of small files is slow on network file systems,
+and loaders then have to walk and re-open them all. An OutputSink receives
+one record per saved page (url, path, markdown, md_hash, fetch_path, links,
+saved_at) and a background thread writes them in batches, flushing after
+each batch so a downstream indexer can consume the output while the crawl is
+still running:
+    jsonl   - one JSON object per line, to a file or stdout ("-")
+    sqlite  - pages table keyed by url (WAL, readable while written)
+    tar     - one member per page, named by its MD path, metadata in PAX headers
+    zip     - one deflated entry per page, metadata as JSON entry comment
+              (a zip is only readable once closed: its index is written last;
+              on --resume a page already in the archive keeps its first entry)
+Media files are still saved next to the output (images/, videos/), the
+Markdown refers to them by the same relative paths as the MD files would.
+"""
+import asyncio
+import io
+import json
+import os
+import queue
+import sqlite3
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+
+OUTPUT_FILENAMES = {"jsonl": "pages.jsonl", "sqlite": "pages.sqlite", "tar": "pages.tar", "zip": "pages.zip"}
+
+_stdout_lock = threading.Lock()  # Several jobs of a batch may stream to stdout
+_stdout_stream = None            # Original stdout, set by reserve_stdout()
+
+
+def reserve_stdout():
+    """Keep stdout for the JSONL stream ("-"): everything else printed, also by converter
+    processes (they inherit the file descriptors), goes to stderr from now on
+    """
+    global _stdout_stream
+    if _stdout_stream is None:
+        sys.stdout.flush()
+        _stdout_stream = os.fdopen(os.dup(1), "w", encoding="utf-8")
+        os.dup2(2, 1)
+
+
+def get_stdout_stream():
+    return _stdout_stream or sys.stdout
+
+
+def on_event_loop():
+    """Called from a thread running an asyncio event loop (which must never block on the disk)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class OutputSink:
+    """Buffered background writer of page records (subclasses implement the format)
+    :param path: Output file ("-" = stdout, JSONL only)
+    :param append: Keep the records of an earlier run (--resume)
+    :param batch_size: Records written per batch
+    :param flush_interval: Max time a record waits for its batch to fill (s)
+    :param max_pending: Records buffered before add() waits (back-pressure when the disk is slower than the crawl),
+                        async crawls wait in wait_for_room() off the event loop instead
+    """
+
+    def __init__(self, path, append=False, batch_size=100, flush_interval=1.0, max_pending=1000):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.unpatched = 0       # Media links that could not be restored in already streamed records
+        self.error = None
+        self._queue = queue.Queue()  # Unbounded: an event loop thread must be able to hand off without blocking
+        self._room = threading.Condition()  # Signalled after each written batch
+        self.open(append)
+        self._thread = threading.Thread(target=self._run, name="web2md-output", daemon=True)
+        self._thread.start()
+
+    def add(self, record):
+        """Queue a page record, waiting for room first unless called on an event loop thread
+        :return: False if the writer failed earlier (the page counts as not saved)
+        """
+        if self.error is not None:
+            return False
+        if not on_event_loop():
+            self.wait_for_room()
+        self._queue.put(("page", record))
+        return True
+
+    def backlogged(self):
+        """max_pending records or more wait for the writer"""
+        return self._queue.qsize() >= self.max_pending and self.error is None
+
+    def wait_for_room(self):
+        """Block until the writer is below max_pending records (or has failed)"""
+        with self._room:
+            self._room.wait_for(lambda: not self.backlogged() or not self._thread.is_alive())
+
+    def replace_text(self, path, old, new):
+        """Replace text in the Markdown of the page at path (failed media download → original URL)
+        Queued behind the page records, so it also applies to pages not written yet.
+        """
+        self._queue.put(("replace", (path, old, new)))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            closing = batch[-1] is None
+            if closing:
+                batch.pop()
+            if batch and self.error is None:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    self.error = e
+                    print(f"❌ Output write failed, pages are no longer saved: {str(e)[:80]} - {self.path}")
+            with self._room:
+                self._room.notify_all()
+            if closing:
+                return
+
+    def _write(self, batch):
+        """Write a batch in order, consecutive page records at once"""
+        records = []
+        for kind, item in batch:
+            if kind == "page":
+                records.append(item)
+                continue
+            if records:
+                self.write_records(records)
+                records = []
+            if not self.patch(*item):
+                self.unpatched += 1
+        if records:
+            self.write_records(records)
+        self.flush()
+        self.written += sum(1 for kind, _ in batch if kind == "page")
+
+    def open(self, append):
+        raise NotImplementedError
+
+    def write_records(self, records):
+        raise NotImplementedError
+
+    def patch(self, path, old, new):
+        """Apply replace_text to a written page
+        :return: False if the format cannot rewrite written records (streams)
+        """
+        return False
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def close(self):
+        """Write what is buffered and close the output"""
+        self._queue.put(None)
+        self._thread.join()
+        self.finish()
+        if self.unpatched:
+            print(f"⚠️  {self.unpatched} failed media links could not be pointed back to their URL in {self.path} "
+                  f"(already streamed)")
+
+
+class JsonlSink(OutputSink):
+    """One JSON object per line (file, or stdout for "-")"""
+
+    def open(self, append):
+        if self.path == "-":
+            self.file = get_stdout_stream()
+        else:
+            self.file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    def write_records(self, records):
+        text = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        if self.path == "-":
+            with _stdout_lock:
+                self.file.write(text)
+                self.file.flush()
+        else:
+            self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def finish(self):
+        if self.path != "-":
+            self.file.close()
+
+
+class SqliteSink(OutputSink):
+    """pages table (url primary key, the last save of a URL wins)"""
+
+    def open(self, append):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)  # Written by the writer thread only
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if not append:
+            self.conn.execute("DROP TABLE IF EXISTS pages")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " path TEXT,"
+            " markdown TEXT,"
+            " md_hash TEXT,"
+            " fetch_path TEXT,"
+            " links TEXT,"
+            " saved_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_path ON pages (path)")
+        self.conn.commit()
+
+    def write_records(self, records):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pages (url, path, markdown, md_hash, fetch_path, links, saved_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(r["url"], r["path"], r["markdown"], r["md_hash"], r["fetch_path"], json.dumps(r["links"]), r["saved_at"])
+             for r in records]
+        )
+
+    def patch(self, path, old, new):
+        self.conn.execute("UPDATE pages SET markdown = replace(markdown, ?, ?) WHERE path = ?", (old, new, path))
+        return True
+
+    def flush(self):
+        self.conn.commit()
+
+    def finish(self):
+        self.conn.close()
+
+
+class TarSink(OutputSink):
+    """Uncompressed tar, one member per page (appendable, readable while written)"""
+
+    def open(self, append):
+        mode = "a" if append and os.path.exists(self.path) else "w"
+        self.tar = tarfile.open(self.path, mode, format=tarfile.PAX_FORMAT)
+
+    def write_records(self, records):
+        for record in records:
+            data = record["markdown"].encode("utf-8")
+            info = tarfile.TarInfo(record["path"])
+            info.size = len(data)
+            info.mtime = int(record["saved_at"])
+            info.pax_headers = {"web2md.url": record["url"], "web2md.md_hash": record["md_hash"],
+                                "web2md.fetch_path": record["fetch_path"] or ""}
+            self.tar.addfile(info, io.BytesIO(data))
+
+    def flush(self):
+        self.tar.fileobj.flush()
+
+    def finish(self):
+        self.tar.close()
+
+
+class ZipSink(OutputSink):
+    """Deflated zip, one entry per page (readable once closed, entries cannot be replaced)"""
+
+    def open(self, append):
+        mode = "a" if append and os.path.exists(self.path) else "w"
+        self.zip = zipfile.ZipFile(self.path, mode, compression=zipfile.ZIP_DEFLATED)
+        self.names = set(self.zip.namelist())  # Writing a name again would add a second entry, not replace it
+        self.skipped = 0
+
+    def write_records(self, records):
+        for record in records:
+            if record["path"] in self.names:  # Written before the crawl stopped (page in flight on --resume)
+                self.skipped += 1
+                continue
+            self.names.add(record["path"])
+            info = zipfile.ZipInfo(record["path"], time.localtime(record["saved_at"])[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.comment = json.dumps({"url": record["url"], "md_hash": record["md_hash"],
+                                       "fetch_path": record["fetch_path"]}).encode("utf-8")
+            self.zip.writestr(info, record["markdown"])
+
+    def finish(self):
+        self.zip.close()
+        if self.skipped:
+            print(f"⚠️  {self.skipped} pages already in {self.path} kept their earlier entry (zip entries cannot be replaced)")
+
+
+OUTPUT_SINKS = {"jsonl": JsonlSink, "sqlite": SqliteSink, "tar": TarSink, "zip": ZipSink}
+
+
+def create_output_sink(kind, path, append=False, batch_size=100, flush_interval=1.0):
+    """OutputSink of the given format (one of OUTPUT_SINKS)"""
+    if kind not in OUTPUT_SINKS:
+        raise ValueError(f"Unknown output format: {kind} (files, {', '.join(OUTPUT_SINKS)})")
+    if path == "-" and kind != "jsonl":
+        raise ValueError("Only the jsonl output can be written to stdout")
+    return OUTPUT_SINKS[kind](path, append=append, batch_size=batch_size, flush_interval=flush_interval)
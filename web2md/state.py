@@ -0,0 +1,367 @@
+"""Persistent crawl state (SQLite in the save directory)
+
+Every URL the crawl knows about is stored with its status, so an interrupted
+crawl can be resumed with --resume instead of re-rendering everything:
+    queued  - discovered, not fetched yet (the frontier)
+    done    - MD file written (md_path set)
+    duplicate - redirect / rel=canonical duplicate of a saved page (not saved itself)
+    failed  - fetch or conversion failed (error says why, --retry-failed queues them again)
+    gone    - HTTP 404 / 410
+Rows are committed after each page, a crash loses at most the page in flight.
+
+CrawlManifest is kept across runs (--incremental): per URL it remembers the
+HTTP validators, rendered HTML hash, Markdown hash, output path and outgoing
+links, so unchanged pages can be skipped without conversion or writes.
+
+HtmlCache keeps the rendered HTML of every saved page (zlib-compressed, with
+its final URL and base URI), so --reconvert can regenerate all Markdown after
+a change of REMOVE_TAGS / CORE_CONTENT_SELECTORS / Markdown options without
+fetching or rendering anything.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+STATE_FILENAME = ".web2md_state.sqlite"
+MANIFEST_FILENAME = ".web2md_manifest.sqlite"
+HTML_CACHE_FILENAME = ".web2md_html.sqlite"
+
+
+class CrawlState:
+    """SQLite-backed frontier / visited set / per-URL status
+    :param save_dir: Crawl save directory (the DB lives inside it)
+    :param reset: Start from scratch (drop previous state)
+    """
+
+    def __init__(self, save_dir, reset=False):
+        self.path = os.path.join(save_dir, STATE_FILENAME)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if reset:
+            self.conn.execute("DROP TABLE IF EXISTS urls")
+            self.conn.execute("DROP TABLE IF EXISTS meta")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " url TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " md_path TEXT,"
+            " seq INTEGER,"
+            " updated REAL,"
+            " error TEXT)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(urls)")]
+        if "error" not in columns:  # State written by an older version
+            self.conn.execute("ALTER TABLE urls ADD COLUMN error TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS urls_status ON urls (status, seq)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self._seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM urls").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+        self.conn.commit()
+
+    def add_queued(self, urls):
+        """Add URLs to the frontier (already known URLs keep their status)"""
+        self._queue(urls)
+        self.conn.commit()
+
+    def mark_done(self, url, md_path, new_urls=()):
+        """Record a saved page and queue the links found on it (one transaction)"""
+        self._set_status(url, "done", md_path)
+        self._queue(new_urls)
+        self.conn.commit()
+
+    def mark_duplicate(self, url):
+        """Record a URL whose page was already saved under another URL (not counted as a saved page)"""
+        self._set_status(url, "duplicate", None)
+        self.conn.commit()
+
+    def mark_failed(self, url, error=None, status="failed"):
+        """Record a page that was not saved
+        :param error: Why (last fetch error), kept for the follow-up run
+        :param status: failed (retried by --retry-failed) / gone
+        """
+        self._set_status(url, status, None, error)
+        self.conn.commit()
+
+    def requeue_failed(self):
+        """Put failed URLs back into the frontier (--retry-failed)
+        :return: Number of URLs queued again
+        """
+        count = self.conn.execute("UPDATE urls SET status = 'queued', error = NULL WHERE status = 'failed'").rowcount
+        self.conn.commit()
+        return count
+
+    def failed_urls(self):
+        """(url, error) of failed URLs, in discovery order"""
+        return self.conn.execute("SELECT url, error FROM urls WHERE status = 'failed' ORDER BY seq").fetchall()
+
+    def _queue(self, urls):
+        now = time.time()
+        rows = []
+        for url in urls:
+            self._seq += 1
+            rows.append((url, "queued", self._seq, now))
+        self.conn.executemany("INSERT OR IGNORE INTO urls (url, status, seq, updated) VALUES (?, ?, ?, ?)", rows)
+
+    def _set_status(self, url, status, md_path, error=None):
+        self._seq += 1
+        self.conn.execute(
+            "INSERT INTO urls (url, status, md_path, seq, updated, error) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET status = excluded.status, md_path = excluded.md_path, "
+            "updated = excluded.updated, error = excluded.error",
+            (url, status, md_path, self._seq, time.time(), error)
+        )
+
+    def urls_with_status(self, *statuses):
+        """URLs with the given statuses, in discovery order"""
+        marks = ",".join("?" * len(statuses))
+        rows = self.conn.execute(f"SELECT url FROM urls WHERE status IN ({marks}) ORDER BY seq", statuses)
+        return [row[0] for row in rows]
+
+    def iter_urls(self, *statuses, batch=1000):
+        """Like urls_with_status, but read in batches (memory stays flat for huge crawls)
+        URLs added or re-queued while iterating are not returned.
+        """
+        marks = ",".join("?" * len(statuses))
+        last_seq, max_seq = -1, self._seq
+        while True:
+            rows = self.conn.execute(
+                f"SELECT url, seq FROM urls WHERE status IN ({marks}) AND seq > ? AND seq <= ? ORDER BY seq LIMIT ?",
+                statuses + (last_seq, max_seq, batch)
+            ).fetchall()
+            if not rows:
+                return
+            for url, _ in rows:
+                yield url
+            last_seq = rows[-1][1]
+
+    def count(self, status):
+        return self.conn.execute("SELECT COUNT(*) FROM urls WHERE status = ?", (status,)).fetchone()[0]
+
+    def count_saved(self):
+        """Pages saved so far (older state files stored duplicates as done without md_path)"""
+        return self.conn.execute("SELECT COUNT(*) FROM urls WHERE status = 'done' AND md_path IS NOT NULL").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class CrawlManifest:
+    """Cross-run page manifest for incremental re-crawls
+    Entries are loaded into memory once (lookups are thread-safe), writes go to SQLite.
+    :param save_dir: Crawl save directory (the DB lives inside it)
+    """
+
+    def __init__(self, save_dir):
+        self.path = os.path.join(save_dir, MANIFEST_FILENAME)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " html_hash TEXT,"
+            " md_hash TEXT,"
+            " md_path TEXT,"
+            " links TEXT,"
+            " run INTEGER)"
+        )
+        # Fetched URL -> URL the page was saved under (redirect / rel=canonical target)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS aliases (url TEXT PRIMARY KEY, page_url TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()
+        self.run = int(row[0]) + 1 if row else 1
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run', ?)", (str(self.run),))
+        self.conn.commit()
+        self.entries = {}
+        for url, etag, last_modified, html_hash, md_hash, md_path, links in self.conn.execute(
+                "SELECT url, etag, last_modified, html_hash, md_hash, md_path, links FROM pages"):
+            self.entries[url] = {
+                "etag": etag, "last_modified": last_modified, "html_hash": html_hash,
+                "md_hash": md_hash, "md_path": md_path, "links": json.loads(links or "[]")
+            }
+        self.aliases = dict(self.conn.execute("SELECT url, page_url FROM aliases"))
+        self.stats = {"added": 0, "changed": 0, "unchanged": 0}
+        self._seen = set()
+
+    def resolve(self, url):
+        """URL the entry of a fetched URL is stored under (itself unless it redirected / named a canonical URL)"""
+        if url in self.entries:
+            return url
+        return self.aliases.get(url, url)
+
+    def add_alias(self, url, page_url):
+        """Remember that fetching url produced the page saved as page_url"""
+        if self.aliases.get(url) != page_url:
+            self.aliases[url] = page_url
+            self.conn.execute("INSERT OR REPLACE INTO aliases (url, page_url) VALUES (?, ?)", (url, page_url))
+            self.conn.commit()
+
+    def get(self, url):
+        """Previous entry of a URL (or of the page it was saved as) whose MD file still exists / None"""
+        entry = self.entries.get(self.resolve(url))
+        if entry and entry["md_path"] and os.path.exists(entry["md_path"]):
+            return entry
+        return None
+
+    def record(self, url, outcome, **fields):
+        """Store a page seen in this run
+        :param outcome: added / changed / unchanged
+        :param fields: Columns to update (etag, last_modified, html_hash, md_hash, md_path, links)
+        """
+        entry = dict(self.entries.get(url) or {"etag": None, "last_modified": None, "html_hash": None,
+                                               "md_hash": None, "md_path": None, "links": []})
+        entry.update({key: value for key, value in fields.items() if value is not None})
+        self.entries[url] = entry
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, etag, last_modified, html_hash, md_hash, md_path, links, run) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, entry["etag"], entry["last_modified"], entry["html_hash"], entry["md_hash"],
+             entry["md_path"], json.dumps(entry["links"]), self.run)
+        )
+        self.conn.commit()
+        if url not in self._seen:
+            self._seen.add(url)
+            self.stats[outcome] += 1
+
+    def touch(self, url):
+        """Mark a known URL as still present (e.g. fetch failed this time) without counting it"""
+        self._seen.add(url)
+        self.conn.execute("UPDATE pages SET run = ? WHERE url = ?", (self.run, url))
+        self.conn.commit()
+
+    def removed(self):
+        """URLs from previous runs that were not seen in this run"""
+        return sorted(url for url in self.entries if url not in self._seen)
+
+    def forget(self, urls):
+        """Drop entries (pages that no longer exist on the site)"""
+        self.conn.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url in urls])
+        self.conn.executemany("DELETE FROM aliases WHERE page_url = ?", [(url,) for url in urls])
+        self.conn.commit()
+        for url in urls:
+            self.entries.pop(url, None)
+        forgotten = set(urls)
+        self.aliases = {url: page_url for url, page_url in self.aliases.items() if page_url not in forgotten}
+
+    def close(self):
+        self.conn.close()
+
+
+class HtmlCache:
+    """Compressed rendered pages keyed by URL (--reconvert reads them back)
+    Entries older than ttl are dropped when the cache is opened, the oldest ones once it outgrows max_bytes.
+    Thread-safe (static pages are cached from fetch threads).
+    :param save_dir: Crawl save directory (the DB lives inside it)
+    :param ttl: Entry lifetime (s, 0 = forever)
+    :param max_bytes: Bound on the compressed size of all entries (0 = unbounded)
+    """
+
+    def __init__(self, save_dir, ttl=0, max_bytes=0):
+        self.path = os.path.join(save_dir, HTML_CACHE_FILENAME)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " final_url TEXT,"
+            " base_uri TEXT,"
+            " body BLOB NOT NULL,"
+            " size INTEGER,"
+            " fetched REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_fetched ON pages (fetched)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.evicted = 0
+        if ttl:
+            self.evicted = self.conn.execute("DELETE FROM pages WHERE fetched < ?", (time.time() - ttl,)).rowcount
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+            self.conn.commit()
+
+    def put(self, url, kind, content, final_url, base_uri):
+        """Store one rendered page
+        :param kind: html (content = page HTML) / extract (content = JSON of a BrowserExtract)
+        """
+        body = zlib.compress(content.encode("utf-8"))
+        with self._lock:
+            row = self.conn.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, kind, final_url, base_uri, body, size, fetched) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, kind, final_url, base_uri, body, len(body), time.time())
+            )
+            self.total_bytes += len(body) - (row[0] if row else 0)
+            if self.max_bytes and self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Drop the oldest entries down to 90% of max_bytes (so eviction does not run on every put)"""
+        target = self.max_bytes * 0.9
+        dropped = []
+        for url, size in self.conn.execute("SELECT url, size FROM pages ORDER BY fetched").fetchall():
+            if self.total_bytes <= target:
+                break
+            dropped.append((url,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM pages WHERE url = ?", dropped)
+        self.evicted += len(dropped)
+
+    def iter_pages(self, batch=200):
+        """(url, kind, compressed body, final_url, base_uri) of every entry, read in batches
+        Bodies stay compressed: decompress_page() them where they are converted.
+        """
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, url, kind, body, final_url, base_uri FROM pages WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1:]
+            last_rowid = rows[-1][0]
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM pages")
+            self.conn.commit()
+            self.total_bytes = 0
+
+    def close(self):
+        self.conn.close()
+
+
+def decompress_page(body):
+    """Page text of an HtmlCache body"""
+    return zlib.decompress(body).decode("utf-8")
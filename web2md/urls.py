@@ -0,0 +1,124 @@
+"""URL canonicalisation: one key per page, however a link spells its URL
+
+page, page/, page#section, page?utm_source=x, page/index.html and
+HTTP://Host:80/page all name the same page. canonicalize_url() maps them to
+one canonical form, which the crawl uses to decide whether a URL was seen
+already and to name the Markdown file. Pages are still fetched at the URL
+they were first found under (minus the fragment), so no extra redirects.
+
+find_canonical_link() reads <link rel="canonical"> from raw HTML with a
+cheap scan of <head>, so the crawl can recognise duplicates without parsing.
+"""
+from urllib.parse import urlsplit, urlunsplit, urljoin
+from functools import lru_cache
+from fnmatch import fnmatchcase
+import html
+import re
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Unreserved characters never need percent-encoding (RFC 3986 2.3)
+UNRESERVED = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+ESCAPE_RE = re.compile(r"%[0-9A-Fa-f]{2}")
+HEAD_END_RE = re.compile(r"</head\s*>|<body[\s>]", re.IGNORECASE)
+LINK_TAG_RE = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+REL_CANONICAL_RE = re.compile(r"""\brel\s*=\s*["']?[^"'>]*\bcanonical\b""", re.IGNORECASE)
+HREF_RE = re.compile(r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+
+def _normalize_escape(match):
+    char = chr(int(match.group(0)[1:], 16))
+    return char if char in UNRESERVED else match.group(0).upper()
+
+
+def normalize_escapes(text):
+    """Decode escaped unreserved characters, uppercase the other escapes (%7e → ~, %2f → %2F)"""
+    return ESCAPE_RE.sub(_normalize_escape, text) if "%" in text else text
+
+
+def remove_dot_segments(path):
+    """Resolve . and .. path segments (/a/b/../c/./d → /a/c/d)"""
+    if "." not in path:
+        return path
+    output = []
+    segments = path.split("/")
+    for segment in segments[1:]:
+        if segment == "..":
+            if output:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        output.append("")  # /a/b/.. is the directory /a/
+    return "/" + "/".join(output)
+
+
+def is_dropped_param(name, drop_params):
+    """Query parameter matches one of the drop patterns (fnmatch, e.g. utm_*)"""
+    return any(fnmatchcase(name.lower(), pattern) for pattern in drop_params)
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_url(url, drop_params=(), index_pages=(), lowercase_path=False):
+    """Canonical form of a page URL
+    Rules: lowercase scheme/host, drop default port, fragment and empty query,
+    resolve dot segments, normalise percent-escapes, strip directory index files
+    (page/index.html → page) and the trailing slash (page/ → page, except the site root),
+    drop tracking parameters and sort the remaining query parameters.
+    :param drop_params: Lowercase fnmatch patterns of query parameters to remove (utm_*, gclid...)
+    :param index_pages: Lowercase file names that stand for their directory (index.html...)
+    :param lowercase_path: Treat paths as case-insensitive (IIS-style servers)
+    :return: Canonical URL (url unchanged if it is not an absolute http(s) URL)
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return url
+    netloc = parts.hostname.lower()
+    if ":" in netloc:
+        netloc = f"[{netloc}]"  # IPv6 literal
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    if parts.username or parts.password:
+        netloc = parts.netloc.rpartition("@")[0] + "@" + netloc
+
+    path = remove_dot_segments(normalize_escapes(parts.path) or "/")
+    if lowercase_path:
+        path = path.lower()
+    directory, _, filename = path.rpartition("/")
+    if filename.lower() in index_pages:
+        path = directory + "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    params = []
+    for param in parts.query.split("&"):
+        if not param:
+            continue
+        name = param.partition("=")[0]
+        if not is_dropped_param(name, drop_params):
+            params.append(normalize_escapes(param))
+    return urlunsplit((scheme, netloc, path, "&".join(sorted(params)), ""))
+
+
+def strip_fragment(url):
+    """URL without its #fragment (the part of a link a server never sees)"""
+    return url.split("#", 1)[0] if "#" in url else url
+
+
+def find_canonical_link(html_text, base_uri):
+    """Absolute href of <link rel="canonical"> in the <head> of raw HTML / None"""
+    if not html_text:
+        return None
+    head_end = HEAD_END_RE.search(html_text)
+    head = html_text[:head_end.start()] if head_end else html_text
+    for tag in LINK_TAG_RE.findall(head):
+        if REL_CANONICAL_RE.search(tag):
+            match = HREF_RE.search(tag)
+            href = next((group for group in match.groups() if group is not None), "") if match else ""
+            href = html.unescape(href).strip()
+            return urljoin(base_uri, href) if href else None
+    return None